@@ -0,0 +1,134 @@
+import io
+import os
+import tempfile
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from unittest import skipUnless
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from posts.models import Post, Comment, Like
+from notifications.models import Notification
+from messaging.models import Conversation, Message
+from users.models import CustomUserProfile
+from uploads.chunked import part_path, start_upload
+from .seed import PASSWORD, seed_dataset
+
+User = get_user_model()  # Custom user model
+
+# Number of seeded users (budgets are recorded at the default size)
+BENCHMARK_USERS = int(os.environ.get('BENCHMARK_USERS', 2000))
+# Set to 1 to run the benchmarks. Seeding the dataset takes a while, so they are skipped by default.
+RUN_BENCHMARKS = os.environ.get('BENCHMARK') == '1'
+
+# Test case running against the seeded power-law dataset, with a context of ids to fill the benchmarked
+# endpoints' {placeholders} and the users sending their requests
+@skipUnless(RUN_BENCHMARKS, "Set BENCHMARK=1 to run the benchmarks")
+@override_settings(
+    TIMELINE_FANOUT_THRESHOLD=200,  # Turn the most followed seeded users into read-time merged authors
+    NOTIFICATION_DISPATCHER='sync',
+)
+class SeededTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Chunked uploads write their bytes to a scratch directory
+        upload_dir = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(CHUNKED_UPLOAD_DIR=upload_dir))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        cls.dataset = seed_dataset(users=BENCHMARK_USERS)
+        cls.context = cls.build_context()
+
+    @classmethod
+    def build_context(cls):
+        # The reader is a popular, active user following the most people (the heaviest feed)
+        popular = User.objects.order_by('-follower_count', 'id')[:50]
+        reader = max(popular, key=lambda user: (user.following_count, -user.id))
+
+        hot_post = Post.objects.annotate(total=Count('comments')).order_by('-total', 'id').first()
+        own_post = Post.objects.filter(author=reader).first() or Post.objects.create(author=reader, title='Reader post', content='Content')
+        own_comment = Comment.objects.create(post=hot_post, author=reader, content='Reader comment')
+        liked_post = Like.objects.filter(user=reader).values_list('post_id', flat=True).first()
+        if liked_post is None:
+            liked_post = Like.objects.create(user=reader, post=hot_post).post_id
+        not_liked_post = Post.objects.exclude(author=reader).exclude(likes__user=reader).values_list('id', flat=True).first()
+        cover_profile = CustomUserProfile.objects.create(user=reader)
+
+        conversation = Conversation.objects.filter(participants__user=reader).annotate(total=Count('messages')).order_by('-total', 'id').first()
+        correspondent_id = conversation.user_two_id if conversation.user_one_id == reader.id else conversation.user_one_id
+        received_message = Message.objects.filter(receiver=reader).values_list('id', flat=True).first()
+        notification = Notification.objects.filter(recipient=reader).order_by('-timestamp').values_list('id', flat=True).first()
+
+        # An upload just started, and one whose bytes were all received
+        upload = start_upload(reader, 'photo.png', 1024)
+        image = io.BytesIO()
+        Image.new('RGB', (1080, 720), (30, 120, 200)).save(image, 'PNG')
+        received_upload = start_upload(reader, 'received.png', len(image.getvalue()))
+        with open(part_path(received_upload), 'wb') as part:
+            part.write(image.getvalue())
+        received_upload.offset = received_upload.size
+        received_upload.save(update_fields=['offset'])
+
+        users = {'reader': reader, 'celebrity': User.objects.order_by('-follower_count', 'id').first()}
+        return {
+            'users': users,
+            'tokens': {name: str(RefreshToken.for_user(user).access_token) for name, user in users.items()},
+            'values': {
+                'password': PASSWORD,
+                'reader_username': reader.username,
+                'reader_refresh': str(RefreshToken.for_user(reader)),
+                'hot_post_id': hot_post.id,
+                'own_post_id': own_post.id,
+                'own_comment_id': own_comment.id,
+                'liked_post_id': liked_post,
+                'not_liked_post_id': not_liked_post,
+                'followed_id': reader.following.values_list('id', flat=True).first(),
+                'not_followed_id': User.objects.exclude(followers=reader).exclude(pk=reader.pk).values_list('id', flat=True).first(),
+                'cover_profile_id': cover_profile.id,
+                'notification_id': notification,
+                'conversation_id': conversation.id,
+                'correspondent_id': correspondent_id,
+                'received_message_id': received_message,
+                'upload_id': upload.id,
+                'upload_size': upload.size,
+                'received_upload_id': received_upload.id,
+            },
+        }
+
+    def fill(self, value):
+        values = self.context['values']
+        if isinstance(value, dict):
+            return {key: self.fill(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.fill(item) for item in value]
+        return value.format(**values) if isinstance(value, str) else value
+
+    # Send an endpoint's request with a cold cache, returning the response and its content
+    def send(self, endpoint):
+        client = APIClient()
+        if endpoint.user:
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.context['tokens'][endpoint.user]}")
+        request = getattr(client, endpoint.method)
+        if endpoint.data is None:
+            kwargs = {}
+        elif endpoint.format == 'raw':
+            kwargs = {'content_type': 'application/octet-stream'}
+        else:
+            kwargs = {'format': endpoint.format}
+        if endpoint.headers:
+            kwargs['headers'] = self.fill(endpoint.headers)
+        # Cold caches: measure the work, not a previous request's cache. The content types are cached per process,
+        # so without clearing them an endpoint's count would depend on which endpoints or tests ran before it.
+        caches['default'].clear()
+        ContentType.objects.clear_cache()
+
+        response = request(self.fill(endpoint.path), self.fill(endpoint.data), **kwargs)
+        # Streaming responses do their work while being consumed
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
@@ -0,0 +1,31 @@
+import json
+import sys
+
+# Compare two benchmark reports endpoint by endpoint:
+#     python -m benchmarks.compare baseline.json report.json
+# Exits with status 1 when an endpoint runs more queries than in the baseline.
+def compare(baseline, current):
+    regressions = []
+    names = sorted(set(baseline['endpoints']) | set(current['endpoints']))
+    print(f"{'endpoint':40} {'queries':>13} {'ms':>19} {'bytes':>19}")
+    for name in names:
+        before = baseline['endpoints'].get(name)
+        after = current['endpoints'].get(name)
+        if before is None or after is None:
+            print(f"{name:40} {'added' if before is None else 'removed':>13}")
+            continue
+        print(
+            f"{name:40} {before['queries']:>5} -> {after['queries']:<5} "
+            f"{before['ms']:>8.1f} -> {after['ms']:<8.1f} {before['bytes']:>8} -> {after['bytes']:<8}"
+        )
+        if after['queries'] > before['queries']:
+            regressions.append(name)
+    return regressions
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m benchmarks.compare BASELINE CURRENT")
+    with open(sys.argv[1]) as baseline, open(sys.argv[2]) as current:
+        regressions = compare(json.load(baseline), json.load(current))
+    if regressions:
+        sys.exit(f"More queries than the baseline: {', '.join(regressions)}")
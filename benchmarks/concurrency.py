@@ -0,0 +1,148 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import django
+from django.conf import settings
+
+# Concurrency benchmark of the SQLite connection profiles (see social_media_api/database.py):
+#     python -m benchmarks.concurrency [--threads 8] [--seconds 5] [--write-ratio 0.2]
+# Every profile gets its own database file seeded with the same posts. Each thread then plays a request worker:
+# a request opens (or reuses) the thread's connection, reads a page of an author's posts or writes a post, and
+# ends the way Django ends a request, so connections are closed or kept as the profile's CONN_MAX_AGE says.
+# Requests failing with "database is locked" count as errors, not throughput.
+
+PROFILES = ['default', 'production']
+
+AUTHORS = 200
+POSTS_PER_AUTHOR = 50
+PAGE_SIZE = 20
+
+SCHEMA = [
+    'CREATE TABLE author (id INTEGER PRIMARY KEY, post_count INTEGER NOT NULL)',
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER NOT NULL REFERENCES author (id), content TEXT NOT NULL, created_at REAL NOT NULL)',
+    'CREATE INDEX post_author_recent ON post (author_id, created_at DESC)',
+]
+
+# Configure Django with one database per profile, each in a file of `directory`
+def configure(directory):
+    from social_media_api.database import sqlite_database
+    settings.configure(
+        DATABASES={
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'unused.sqlite3')},
+            **{profile: sqlite_database(os.path.join(directory, f'{profile}.sqlite3'), profile) for profile in PROFILES},
+        },
+        USE_TZ=True,
+    )
+    django.setup()
+
+# Create the schema and the posts of a profile's database
+def seed(alias):
+    from django.db import connections, transaction
+    rng = random.Random(42)
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        cursor.executemany('INSERT INTO author (id, post_count) VALUES (%s, %s)', [(author, POSTS_PER_AUTHOR) for author in range(AUTHORS)])
+        cursor.executemany(
+            'INSERT INTO post (author_id, content, created_at) VALUES (%s, %s, %s)',
+            [(author, 'x' * rng.randint(20, 280), rng.random() * 1e6) for author in range(AUTHORS) for _ in range(POSTS_PER_AUTHOR)],
+        )
+    connections[alias].close()
+
+# One request: read an author's latest posts, or write a post and bump the author's counter in a transaction
+def handle_request(alias, rng, write_ratio):
+    from django.db import connections, transaction
+    connection = connections[alias]
+    connection.close_if_unusable_or_obsolete()  # What Django does on request_started
+    try:
+        author = rng.randrange(AUTHORS)
+        if rng.random() < write_ratio:
+            with transaction.atomic(using=alias), connection.cursor() as cursor:
+                cursor.execute('SELECT post_count FROM author WHERE id = %s', [author])
+                cursor.execute('INSERT INTO post (author_id, content, created_at) VALUES (%s, %s, %s)', [author, 'new post', time.time()])
+                cursor.execute('UPDATE author SET post_count = post_count + 1 WHERE id = %s', [author])
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT post.id, post.content, post.created_at, author.post_count FROM post JOIN author ON author.id = post.author_id '
+                    'WHERE post.author_id = %s ORDER BY post.created_at DESC LIMIT %s',
+                    [author, PAGE_SIZE],
+                )
+                cursor.fetchall()
+    finally:
+        connection.close_if_unusable_or_obsolete()  # What Django does on request_finished
+
+# Run request workers against a profile's database for `seconds`, returning (latencies of successful requests, errors)
+def run(alias, threads, seconds, write_ratio):
+    from django.db import OperationalError, connections
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker(index):
+        rng = random.Random(index)
+        local_latencies = []
+        local_errors = 0
+        start.wait()
+        deadline = time.perf_counter() + seconds
+        while (began := time.perf_counter()) < deadline:
+            try:
+                handle_request(alias, rng, write_ratio)
+            except OperationalError:
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - began)
+        connections[alias].close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, sum(errors)
+
+# The PRAGMAs a new connection of the profile ends up with, to show the profile is applied on open
+def effective_pragmas(alias):
+    from django.db import connections
+    values = {}
+    with connections[alias].cursor() as cursor:
+        for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout', 'temp_store'):
+            cursor.execute(f'PRAGMA {pragma}')
+            values[pragma] = cursor.fetchone()[0]
+    connections[alias].close()
+    return values
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the throughput of the SQLite connection profiles under concurrent requests.")
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent request workers")
+    parser.add_argument('--seconds', type=float, default=5, help="Duration of each profile's run")
+    parser.add_argument('--write-ratio', type=float, default=0.2, help="Share of requests that write")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure(directory)
+        print(f"{args.threads} threads, {args.seconds:g} s per profile, {args.write_ratio:.0%} writes\n")
+        print(f"{'profile':12} {'requests/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}  pragmas")
+        for profile in PROFILES:
+            seed(profile)
+            pragmas = effective_pragmas(profile)
+            latencies, errors = run(profile, args.threads, args.seconds, args.write_ratio)
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000 if latencies else 0
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+            print(
+                f"{profile:12} {len(latencies) / args.seconds:>11.0f} {p50:>8.2f} {p99:>8.2f} {errors:>7}  "
+                + ', '.join(f'{name}={value}' for name, value in pragmas.items())
+            )
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+# One benchmarked request. The path and data may contain {placeholders} filled from the benchmark context
+# (ids picked from the seeded dataset). "user" names the context user sending the request (None for anonymous),
+# "format" is the request encoding ('json', 'multipart' for views that only parse forms, or 'raw' to send bytes
+# as they are), and "headers" are extra request headers.
+Endpoint = namedtuple('Endpoint', ['name', 'method', 'path', 'data', 'user', 'format', 'headers'], defaults=[None, 'reader', 'json', None])
+
+ENDPOINTS = [
+    # users.urls
+    Endpoint('users.token_obtain_pair', 'post', '/user/api/token/', {'username': '{reader_username}', 'password': '{password}'}, user=None),
+    Endpoint('users.token_refresh', 'post', '/user/api/token/refresh/', {'refresh': '{reader_refresh}'}, user=None),
+    Endpoint('users.register', 'post', '/user/register/', {'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'Newcomer-pass-1'}, user=None, format='multipart'),
+    Endpoint('users.login', 'post', '/user/login/', {'username': '{reader_username}', 'password': '{password}'}, user=None),
+    Endpoint('users.profile', 'get', '/user/profile/'),
+    Endpoint('users.profile_update', 'put', '/user/profile/update/', {'bio': 'Updated bio'}, format='multipart'),
+    Endpoint('users.profile_delete', 'delete', '/user/profile/delete/', user='celebrity'),
+    Endpoint('users.follow_user', 'post', '/user/follow/{not_followed_id}/'),
+    Endpoint('users.unfollow_user', 'post', '/user/unfollow/{followed_id}/'),
+    Endpoint('users.export', 'get', '/user/export/'),
+    Endpoint('users.api_root', 'get', '/user/'),
+    Endpoint('users.cover_profile_list', 'get', '/user/cover_profile/'),
+    Endpoint('users.cover_profile_create', 'post', '/user/cover_profile/', {}, user='celebrity', format='multipart'),
+    Endpoint('users.cover_profile_retrieve', 'get', '/user/cover_profile/{cover_profile_id}/'),
+    Endpoint('users.cover_profile_update', 'put', '/user/cover_profile/{cover_profile_id}/', {}, format='multipart'),
+    Endpoint('users.cover_profile_partial_update', 'patch', '/user/cover_profile/{cover_profile_id}/', {}, format='multipart'),
+    Endpoint('users.cover_profile_destroy', 'delete', '/user/cover_profile/{cover_profile_id}/'),
+
+    # posts.urls
+    Endpoint('posts.api_root', 'get', '/posts/'),
+    Endpoint('posts.post_list', 'get', '/posts/posts_all/'),
+    Endpoint('posts.post_list_search', 'get', '/posts/posts_all/?search=topic'),
+    Endpoint('posts.post_create', 'post', '/posts/posts_all/', {'title': 'Benchmark post', 'content': 'Benchmark content'}),
+    Endpoint('posts.post_bulk_create', 'post', '/posts/posts_all/bulk/', [{'title': f'Imported post {number}', 'content': 'Imported content'} for number in range(100)]),
+    Endpoint('posts.post_retrieve', 'get', '/posts/posts_all/{hot_post_id}/'),
+    Endpoint('posts.post_update', 'put', '/posts/posts_all/{own_post_id}/', {'title': 'Edited post', 'content': 'Edited content'}),
+    Endpoint('posts.post_partial_update', 'patch', '/posts/posts_all/{own_post_id}/', {'title': 'Edited title'}),
+    Endpoint('posts.post_destroy', 'delete', '/posts/posts_all/{own_post_id}/'),
+    Endpoint('posts.comment_list', 'get', '/posts/comments_all/'),
+    Endpoint('posts.comment_create', 'post', '/posts/comments_all/', {'post': '{hot_post_id}', 'content': 'Benchmark comment'}),
+    Endpoint('posts.comment_bulk_create', 'post', '/posts/comments_all/bulk/', [{'post': '{hot_post_id}', 'content': f'Imported comment {number}'} for number in range(100)]),
+    Endpoint('posts.comment_retrieve', 'get', '/posts/comments_all/{own_comment_id}/'),
+    Endpoint('posts.comment_update', 'put', '/posts/comments_all/{own_comment_id}/', {'post': '{hot_post_id}', 'content': 'Edited comment'}),
+    Endpoint('posts.comment_partial_update', 'patch', '/posts/comments_all/{own_comment_id}/', {'content': 'Edited comment'}),
+    Endpoint('posts.comment_destroy', 'delete', '/posts/comments_all/{own_comment_id}/'),
+    Endpoint('posts.search_posts', 'get', '/posts/search/?q=topic&type=posts'),
+    Endpoint('posts.search_comments', 'get', '/posts/search/?q=comment&type=comments'),
+    Endpoint('posts.feed', 'get', '/posts/feed/'),
+    Endpoint('posts.like', 'post', '/posts/{not_liked_post_id}/like/'),
+    Endpoint('posts.unlike', 'delete', '/posts/{liked_post_id}/unlike/'),
+
+    # notifications.urls
+    Endpoint('notifications.list', 'get', '/notifications/list/'),
+    Endpoint('notifications.unread_count', 'get', '/notifications/unread_count/'),
+    Endpoint('notifications.bulk_read', 'post', '/notifications/read/', {'up_to_id': '{notification_id}'}),
+    Endpoint('notifications.read', 'post', '/notifications/{notification_id}/read/'),
+    Endpoint('notifications.read_delete', 'delete', '/notifications/{notification_id}/read/'),
+    Endpoint('notifications.unread', 'post', '/notifications/{notification_id}/unread/'),
+    Endpoint('notifications.unread_delete', 'delete', '/notifications/{notification_id}/unread/'),
+
+    # messaging.urls
+    Endpoint('messaging.message_list', 'get', '/messaging/messages/'),
+    Endpoint('messaging.message_list_box', 'get', '/messaging/messages/?box=received'),
+    Endpoint('messaging.message_create', 'post', '/messaging/messages/', {'receiver': '{correspondent_id}', 'content': 'Benchmark message'}),
+    Endpoint('messaging.message_read', 'put', '/messaging/messages/{received_message_id}/'),
+    Endpoint('messaging.conversation_list', 'get', '/messaging/conversations/'),
+    Endpoint('messaging.conversation_messages', 'get', '/messaging/conversations/{conversation_id}/messages/'),
+    Endpoint('messaging.conversation_read', 'post', '/messaging/conversations/{conversation_id}/read/', {}),
+
+    # uploads.urls
+    Endpoint('uploads.start', 'post', '/uploads/', {'filename': 'photo.png', 'size': 1024}),
+    Endpoint('uploads.status', 'get', '/uploads/{upload_id}/'),
+    Endpoint('uploads.chunk', 'put', '/uploads/{upload_id}/', b'\x89PNG\r\n\x1a\n', format='raw', headers={'Content-Range': 'bytes 0-7/{upload_size}'}),
+    Endpoint('uploads.complete', 'post', '/uploads/{received_upload_id}/complete/'),
+    Endpoint('uploads.cancel', 'delete', '/uploads/{upload_id}/'),
+
+    # Batch requests (a client's start-up screen in one round trip)
+    Endpoint('batch', 'post', '/batch/', {'requests': [
+        {'method': 'GET', 'path': '/user/profile/'},
+        {'method': 'GET', 'path': '/posts/feed/'},
+        {'method': 'GET', 'path': '/notifications/unread_count/'},
+        {'method': 'GET', 'path': '/messaging/conversations/'},
+    ]}),
+]
+
+# URL configurations every route of which must be benchmarked
+BENCHMARKED_URLCONFS = ['users.urls', 'posts.urls', 'notifications.urls', 'messaging.urls', 'uploads.urls']
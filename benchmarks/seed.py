@@ -0,0 +1,132 @@
+import random
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Count
+from posts.models import Post, Comment, Like, TimelineEntry
+from posts.timeline import pull_author_ids
+from notifications.models import Notification, NotificationActor, UnreadNotificationCounter
+from messaging.models import Conversation, Message
+from users.counters import recount_counters
+
+User = get_user_model()  # Custom user model
+
+BATCH_SIZE = 1000
+PASSWORD = 'benchmark-password'
+
+# Pick a value from a Pareto (power-law) distribution: most draws are small, a few are very large
+def _pareto(rng, alpha, scale, maximum):
+    return min(int(rng.paretovariate(alpha) * scale), maximum)
+
+# Seed a dataset shaped like a real social network: follower counts follow a power law, so a few
+# "celebrity" accounts have most of the followers, and activity concentrates on their posts.
+# The same seed always builds the same dataset, so reports from different runs can be compared.
+def seed_dataset(users=2000, seed=42):
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)  # Hashed once: hashing per user would dominate seeding
+
+    User.objects.bulk_create(
+        [User(username=f'user{index}', email=f'user{index}@example.com', password=password, bio=f'Bio of user {index}') for index in range(users)],
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+
+    # Users ranked by popularity: the chance of being followed falls off as 1 / rank
+    popularity = [1 / (rank + 1) for rank in range(len(user_ids))]
+
+    # Follow graph: each user follows a power-law distributed number of mostly popular users
+    Follow = User.followers.through
+    edges = set()
+    for follower_id in user_ids:
+        for followed_id in rng.choices(user_ids, weights=popularity, k=_pareto(rng, 1.5, 5, 300)):
+            if followed_id != follower_id:
+                edges.add((followed_id, follower_id))
+    Follow.objects.bulk_create(
+        [Follow(from_customuser_id=followed_id, to_customuser_id=follower_id) for followed_id, follower_id in sorted(edges)],
+        batch_size=BATCH_SIZE,
+    )
+
+    # Posts: most users post a little, a few post a lot
+    Post.objects.bulk_create(
+        [
+            Post(author_id=author_id, title=f'Post {number} by user {author_id}', content=f'Benchmark content {rng.randint(0, 10 ** 6)} about topic {rng.randint(0, 50)}')
+            for author_id in user_ids
+            for number in range(_pareto(rng, 1.2, 2, 100))
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    posts = list(Post.objects.values_list('id', 'author_id'))
+    rank = {user_id: index for index, user_id in enumerate(user_ids)}
+    post_weights = [popularity[rank[author_id]] for _, author_id in posts]
+
+    # Comments and likes land mostly on popular authors' posts
+    Comment.objects.bulk_create(
+        [
+            Comment(post_id=post_id, author_id=rng.choice(user_ids), content=f'Comment {number}')
+            for number, (post_id, _) in enumerate(rng.choices(posts, weights=post_weights, k=len(posts) * 2))
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    likes = {(rng.choice(user_ids), post_id) for post_id, _ in rng.choices(posts, weights=post_weights, k=len(posts) * 4)}
+    Like.objects.bulk_create([Like(user_id=user_id, post_id=post_id) for user_id, post_id in likes], batch_size=BATCH_SIZE)
+
+    recount_counters(User.objects.all())
+
+    # Home timelines of authors below the fan-out threshold (celebrities are merged in at read time)
+    pull_ids = pull_author_ids()
+    timeline_sql = (
+        f"INSERT INTO {TimelineEntry._meta.db_table} (owner_id, post_id, author_id, created_at) "
+        f"SELECT follow.to_customuser_id, post.id, post.author_id, post.created_at "
+        f"FROM {Follow._meta.db_table} follow JOIN {Post._meta.db_table} post ON post.author_id = follow.from_customuser_id"
+    )
+    params = []
+    if pull_ids:
+        timeline_sql += f" WHERE post.author_id NOT IN ({', '.join(['%s'] * len(pull_ids))})"
+        params = list(pull_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(timeline_sql, params)
+
+    # Notifications about likes and comments for post authors, half of them already read
+    post_type = ContentType.objects.get_for_model(Post)
+    notifications = []
+    for post_id, author_id in rng.choices(posts, weights=post_weights, k=len(posts) * 2):
+        actor_id = rng.choice(user_ids)
+        notifications.append(Notification(
+            recipient_id=author_id, actor_id=actor_id, verb=rng.choice(['liked your post', 'commented on your post']),
+            target_content_type=post_type, target_object_id=post_id, recent_actors=[actor_id], is_read=rng.random() < 0.5,
+        ))
+    Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+    NotificationActor.objects.bulk_create(
+        [NotificationActor(notification_id=notification.pk, actor_id=notification.actor_id, acted_at=notification.timestamp) for notification in notifications],
+        batch_size=BATCH_SIZE,
+    )
+    unread = Notification.objects.filter(is_read=False).order_by().values('recipient').annotate(total=Count('id')).values_list('recipient', 'total')
+    UnreadNotificationCounter.objects.bulk_create([UnreadNotificationCounter(user_id=user_id, count=total) for user_id, total in unread], batch_size=BATCH_SIZE)
+
+    # Direct messages, through the conversation manager so inboxes are consistent
+    users_by_id = User.objects.in_bulk(user_ids[:200])
+    talkers = list(users_by_id.values())
+    for number in range(users):
+        sender, receiver = rng.sample(talkers, 2)
+        message = Message.objects.create(
+            sender=sender, receiver=receiver, content=f'Message {number}', conversation=Conversation.objects.between(sender, receiver),
+        )
+        Conversation.objects.record_message(message)
+
+    return dataset_summary()
+
+# Row counts of the seeded tables, recorded in the benchmark report
+def dataset_summary():
+    Follow = User.followers.through
+    return {
+        'users': User.objects.count(),
+        'follows': Follow.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'likes': Like.objects.count(),
+        'timeline_entries': TimelineEntry.objects.count(),
+        'notifications': Notification.objects.count(),
+        'messages': Message.objects.count(),
+        'conversations': Conversation.objects.count(),
+    }
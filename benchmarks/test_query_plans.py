@@ -0,0 +1,96 @@
+import re
+from django.db import connection, transaction
+from .base import SeededTestCase
+from .endpoints import ENDPOINTS
+
+# Statements whose plans are checked (inserts of literal rows have no plan worth checking)
+EXPLAINED_STATEMENT = re.compile(r'\s*(SELECT|WITH|UPDATE|DELETE)\b', re.IGNORECASE)
+
+# Plan steps reading every row of a table, and sorts done in a temporary B-tree instead of read in index order
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+TEMP_SORT = re.compile(r'^USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY$')
+TABLE_STEP = re.compile(r'^(?:SCAN|SEARCH) (\w+)')
+# Plan steps starting a nested query (subquery, view, compound select), whose steps form their own query level
+NESTED_QUERY = re.compile(r'^(CO-ROUTINE|MATERIALIZE|SUBQUERY|CORRELATED|LIST SUBQUERY|SCALAR SUBQUERY|COMPOUND|MERGE)')
+
+# Reviewed exceptions, as (endpoint, plan problem) -> reason. Keep this list short: every entry is a query that
+# reads more rows than it returns.
+ALLOWED = {
+    ('posts.post_list', 'scan posts_post'): "Pages through every post in primary key order, stopping at the page size",
+    ('posts.comment_list', 'scan posts_comment'): "Pages through every comment in primary key order, stopping at the page size",
+    ('users.export', 'sort messaging_message'): "Sent and received messages come from two indexes and are sorted once for the whole export",
+}
+
+# Query plan regression test: every statement the benchmarked endpoints run against the seeded dataset is
+# explained with EXPLAIN QUERY PLAN, and the test fails when one reads a whole table or sorts table rows in a
+# temporary B-tree, unless the case is listed in ALLOWED. Sorting a subquery's result (e.g. the few latest
+# comments of a page of posts) or full-text search matches by relevance is fine.
+class QueryPlanTest(SeededTestCase):
+    # Run an endpoint's request inside a savepoint that is rolled back, returning the plan of each of its statements
+    def explain(self, endpoint):
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if not many and EXPLAINED_STATEMENT.match(sql):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        savepoint = transaction.savepoint()
+        try:
+            with connection.execute_wrapper(capture):
+                self.send(endpoint)
+            plans = []
+            with connection.cursor() as cursor:
+                for sql, params in statements:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                    plans.append((sql, cursor.fetchall()))
+        finally:
+            transaction.savepoint_rollback(savepoint)
+        return plans
+
+    # Problems of one plan, as 'scan <table>' and 'sort <table>' strings
+    def problems(self, plan, tables):
+        parents = {step_id: parent for step_id, parent, _, _ in plan}
+        details = {step_id: detail for step_id, _, _, detail in plan}
+
+        # The nested query a step belongs to (0 for the outermost query)
+        def level(step_id):
+            parent = parents[step_id]
+            while parent and not NESTED_QUERY.match(details[parent]):
+                parent = parents[parent]
+            return parent
+
+        found = []
+        tables_by_level = {}
+        sorted_levels = set()
+        for step_id, detail in details.items():
+            match = FULL_SCAN.match(detail)
+            if match and match[1] in tables:
+                found.append(f'scan {match[1]}')
+            match = TABLE_STEP.match(detail)
+            if match and match[1] in tables and 'VIRTUAL TABLE' not in detail:
+                tables_by_level.setdefault(level(step_id), []).append(match[1])
+            if TEMP_SORT.match(detail):
+                sorted_levels.add(level(step_id))
+
+        # A sort only matters if its query reads a table (not just a subquery's result or search index matches)
+        for sorted_level in sorted_levels:
+            found += [f'sort {table}' for table in tables_by_level.get(sorted_level, [])]
+        return found
+
+    def test_query_plans(self):
+        # Only application tables: the schema catalog and full-text indexes are fine to scan
+        tables = {name for name in connection.introspection.table_names() if not name.endswith('_fts')}
+        failures = []
+        allowed_seen = set()
+        for endpoint in ENDPOINTS:
+            for sql, plan in self.explain(endpoint):
+                for problem in self.problems(plan, tables):
+                    if (endpoint.name, problem) in ALLOWED:
+                        allowed_seen.add((endpoint.name, problem))
+                    else:
+                        failures.append(f"{endpoint.name}: {problem}\n    {sql[:300]}\n    " + "\n    ".join(row[3] for row in plan))
+        self.assertFalse(failures, "Queries reading whole tables or sorting rows without an index:\n" + "\n".join(failures))
+
+        # Exceptions that no longer happen must be removed, so the list stays a list of real cases
+        self.assertFalse(set(ALLOWED) - allowed_seen, "Exceptions no longer needed in ALLOWED")
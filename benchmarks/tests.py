@@ -0,0 +1,105 @@
+import json
+import os
+import time
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+from .base import SeededTestCase
+from .endpoints import ENDPOINTS, BENCHMARKED_URLCONFS
+
+BENCHMARK_DIR = os.path.dirname(__file__)
+BUDGETS_PATH = os.path.join(BENCHMARK_DIR, 'budgets.json')
+
+# Where to write the JSON report (not written unless set)
+BENCHMARK_REPORT = os.environ.get('BENCHMARK_REPORT')
+# Set to 1 to store the measured query counts and statuses as the new budgets instead of checking them
+BENCHMARK_UPDATE_BUDGETS = os.environ.get('BENCHMARK_UPDATE_BUDGETS') == '1'
+
+# Join two URL patterns the way Django reports a resolved route
+def _join_route(prefix, route):
+    return prefix + route.removeprefix('^') if prefix else route
+
+# List the (route, method) pairs served by the benchmarked URL configurations
+def benchmarked_routes():
+    routes = set()
+
+    def walk(patterns, prefix, benchmarked):
+        for pattern in patterns:
+            route = _join_route(prefix, str(pattern.pattern))
+            if isinstance(pattern, URLResolver):
+                name = getattr(pattern.urlconf_module, '__name__', pattern.urlconf_name)
+                walk(pattern.url_patterns, route, benchmarked or name in BENCHMARKED_URLCONFS)
+            elif benchmarked and 'format' not in route:  # Format suffix variants serve the same views
+                actions = getattr(pattern.callback, 'actions', None)
+                view_class = getattr(pattern.callback, 'view_class', None)
+                for method in ('get', 'post', 'put', 'patch', 'delete'):
+                    if (method in actions) if actions else hasattr(view_class, method):
+                        routes.add((route, method))
+
+    walk(get_resolver().url_patterns, '', False)
+    return routes
+
+# Query-count regression benchmark of every API endpoint, run against a seeded power-law dataset:
+#     BENCHMARK=1 python manage.py test benchmarks
+# Each endpoint is requested once with a cold cache and rolled back afterwards. The test fails when an endpoint
+# runs more queries than its budget in budgets.json or answers with another status than the one stored there.
+# Wall times depend on the machine, so they are only written to the report (with the response sizes), never checked.
+class EndpointBenchmark(SeededTestCase):
+    # Send one request inside a savepoint that is rolled back, so every endpoint sees the same data
+    def measure(self, endpoint):
+        savepoint = transaction.savepoint()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response, content = self.send(endpoint)
+                elapsed = time.perf_counter() - start
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+        match = response.resolver_match
+        return {
+            'route': (match.route, endpoint.method) if match else None,
+            'status': response.status_code,
+            'queries': len(queries),
+            'ms': round(elapsed * 1000, 2),
+            'bytes': len(content),
+        }
+
+    def test_endpoints(self):
+        results = {endpoint.name: self.measure(endpoint) for endpoint in ENDPOINTS}
+
+        # Every route of the benchmarked URL configurations must be exercised
+        covered = {tuple(result.pop('route')) for result in results.values() if result['route']}
+        missing = sorted(benchmarked_routes() - covered)
+        self.assertFalse(missing, f"Routes without a benchmark: {missing}")
+
+        report = {
+            'dataset': self.dataset,
+            'endpoints': results,
+            'totals': {key: round(sum(result[key] for result in results.values()), 2) for key in ('queries', 'ms', 'bytes')},
+        }
+        if BENCHMARK_REPORT:
+            with open(BENCHMARK_REPORT, 'w') as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+
+        if BENCHMARK_UPDATE_BUDGETS:
+            budgets = {name: {'queries': result['queries'], 'status': result['status']} for name, result in results.items()}
+            with open(BUDGETS_PATH, 'w') as file:
+                json.dump(budgets, file, indent=2, sort_keys=True)
+                file.write('\n')
+            return
+
+        with open(BUDGETS_PATH) as file:
+            budgets = json.load(file)
+
+        failures = []
+        for name, result in sorted(results.items()):
+            budget = budgets.get(name)
+            if budget is None:
+                failures.append(f"{name}: no budget (run with BENCHMARK=1 BENCHMARK_UPDATE_BUDGETS=1)")
+                continue
+            if result['status'] != budget['status']:
+                failures.append(f"{name}: status {result['status']}, expected {budget['status']}")
+            if result['queries'] > budget['queries']:
+                failures.append(f"{name}: {result['queries']} queries, budget {budget['queries']}")
+        self.assertFalse(failures, "Benchmark budgets exceeded:\n" + "\n".join(failures))
@@ -1,9 +1,14 @@
 from django.contrib import admin
-from .models import Message
+from .models import Message, Conversation
 
 class MessageAdmin(admin.ModelAdmin):
     list_display = ("sender", "receiver", "is_read", "created_at", "updated_at")  # Fields to be displayed in the admin panel
     list_filter = ("sender", "is_read", "created_at", "updated_at") # Adding filters for easy searching
     search_fields = ("sender", "receiver", "is_read") # Adding search fields
 
-admin.site.register(Message, MessageAdmin)
\ No newline at end of file
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ("user_one", "user_two", "last_message_at", "created_at")  # Fields to be displayed in the admin panel
+    raw_id_fields = ("user_one", "user_two", "last_message")  # Avoid loading every user and message into select boxes
+
+admin.site.register(Message, MessageAdmin)
+admin.site.register(Conversation, ConversationAdmin)
\ No newline at end of file
@@ -0,0 +1,102 @@
+# Generated by Django 5.2 on 2026-10-18 04:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+# Group existing messages into conversations and fill in each participant's inbox row
+def backfill_conversations(apps, schema_editor):
+    Message = apps.get_model('messaging', 'Message')
+    Conversation = apps.get_model('messaging', 'Conversation')
+    ConversationParticipant = apps.get_model('messaging', 'ConversationParticipant')
+
+    pairs = {tuple(sorted(pair)) for pair in Message.objects.values_list('sender_id', 'receiver_id').distinct()}
+    for user_one_id, user_two_id in pairs:
+        between = Q(sender_id=user_one_id, receiver_id=user_two_id) | Q(sender_id=user_two_id, receiver_id=user_one_id)
+        last_message = Message.objects.filter(between).order_by('-created_at', '-id').first()
+        conversation = Conversation.objects.create(
+            user_one_id=user_one_id, user_two_id=user_two_id,
+            last_message=last_message, last_message_at=last_message.created_at,
+        )
+        Message.objects.filter(between).update(conversation=conversation)
+
+        unread = dict(
+            Message.objects.filter(conversation=conversation, is_read=False)
+            .values_list('receiver_id').annotate(total=Count('id'))
+        )
+        ConversationParticipant.objects.bulk_create([
+            ConversationParticipant(
+                conversation=conversation, user_id=user_id, other_user_id=other_user_id,
+                unread_count=unread.get(user_id, 0), last_message_at=last_message.created_at,
+            )
+            for user_id, other_user_id in ((user_one_id, user_two_id), (user_two_id, user_one_id))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message')),
+                ('user_one', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_two', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='messaging.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-created_at'], name='conversation_history_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='messaging.conversation'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='other_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversation',
+            unique_together={('user_one', 'user_two')},
+        ),
+        migrations.AddIndex(
+            model_name='conversationparticipant',
+            index=models.Index(fields=['user', '-last_message_at'], name='inbox_recent_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversationparticipant',
+            unique_together={('conversation', 'user')},
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
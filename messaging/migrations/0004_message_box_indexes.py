@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 05:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_sent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_received_idx',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', '-created_at', '-id'], name='message_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['receiver', '-created_at', '-id'], name='message_received_idx'),
+        ),
+    ]
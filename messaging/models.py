@@ -1,16 +1,79 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 
 User = get_user_model()  # Custom user model
 
+# Custom manager for conversations
+class ConversationManager(models.Manager):
+    # Get (or start) the conversation between two users, stored once per pair with the lower user id first
+    def between(self, user, other_user):
+        user_one_id, user_two_id = sorted([user.pk, other_user.pk])
+        with transaction.atomic():
+            conversation, created = self.get_or_create(user_one_id=user_one_id, user_two_id=user_two_id)
+            if created:
+                ConversationParticipant.objects.bulk_create([
+                    ConversationParticipant(conversation=conversation, user_id=user_one_id, other_user_id=user_two_id),
+                    ConversationParticipant(conversation=conversation, user_id=user_two_id, other_user_id=user_one_id),
+                ])
+        return conversation
+
+    # Move a conversation to the top of both inboxes and count the message as unread for its receiver
+    def record_message(self, message):
+        self.filter(pk=message.conversation_id).update(last_message=message, last_message_at=message.created_at)
+        participants = ConversationParticipant.objects.filter(conversation_id=message.conversation_id)
+        participants.update(last_message_at=message.created_at)
+        participants.filter(user_id=message.receiver_id).update(unread_count=F('unread_count') + 1)
+
+# A direct-message thread between two users
+class Conversation(models.Model):
+    user_one = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")  # The participant with the lower id
+    user_two = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")  # The participant with the higher id
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ConversationManager()
+
+    class Meta:
+        unique_together = ['user_one', 'user_two']
+
+    def __str__(self):
+        return f"Conversation between {self.user_one} and {self.user_two}"
+
+# One row per user and conversation, holding what that user's inbox needs
+class ConversationParticipant(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="participants")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations")  # The inbox owner
+    other_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")  # The person they talk to
+    unread_count = models.PositiveIntegerField(default=0)  # Messages received in this conversation and not read yet
+    last_message_at = models.DateTimeField(null=True, blank=True)  # Copied from the conversation so the inbox is one index scan
+
+    class Meta:
+        unique_together = ['conversation', 'user']
+        indexes = [
+            models.Index(fields=['user', '-last_message_at', '-id'], name='inbox_recent_idx'),  # Id included for keyset pagination
+        ]
+
+    def __str__(self):
+        return f"{self.user}'s conversation with {self.other_user}"
+
 class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_messages")
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="received_messages")
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True, related_name="messages")
     content = models.TextField(null=False, blank=False)
     image = models.ImageField(upload_to="inbox_images/", null=True, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation', '-created_at', '-id'], name='conversation_history_idx'),  # Id included for keyset pagination
+            models.Index(fields=['sender', '-created_at', '-id'], name='message_sent_idx'),  # A user's sent messages, newest first
+            models.Index(fields=['receiver', '-created_at', '-id'], name='message_received_idx'),  # A user's received messages, newest first
+        ]
  
     def __str__(self):
         return f"Message from {self.sender} to {self.receiver}"
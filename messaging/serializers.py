@@ -1,15 +1,36 @@
-from .models import Message
+from .models import Message, ConversationParticipant
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from uploads.serializers import ChunkedUploadField, ChunkedUploadsMixin, ImageVariantsField
 
 User = get_user_model()  # Using the custom User model
 
 # Serializer class for direct messages between users
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(ChunkedUploadsMixin, serializers.ModelSerializer):
     sender = serializers.PrimaryKeyRelatedField(read_only=True)
     receiver = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    conversation = serializers.PrimaryKeyRelatedField(read_only=True)  # Set from the sender and receiver
     image = serializers.ImageField(required=False)
+    image_variants = ImageVariantsField(source='image')  # Resized WebP and JPEG copies of the image, as srcset values
+    image_upload = ChunkedUploadField(target='image')  # Completed chunked upload to use as the image
 
     class Meta:
         model = Message
         fields = "__all__"
+
+# Serializer class for a conversation as listed in a user's inbox
+class ConversationSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='conversation_id', read_only=True)
+    other_user = serializers.SerializerMethodField()
+    last_message = MessageSerializer(source='conversation.last_message', read_only=True)
+
+    class Meta:
+        model = ConversationParticipant
+        fields = ["id", "other_user", "unread_count", "last_message_at", "last_message"]
+
+    def get_other_user(self, obj):
+        return {"id": obj.other_user_id, "username": obj.other_user.username}
+
+# Serializer class validating "mark conversation read up to message X"
+class MarkConversationReadSerializer(serializers.Serializer):
+    up_to = serializers.IntegerField(required=False, help_text="Mark messages up to this message id as read (all messages when omitted)")
@@ -1,3 +1,70 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from posts.tests import MediaTestCase, png_file
+from uploads.variants import generate_variants
+from .models import ConversationParticipant, Message
 
-# Create your tests here.
+User = get_user_model()  # Custom user model
+
+class MessageListTest(MediaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='password')
+        self.friends = [User.objects.create_user(username=f'friend{number}', email=f'friend{number}@example.com', password='password') for number in range(3)]
+
+    def send(self, sender, receiver, **data):
+        response = self.client_for(sender).post('/messaging/messages/', {'receiver': receiver.pk, 'content': 'Hello', **data}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        if 'image' in data:
+            generate_variants(Message.objects.get(pk=response.data['id']).image.name)
+        return response.data['id']
+
+    def test_boxes_are_paginated_newest_first(self):
+        received = [self.send(friend, self.user) for friend in self.friends for _ in range(2)]
+        sent = self.send(self.user, self.friends[0])
+        client = self.client_for(self.user)
+
+        ids, url = [], '/messaging/messages/?box=received&page_size=4'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [message['id'] for message in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, received[::-1])
+
+        self.assertEqual([message['id'] for message in client.get('/messaging/messages/?box=sent').data['results']], [sent])
+        self.assertEqual(client.get('/messaging/messages/?box=drafts').status_code, 400)
+
+    def test_list_without_box_returns_both_boxes(self):
+        received = self.send(self.friends[0], self.user)
+        sent = [self.send(self.user, friend) for friend in self.friends[:2]]
+        response = self.client_for(self.user).get('/messaging/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['id'] for message in response.data['sent_messages']], sent[::-1])
+        self.assertEqual([message['id'] for message in response.data['received_messages']], [received])
+
+    def test_marking_a_message_read_twice_decrements_once(self):
+        self.send(self.friends[0], self.user)
+        message = self.send(self.friends[0], self.user)
+        participant = ConversationParticipant.objects.get(user=self.user)
+        self.assertEqual(participant.unread_count, 2)
+
+        client = self.client_for(self.user)
+        for _ in range(2):
+            self.assertEqual(client.put(f'/messaging/messages/{message}/').status_code, 200)
+        participant.refresh_from_db()
+        self.assertEqual(participant.unread_count, 1)
+        self.assertTrue(Message.objects.get(pk=message).is_read)
+
+    def test_inbox_loads_image_variants_once_per_page(self):
+        def inbox_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client_for(self.user).get('/messaging/conversations/')
+            self.assertTrue(all(conversation['last_message']['image_variants'] for conversation in response.data['results']))
+            return len(queries)
+
+        self.send(self.friends[0], self.user, image=png_file())
+        single = inbox_queries()
+        for number, friend in enumerate(self.friends[1:], start=1):
+            self.send(friend, self.user, image=png_file(size=(320 + number, 200)))  # Distinct images
+        self.assertEqual(inbox_queries(), single)
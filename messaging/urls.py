@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import ListCreateMessageView, MarkMessageAsReadView
+from .views import ListCreateMessageView, MarkMessageAsReadView, ConversationListView, ConversationMessagesView, MarkConversationReadView
 
 urlpatterns = [
     path("messages/", ListCreateMessageView.as_view(), name="message-list"),
     path("messages/<int:message_id>/", MarkMessageAsReadView.as_view(), name="message-read"),
+    path("conversations/", ConversationListView.as_view(), name="conversation-list"),
+    path("conversations/<int:conversation_id>/messages/", ConversationMessagesView.as_view(), name="conversation-messages"),
+    path("conversations/<int:conversation_id>/read/", MarkConversationReadView.as_view(), name="conversation-read"),
 ]
\ No newline at end of file
@@ -1,44 +1,55 @@
 from django.shortcuts import get_object_or_404
-from .serializers import MessageSerializer
-from .models import Message
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .serializers import MessageSerializer, ConversationSerializer, MarkConversationReadSerializer
+from .models import Message, Conversation, ConversationParticipant
 from django.contrib.auth import get_user_model
 from rest_framework import generics, status, filters, views
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated
-from notifications.models import Notification
-from django.contrib.contenttypes.models import ContentType
+from notifications.dispatch import notify
+from social_media_api.realtime import is_listening, publish_to_user
+from uploads.variants import schedule_variants
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from social_media_api.pagination import KeysetPagination
 
 User = get_user_model() # Using the custom User model
 
+# Pagination class for the inbox and message history, using keyset cursors (pass ?page=N for page numbers)
+class MessagePagination(KeysetPagination):
+    page_size = 20  # Number of conversations or messages per page
+
 class ListCreateMessageView(generics.ListCreateAPIView):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer # ListMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessagePagination
+
+    # With ?box=, messages are listed one box at a time, each read newest first from its (user, created_at, id) index
+    BOXES = {'received': 'receiver', 'sent': 'sender'}
+
+    def box_messages(self, box):
+        return Message.objects.filter(**{self.BOXES[box]: self.request.user}).order_by("-created_at", "-id")
+
+    def get_queryset(self):
+        box = self.request.query_params.get('box', 'received')
+        if box not in self.BOXES:
+            raise ValidationError({"message": f"Unknown box '{box}'; use 'received' or 'sent'."})
+        return self.box_messages(box)
 
     def list(self, request, *args, **kwargs):
-        user = request.user  # Current user requesting the data
-
-        # Fetch sent and received messages for the user
-        sent_messages = Message.objects.filter(sender=user).order_by("-created_at")  # Get messages sent by the current user
-        received_messages =  Message.objects.filter(receiver=user).order_by("-created_at") # Get messages received by the current user
-        
-        # Serializing sent_messages & received_messages
-        sent_messages_serializer = self.get_serializer(sent_messages, many=True)
-        received_messages_serializer = self.get_serializer(received_messages, many=True)
-        
-        # Return a response with serialized data
+        if 'box' in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        # Without a box, keep returning both boxes in full, as existing clients expect
         return Response({
-            "sent_messages":sent_messages_serializer.data,
-            "received_messages":received_messages_serializer.data,
+            "sent_messages": self.get_serializer(self.box_messages('sent'), many=True).data,
+            "received_messages": self.get_serializer(self.box_messages('received'), many=True).data,
             }, status=status.HTTP_200_OK)
-    '''
-    def get_queryset(self):
-        # Fetch the messages for the authenticated user
-        user = self.request.user
-        return Message.objects.filter(sender=user).order_by("-created_at") | Message.objects.filter(receiver=user).order_by("-created_at") # User.objects.filter(receiver=user) 
-    '''
+
     def perform_create(self, serializer):
         # Save the message and set sender
         receiver_id = self.request.data.get("receiver")
@@ -48,22 +59,33 @@ class ListCreateMessageView(generics.ListCreateAPIView):
         if receiver == user:
             raise PermissionDenied("You cannot send message to yourself")
 
-        # Save the message and get the instance
-        message = serializer.save(sender=user)
+        # Save the message in the conversation between both users and move it to the top of their inboxes
+        with transaction.atomic():
+            conversation = Conversation.objects.between(user, receiver)
+            message = serializer.save(sender=user, conversation=conversation)
+            Conversation.objects.record_message(message)
+        schedule_variants(message.image)
 
-        # Create a notification for the receiver
-        notification = Notification.objects.create(
+        # Push the message to the receiver's open event streams
+        if is_listening(receiver.id):
+            data = MessageSerializer(message, context=self.get_serializer_context()).data
+            transaction.on_commit(lambda: publish_to_user(receiver.id, 'message', data))
+
+        # Create a notification for the receiver (every message is its own target, so these are never grouped)
+        notify(
             recipient=receiver,  # The receiver of the message
             actor=user,  # The user who sent the message
             verb='Direct message',  # Verb explaining the action
-            target_content_type=ContentType.objects.get_for_model(Message),  # The content type of the Message model
-            target_object_id=message.id  # The specific message ID that was just created
+            target=message,  # The specific message that was just created
         )
 
     # Apply swagger documentation
     @swagger_auto_schema(
         operation_summary="Retrieve a list of received messages",
-        operation_description="Get a list of received messages with optional filtering, searching, and ordering."
+        operation_description="Get the sent and received messages, newest first. Pass `box=received` or `box=sent` to page through one box with cursors instead; follow the `next` link to load older messages.",
+        manual_parameters=[
+            openapi.Parameter('box', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['received', 'sent'], description="Box to page through (both boxes, unpaginated, when omitted)"),
+        ],
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
@@ -89,12 +111,84 @@ class MarkMessageAsReadView(views.APIView):
         try:
             # Attempting to get inbox message for the user
             message = Message.objects.get(id=message_id, receiver=user)
-            message.is_read = True  # Mark message as read
-            message.save()
-
-            # Return is read message when the looked message exists
-            return Response({"message": "Message is marked as read"}, status=status.HTTP_200_OK)
-
         except Message.DoesNotExist:
             # Return not found when the message does not exist
-            return Response({"message":"Message not found"}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({"message":"Message not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Flip the flag only if it is still unset, so concurrent requests decrement the unread count once
+        if Message.objects.filter(pk=message.pk, receiver=user, is_read=False).update(is_read=True) == 1:
+            # Keep the conversation's unread count in step
+            ConversationParticipant.objects.filter(conversation_id=message.conversation_id, user=user).update(
+                unread_count=Greatest(F('unread_count') - 1, 0)
+            )
+
+        # Return is read message when the looked message exists
+        return Response({"message": "Message is marked as read"}, status=status.HTTP_200_OK)
+
+
+# View listing the current user's conversations, most recently active first
+class ConversationListView(generics.ListAPIView):
+    serializer_class = ConversationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = MessagePagination
+
+    def get_queryset(self):
+        # The user's inbox rows, read from the (user, last_message_at) index with the last message joined in
+        return ConversationParticipant.objects.filter(
+            user=self.request.user, last_message_at__isnull=False
+        ).select_related('other_user', 'conversation__last_message').order_by('-last_message_at')
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Retrieve the inbox",
+        operation_description="Get the current user's conversations ordered by last activity, each with its last message and unread count."
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+# View listing the messages of one conversation, newest first
+class ConversationMessagesView(generics.ListAPIView):
+    serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = MessagePagination
+
+    def get_queryset(self):
+        # Only participants can read a conversation
+        participant = get_object_or_404(ConversationParticipant, conversation_id=self.kwargs["conversation_id"], user=self.request.user)
+        return Message.objects.filter(conversation_id=participant.conversation_id).order_by("-created_at")
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Retrieve a conversation's messages",
+        operation_description="Get the messages of one conversation, newest first. Follow the `next` link to load older messages."
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class MarkConversationReadView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary = "Mark a conversation as read.",
+        operation_description = "Marks the received messages of a conversation as read, up to the message id given in `up_to` (or all of them).",
+        request_body = MarkConversationReadSerializer
+    )
+    def post(self, request, conversation_id):
+        participant = get_object_or_404(ConversationParticipant, conversation_id=conversation_id, user=request.user)
+        serializer = MarkConversationReadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Flip every unread received message up to the given one at once
+        messages = Message.objects.filter(conversation_id=conversation_id, receiver=request.user, is_read=False)
+        if "up_to" in serializer.validated_data:
+            messages = messages.filter(id__lte=serializer.validated_data["up_to"])
+        marked = messages.update(is_read=True)
+
+        if marked:
+            ConversationParticipant.objects.filter(pk=participant.pk).update(unread_count=Greatest(F('unread_count') - marked, 0))
+            participant.refresh_from_db(fields=['unread_count'])
+
+        return Response({"message": f"{marked} messages marked as read", "marked": marked, "unread_count": participant.unread_count}, status=status.HTTP_200_OK)
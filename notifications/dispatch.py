@@ -0,0 +1,157 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.contrib.contenttypes.models import ContentType
+from social_media_api.realtime import is_listening, publish_to_user
+from .models import Notification, NotificationEvent, PendingNotification
+
+logger = logging.getLogger(__name__)
+
+# Write a batch of events as (grouped) notifications and push them to recipients with an open event stream
+def deliver(events):
+    notifications = Notification.objects.notify_many(events)
+    publish_notifications(notifications)
+    return notifications
+
+def publish_notifications(notifications):
+    from .serializers import NotificationSerializer
+
+    # Only serialize the notifications somebody is listening for
+    listened = [notification for notification in notifications if is_listening(notification.recipient_id)]
+    if not listened:
+        return
+    for notification, data in zip(listened, NotificationSerializer(listened, many=True).data):
+        try:
+            publish_to_user(notification.recipient_id, 'notification', data)
+        except Exception:
+            logger.exception("Failed to publish notification %s", notification.pk)
+
+# Delivers every event right away, in the process that queued it
+class SyncDispatcher:
+    def enqueue(self, event):
+        deliver([event])
+
+    def enqueue_many(self, events):
+        deliver(events)
+
+    def flush(self):
+        pass
+
+# Queues events in memory and delivers them in batches from a background thread (single-node deployments)
+class ThreadDispatcher:
+    def __init__(self, batch_size=500, flush_interval=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        atexit.register(self.flush)  # Drain the queue when the process exits
+
+    def enqueue(self, event):
+        self.start()
+        self.queue.put(event)
+
+    def enqueue_many(self, events):
+        self.start()
+        for event in events:
+            self.queue.put(event)
+
+    def start(self):
+        # Start the worker thread on first use, and again if it has died
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            # Wait for an event, then collect more until the batch is full or the interval has passed
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                deliver(batch)
+            except Exception:
+                logger.exception("Failed to deliver %d notifications", len(batch))
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self):
+        # Block until every queued event has been delivered
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+# Stores events in the PendingNotification table for the process_notifications command to deliver
+class OutboxDispatcher:
+    def enqueue(self, event):
+        self.enqueue_many([event])
+
+    def enqueue_many(self, events):
+        PendingNotification.objects.bulk_create([
+            PendingNotification(
+                recipient_id=event.recipient_id, actor_id=event.actor_id, verb=event.verb,
+                target_content_type_id=event.target_content_type_id, target_object_id=event.target_object_id,
+            )
+            for event in events
+        ])
+
+    def flush(self):
+        pass
+
+# Deliver up to batch_size events from the outbox, returning how many were processed
+def drain_outbox(batch_size=500):
+    with transaction.atomic():
+        pending = list(PendingNotification.objects.order_by('id')[:batch_size])
+        if pending:
+            deliver([row.as_event() for row in pending])
+            PendingNotification.objects.filter(id__in=[row.id for row in pending]).delete()
+    return len(pending)
+
+DISPATCHERS = {
+    'sync': SyncDispatcher,
+    'thread': ThreadDispatcher,
+    'outbox': OutboxDispatcher,
+}
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+# Get the dispatcher selected by the NOTIFICATION_DISPATCHER setting
+def get_dispatcher():
+    global _dispatcher
+    name = getattr(settings, 'NOTIFICATION_DISPATCHER', 'thread')
+    with _dispatcher_lock:
+        if not isinstance(_dispatcher, DISPATCHERS[name]):
+            if name == 'thread':
+                _dispatcher = ThreadDispatcher(
+                    batch_size=getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500),
+                    flush_interval=getattr(settings, 'NOTIFICATION_FLUSH_INTERVAL', 0.5),
+                )
+            else:
+                _dispatcher = DISPATCHERS[name]()
+        return _dispatcher
+
+# Queue a notification for recipient once the current transaction commits, keeping the insert off the request path
+def notify(recipient, actor, verb, target):
+    event = NotificationEvent(recipient.pk, actor.pk, verb, ContentType.objects.get_for_model(target).pk, target.pk)
+    transaction.on_commit(lambda: get_dispatcher().enqueue(event))
+
+# Queue a batch of NotificationEvents at once (e.g. for bulk-created content) once the current transaction commits
+def notify_many(events):
+    events = list(events)
+    if events:
+        transaction.on_commit(lambda: get_dispatcher().enqueue_many(events))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.dispatch import drain_outbox
+
+# Management command running the notification worker for the "outbox" dispatcher
+class Command(BaseCommand):
+    help = "Deliver queued notifications from the outbox in batches. Run a single worker per database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of events delivered per transaction.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the outbox and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        delivered = 0
+        while True:
+            processed = drain_outbox(options['batch_size'])
+            delivered += processed
+            if processed:
+                self.stdout.write(f"Delivered {delivered} notifications...")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} notifications."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from notifications.models import UnreadNotificationCounter
+
+# Management command to repair drift in the unread notification counters
+class Command(BaseCommand):
+    help = "Recompute every unread notification counter from the notifications table."
+
+    def handle(self, *args, **options):
+        updated = UnreadNotificationCounter.objects.recount()
+        self.stdout.write(self.style.SUCCESS(f"Recounted the unread notifications of {updated} users."))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 03:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import JSONArray
+
+
+# Start the actor sample of existing notifications with their actor
+def fill_recent_actors(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(recent_actors=JSONArray('actor_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actors',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(fill_recent_actors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'target_content_type', 'target_object_id', 'verb'], name='notification_group_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 05:01
+
+import django.db.models.deletion
+import notifications.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Record the sampled actors of existing notifications; actors outside the sample were not tracked before
+def fill_notification_actors(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationActor = apps.get_model('notifications', 'NotificationActor')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    user_ids = set(User.objects.values_list('id', flat=True))
+    rows = []
+    for notification_id, recent_actors, timestamp in Notification.objects.values_list('id', 'recent_actors', 'timestamp').iterator():
+        for actor_id in dict.fromkeys(recent_actors):
+            if actor_id in user_ids:
+                rows.append(NotificationActor(notification_id=notification_id, actor_id=actor_id, acted_at=timestamp))
+    NotificationActor.objects.bulk_create(rows, batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('acted_at', models.DateTimeField()),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actor_rows', to='notifications.notification')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['actor'], name='notification_actor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('notification', 'actor'), name='unique_notification_actor')],
+            },
+        ),
+        migrations.RunPython(fill_notification_actors, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='notification',
+            name='actor',
+            field=models.ForeignKey(on_delete=notifications.models.promote_next_actor, related_name='actions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,15 +1,150 @@
 # notifications/models.py
-from django.db import models
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, Greatest, RowNumber
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
 User = get_user_model()  # Custom user model
 
+# A pending "actor did verb on target" action, as queued by the notification dispatcher
+NotificationEvent = namedtuple('NotificationEvent', ['recipient_id', 'actor_id', 'verb', 'target_content_type_id', 'target_object_id'])
+
+# Custom manager that coalesces repeated actions into grouped notifications
+class NotificationManager(models.Manager):
+    def notify(self, recipient, actor, verb, target):
+        """
+        Record that actor did verb on target, grouped with recent identical actions (see notify_many).
+        """
+        event = NotificationEvent(recipient.pk, actor.pk, verb, ContentType.objects.get_for_model(target).pk, target.pk)
+        return self.notify_many([event])[0]
+
+    def notify_many(self, events):
+        """
+        Record a batch of NotificationEvents. A repeat of the same verb on the same target for the
+        same recipient within NOTIFICATION_COALESCE_WINDOW updates the existing unread notification
+        ("alice and 41 others liked your post") instead of inserting a new row. Returns the created
+        or updated notifications, one per distinct (recipient, target, verb).
+        """
+        now = timezone.now()
+        window = timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 6 * 60 * 60))
+        sample_size = getattr(settings, 'NOTIFICATION_RECENT_ACTORS', 5)
+
+        # Merge the events of the batch that share a group, keeping each group's actors newest first
+        grouped_actors = {}
+        for event in events:
+            key = (event.recipient_id, event.target_content_type_id, event.target_object_id, event.verb)
+            actors = grouped_actors.setdefault(key, [])
+            if event.actor_id in actors:
+                actors.remove(event.actor_id)
+            actors.insert(0, event.actor_id)
+
+        with transaction.atomic():
+            # Look up the open groups of the batch, a chunk of keys per query
+            open_groups = {}
+            keys = list(grouped_actors)
+            for start in range(0, len(keys), 100):
+                key_filter = Q()
+                for recipient_id, content_type_id, object_id, verb in keys[start:start + 100]:
+                    key_filter |= Q(recipient_id=recipient_id, target_content_type_id=content_type_id, target_object_id=object_id, verb=verb)
+                for group in self.filter(key_filter, is_read=False, timestamp__gte=now - window).order_by('timestamp'):
+                    open_groups[(group.recipient_id, group.target_content_type_id, group.target_object_id, group.verb)] = group  # Newest wins
+
+            to_create, to_update = [], []
+            for key, actors in grouped_actors.items():
+                group = open_groups.get(key)
+                if group is None:
+                    recipient_id, content_type_id, object_id, verb = key
+                    to_create.append(self.model(
+                        recipient_id=recipient_id, actor_id=actors[0], verb=verb,
+                        target_content_type_id=content_type_id, target_object_id=object_id,
+                        actor_count=len(actors), recent_actors=actors[:sample_size],
+                    ))
+                    continue
+
+                group.actor_id = actors[0]  # The latest actor leads the group
+                group.timestamp = now  # Move the group back to the top of the list
+                to_update.append(group)
+            self.bulk_create(to_create)
+
+            # Record each group's actors once; an actor acting again only moves up the recent actors
+            NotificationActor.objects.bulk_create(
+                [
+                    NotificationActor(notification_id=notification.pk, actor_id=actor_id, acted_at=now)
+                    for notification in to_create + to_update
+                    for actor_id in grouped_actors[(notification.recipient_id, notification.target_content_type_id, notification.target_object_id, notification.verb)]
+                ],
+                update_conflicts=True, unique_fields=['notification', 'actor'], update_fields=['acted_at'],
+            )
+
+            if to_update:
+                # Count the distinct actors and take the recent ones from the recorded actors, rather than adding
+                # to values read earlier, so concurrent batches grouping into the same notification add up
+                updated_ids = [group.pk for group in to_update]
+                self.filter(pk__in=updated_ids).update(actor_count=NotificationActor.objects.count_subquery())
+                samples = NotificationActor.objects.recent_samples(updated_ids, sample_size)
+                for group in to_update:
+                    group.recent_actors = samples.get(group.pk, [group.actor_id])
+                self.bulk_update(to_update, ['actor', 'recent_actors', 'timestamp'])
+                actor_counts = dict(self.filter(pk__in=updated_ids).values_list('pk', 'actor_count'))
+                for group in to_update:
+                    group.actor_count = actor_counts[group.pk]
+
+            # New notifications are unread; grouped ones were already counted
+            created_per_recipient = {}
+            for notification in to_create:
+                created_per_recipient[notification.recipient_id] = created_per_recipient.get(notification.recipient_id, 0) + 1
+            for recipient_id, created in created_per_recipient.items():
+                UnreadNotificationCounter.objects.adjust(recipient_id, created)
+
+        return to_create + to_update
+
+    # Take an account out of the groups other accounts acted in too, before it is deleted: they are recounted without
+    # it and it leaves their recent actors (the latest remaining actor leads them, see promote_next_actor)
+    def remove_actor(self, actor_id):
+        others = NotificationActor.objects.filter(notification=OuterRef('pk')).exclude(actor_id=actor_id)
+        groups = self.filter(pk__in=NotificationActor.objects.filter(actor_id=actor_id).values('notification')).filter(Exists(others))
+        groups.update(actor_count=NotificationActor.objects.count_subquery(exclude_actor_id=actor_id))
+
+        changed = []
+        for group in groups.only('pk', 'recent_actors').iterator():
+            if actor_id in group.recent_actors:
+                group.recent_actors = [pk for pk in group.recent_actors if pk != actor_id]
+                changed.append(group)
+        self.bulk_update(changed, ['recent_actors'], batch_size=500)
+
+# on_delete of a notification's latest actor: the latest of its other actors leads it instead, and only the
+# notifications the deleted account was the only actor of are deleted with it
+def promote_next_actor(collector, field, sub_objs, using):
+    deleted_ids = [user.pk for user in collector.data.get(field.related_model, ())]
+    next_actors = NotificationActor.objects.using(using).filter(notification=OuterRef('pk')).exclude(actor_id__in=deleted_ids)
+    next_actor_ids = dict(
+        field.model._base_manager.using(using).filter(pk__in=[notification.pk for notification in sub_objs])
+        .annotate(next_actor_id=Subquery(next_actors.order_by('-acted_at', '-id').values('actor_id')[:1]))
+        .values_list('pk', 'next_actor_id')
+    )
+
+    lone, promoted = [], {}
+    for notification in sub_objs:
+        next_actor_id = next_actor_ids.get(notification.pk)
+        if next_actor_id is None:
+            lone.append(notification)
+        else:
+            promoted.setdefault(next_actor_id, []).append(notification)
+    for next_actor_id, notifications in promoted.items():
+        collector.add_field_update(field, next_actor_id, notifications)
+    if lone:
+        models.CASCADE(collector, field, lone, using)
+
 # Model for managing notifications
 class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
-    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='actions')
+    actor = models.ForeignKey(User, on_delete=promote_next_actor, related_name='actions')  # The latest actor of a grouped notification
     verb = models.CharField(max_length=100)  # Describes the action (e.g., "liked", "followed", "commented on")
     
     # GenericForeignKey setup
@@ -17,7 +152,116 @@ class Notification(models.Model):
     target_object_id = models.PositiveIntegerField()
     target = GenericForeignKey('target_content_type', 'target_object_id')  # This allows notifications to point to any model
     is_read = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)  # When the notification was created
+    timestamp = models.DateTimeField(auto_now_add=True)  # When the notification was created, or last grouped with another action
+    actor_count = models.PositiveIntegerField(default=1)  # Number of distinct actors grouped into this notification (see NotificationActor)
+    recent_actors = models.JSONField(default=list)  # IDs of the most recent actors, newest first
+
+    objects = NotificationManager()
+
+    class Meta:
+        indexes = [
+            # Finds the open group of a repeated action
+            models.Index(fields=['recipient', 'target_content_type', 'target_object_id', 'verb'], name='notification_group_idx'),
+            # The notification list: unread first, then newest first (id included for keyset pagination)
+            models.Index(fields=['recipient', 'is_read', '-timestamp', '-id'], name='notification_inbox_idx'),
+            # Unread notifications only (marking read, unread filters), a small fraction of the table
+            models.Index(fields=['recipient', '-timestamp', '-id'], condition=Q(is_read=False), name='notification_unread_idx'),
+        ]
 
     def __str__(self):
+        if self.actor_count > 1:
+            return f'{self.actor} and {self.actor_count - 1} others {self.verb} {self.target}'
         return f'{self.actor} {self.verb} {self.target}'
+
+# Custom manager of the actors of grouped notifications
+class NotificationActorManager(models.Manager):
+    # Subquery counting the actors of the outer query's notification
+    def count_subquery(self, exclude_actor_id=None):
+        actors = self.filter(notification=OuterRef('pk'))
+        if exclude_actor_id is not None:
+            actors = actors.exclude(actor_id=exclude_actor_id)
+        return Coalesce(Subquery(actors.order_by().values('notification').annotate(total=Count('id')).values('total')), 0)
+
+    # The most recent actors of these notifications, newest first, as {notification id: [actor ids]}
+    def recent_samples(self, notification_ids, sample_size):
+        rank = Window(RowNumber(), partition_by=F('notification_id'), order_by=[F('acted_at').desc(), F('id').desc()])
+        rows = self.filter(notification_id__in=notification_ids).annotate(rank=rank).filter(rank__lte=sample_size)
+        samples = {}
+        for notification_id, actor_id in rows.order_by('notification_id', 'rank').values_list('notification_id', 'actor_id'):
+            samples.setdefault(notification_id, []).append(actor_id)
+        return samples
+
+# An actor of a notification, so a grouped notification counts each distinct actor once however often they act
+class NotificationActor(models.Model):
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actor_rows')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    acted_at = models.DateTimeField()  # Last time the actor did the action
+
+    objects = NotificationActorManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='unique_notification_actor'),
+        ]
+        indexes = [
+            models.Index(fields=['actor'], name='notification_actor_idx'),  # Groups an account acted in, when it is deleted
+        ]
+
+    def __str__(self):
+        return f'{self.actor} in notification {self.notification_id}'
+
+# Outbox of notification events waiting for the process_notifications worker (used by the "outbox" dispatcher)
+class PendingNotification(models.Model):
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=100)
+    target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    target_object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def as_event(self):
+        return NotificationEvent(self.recipient_id, self.actor_id, self.verb, self.target_content_type_id, self.target_object_id)
+
+    def __str__(self):
+        return f'{self.actor} {self.verb} (pending)'
+
+# Custom manager maintaining the unread badge counters
+class UnreadNotificationCounterManager(models.Manager):
+    # Atomically add delta to a user's unread count
+    def adjust(self, user_id, delta):
+        if not self.filter(user_id=user_id).update(count=Greatest(F('count') + delta, 0)):
+            self.initialize(user_id)
+
+    # Subtract the unread notifications an actor is the only actor of from their recipients' counts (before they are
+    # deleted with the actor)
+    def release_actor(self, actor_id):
+        others = NotificationActor.objects.filter(notification=OuterRef('pk')).exclude(actor_id=actor_id)
+        unread = Notification.objects.filter(actor_id=actor_id, is_read=False).exclude(Exists(others))
+        per_recipient = unread.filter(recipient_id=OuterRef('user_id')).order_by().values('recipient_id').annotate(total=Count('id')).values('total')
+        self.filter(user_id__in=unread.values('recipient_id')).update(count=Greatest(F('count') - Subquery(per_recipient), 0))
+
+    # Recount the existing counters from the notifications table, returning how many were updated
+    def recount(self):
+        unread = Notification.objects.filter(recipient_id=OuterRef('user_id'), is_read=False).order_by().values('recipient_id')
+        return self.update(count=Coalesce(Subquery(unread.annotate(total=Count('id')).values('total')), 0))
+
+    # Create (or reset) a user's counter from the notifications table
+    def initialize(self, user_id):
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        self.update_or_create(user_id=user_id, defaults={'count': count})
+        return count
+
+    # Read a user's unread count, counting the notifications only the first time
+    def get_count(self, user_id):
+        count = self.filter(user_id=user_id).values_list('count', flat=True).first()
+        return count if count is not None else self.initialize(user_id)
+
+# Number of unread notifications of a user, so clients can poll the badge without querying the notifications
+class UnreadNotificationCounter(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_notification_counter')
+    count = models.PositiveIntegerField(default=0)
+
+    objects = UnreadNotificationCounterManager()
+
+    def __str__(self):
+        return f'{self.user} has {self.count} unread notifications'
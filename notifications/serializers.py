@@ -1,6 +1,28 @@
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import prefetch_related_objects
+from django.db.models.manager import BaseManager
+from django.contrib.contenttypes.models import ContentType
 from rest_framework import serializers
 from notifications.models import Notification
 
+# Attach the targets of many notifications at once: one query per target type instead of one or more per notification.
+# Related rows needed by the targets' __str__ come from NOTIFICATION_TARGET_SELECT_RELATED.
+def prefetch_targets(notifications):
+    querysets = [
+        apps.get_model(label)._default_manager.select_related(*related)
+        for label, related in getattr(settings, 'NOTIFICATION_TARGET_SELECT_RELATED', {}).items()
+    ]
+    prefetch_related_objects(notifications, GenericPrefetch('target', querysets))
+
+# List serializer that hydrates every target before serializing the notifications
+class NotificationListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        notifications = list(data.all() if isinstance(data, BaseManager) else data)
+        prefetch_targets(notifications)
+        return super().to_representation(notifications)
+
 class NotificationSerializer(serializers.ModelSerializer):
     recipient = serializers.PrimaryKeyRelatedField(read_only=True)  # recipient is a foreign key
     actor = serializers.PrimaryKeyRelatedField(read_only=True)  # actor is a foreign key
@@ -9,7 +31,8 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields =  ['id', 'recipient', 'actor', 'verb', 'target', 'is_read', 'timestamp']
+        fields =  ['id', 'recipient', 'actor', 'actor_count', 'recent_actors', 'verb', 'target', 'is_read', 'timestamp']
+        list_serializer_class = NotificationListSerializer
     
      # Custom method to serialize the 'target' field (which is a GenericForeignKey)
     def get_target(self, obj):
@@ -20,4 +43,38 @@ class NotificationSerializer(serializers.ModelSerializer):
                 'id': target_obj.id,
                 'model': target_obj._meta.model_name,
                 'data': str(target_obj) 
-            }
\ No newline at end of file
+            }
+
+# Serializer validating the selection of a bulk "mark as read" request
+class BulkMarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)  # Specific notifications
+    up_to_id = serializers.IntegerField(required=False)  # Every notification with an id up to this one
+    before = serializers.DateTimeField(required=False)  # Every notification received up to this time
+    target_type = serializers.CharField(required=False)  # Every notification about one target, given as "app_label.model"...
+    target_id = serializers.IntegerField(required=False)  # ...and the target's id
+
+    def validate(self, data):
+        selectors = [name for name in ('ids', 'up_to_id', 'before', 'target_type') if name in data]
+        if len(selectors) != 1:
+            raise serializers.ValidationError("Provide exactly one of ids, up_to_id, before or target_type/target_id.")
+
+        if 'target_type' in data:
+            if 'target_id' not in data:
+                raise serializers.ValidationError({"target_id": "This field is required with target_type."})
+            try:
+                app_label, model = data['target_type'].lower().split('.')
+                data['target_content_type'] = ContentType.objects.get_by_natural_key(app_label, model)
+            except (ValueError, ContentType.DoesNotExist):
+                raise serializers.ValidationError({"target_type": "Unknown target type."})
+        return data
+
+    # Build the filter selecting the notifications to mark
+    def get_filter(self):
+        data = self.validated_data
+        if 'ids' in data:
+            return {'id__in': data['ids']}
+        if 'up_to_id' in data:
+            return {'id__lte': data['up_to_id']}
+        if 'before' in data:
+            return {'timestamp__lte': data['before']}
+        return {'target_content_type': data['target_content_type'], 'target_object_id': data['target_id']}
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.db.models.signals import pre_delete
+from .models import Notification, UnreadNotificationCounter
+
+# Take a deleted account out of the grouped notifications other accounts acted in too. The notifications it was
+# the only actor of are deleted with it: release the unread ones from their recipients' counters, in one query
+# for all recipients
+def release_actor_notifications(sender, instance, **kwargs):
+    Notification.objects.remove_actor(instance.pk)
+    UnreadNotificationCounter.objects.release_actor(instance.pk)
+
+def connect_signals():
+    pre_delete.connect(release_actor_notifications, sender=settings.AUTH_USER_MODEL, dispatch_uid='release_actor_notifications')
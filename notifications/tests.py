@@ -1,3 +1,212 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from posts.models import Comment, Post
+from . import dispatch
+from .dispatch import ThreadDispatcher, notify
+from .models import Notification, NotificationEvent, PendingNotification, UnreadNotificationCounter
 
-# Create your tests here.
+User = get_user_model()  # Custom user model
+
+class UnreadCounterTest(TestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', email='recipient@example.com', password='password')
+        self.actor = User.objects.create_user(username='actor', email='actor@example.com', password='password')
+        self.post = Post.objects.create(author=self.recipient, title='Post', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(self.recipient)
+
+    def unread_count(self):
+        return UnreadNotificationCounter.objects.get_count(self.recipient.id)
+
+    def notify(self, actor=None, verb='liked your post'):
+        return Notification.objects.notify(recipient=self.recipient, actor=actor or self.actor, verb=verb, target=self.post)
+
+    def test_marking_read_twice_counts_once(self):
+        notification = self.notify()
+        self.notify(verb='commented on your post')
+        self.assertEqual(self.unread_count(), 2)
+
+        for _ in range(2):
+            response = self.client.post(f'/notifications/{notification.id}/read/')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread_count(), 1)
+
+        for _ in range(2):
+            self.client.delete(f'/notifications/{notification.id}/unread/')
+        self.assertEqual(self.unread_count(), 2)
+
+        self.assertEqual(self.client.post('/notifications/999999/read/').status_code, 404)
+
+    def test_deleting_an_actor_releases_their_count(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='password')
+        self.notify()
+        self.notify(verb='commented on your post')
+        self.notify(actor=other, verb='shared your post')
+        self.assertEqual(self.unread_count(), 3)
+
+        self.actor.delete()
+        self.assertEqual(self.unread_count(), 1)
+        self.assertEqual(self.unread_count(), Notification.objects.filter(recipient=self.recipient, is_read=False).count())
+
+    def test_recount_repairs_drift(self):
+        self.notify()
+        self.assertEqual(self.unread_count(), 1)
+        UnreadNotificationCounter.objects.filter(user=self.recipient).update(count=7)
+
+        call_command('recount_unread_notifications', stdout=io.StringIO())
+        self.assertEqual(self.unread_count(), 1)
+
+class GroupingTest(TestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', email='recipient@example.com', password='password')
+        self.actors = [User.objects.create_user(username=f'actor{number}', email=f'actor{number}@example.com', password='password') for number in range(4)]
+        self.post = Post.objects.create(author=self.recipient, title='Post', content='Content')
+
+    def like(self, actor):
+        return Notification.objects.notify(recipient=self.recipient, actor=actor, verb='liked your post', target=self.post)
+
+    @override_settings(NOTIFICATION_RECENT_ACTORS=2)
+    def test_repeat_actors_are_counted_once(self):
+        first, second, third, fourth = self.actors
+        for actor in (first, second, third, first, fourth, second):
+            notification = self.like(actor)
+
+        notification.refresh_from_db()
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(notification.actor_id, second.pk)
+        self.assertEqual(notification.recent_actors, [second.pk, fourth.pk])
+
+    def test_deleting_the_latest_actor_keeps_the_group(self):
+        first, second, third, _ = self.actors
+        for actor in (first, second, third):
+            self.like(actor)
+        lone = Notification.objects.notify(recipient=self.recipient, actor=third, verb='commented on your post', target=self.post)
+
+        third.delete()
+        notification = Notification.objects.get(verb='liked your post')
+        self.assertEqual(notification.actor_id, second.pk)  # The next latest actor leads the group
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.recent_actors, [second.pk, first.pk])
+        self.assertFalse(Notification.objects.filter(pk=lone.pk).exists())
+        self.assertEqual(UnreadNotificationCounter.objects.get_count(self.recipient.id), 1)
+
+class BulkMarkReadTest(TestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', email='recipient@example.com', password='password')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='password')
+        self.actor = User.objects.create_user(username='actor', email='actor@example.com', password='password')
+        self.post = Post.objects.create(author=self.recipient, title='Post', content='Content')
+        self.comment = Comment.objects.create(post=self.post, author=self.actor, content='Comment')
+        self.notifications = [
+            Notification.objects.notify(recipient=self.recipient, actor=self.actor, verb=verb, target=target)
+            for verb, target in [('liked your post', self.post), ('commented on your post', self.comment), ('shared your post', self.post)]
+        ]
+        Notification.objects.filter(pk=self.notifications[2].pk).update(timestamp=timezone.now() + timedelta(hours=1))
+        self.untouched = Notification.objects.notify(recipient=self.other, actor=self.actor, verb='liked your post', target=self.post)
+        self.client = APIClient()
+        self.client.force_authenticate(self.recipient)
+
+    def mark_read(self, data, expected):
+        response = self.client.post('/notifications/read/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        read = [notification.pk for notification in self.notifications if Notification.objects.get(pk=notification.pk).is_read]
+        self.assertEqual(read, [self.notifications[number].pk for number in expected])
+        self.assertEqual(response.data['marked'], len(expected))
+        self.assertEqual(response.data['unread_count'], len(self.notifications) - len(expected))
+        self.assertEqual(UnreadNotificationCounter.objects.get_count(self.recipient.id), len(self.notifications) - len(expected))
+        self.assertFalse(Notification.objects.get(pk=self.untouched.pk).is_read)
+        self.assertEqual(UnreadNotificationCounter.objects.get_count(self.other.id), 1)
+
+    def test_mark_ids(self):
+        self.mark_read({'ids': [self.notifications[0].pk, self.notifications[2].pk, self.untouched.pk]}, [0, 2])
+
+    def test_mark_up_to_id(self):
+        self.mark_read({'up_to_id': self.notifications[1].pk}, [0, 1])
+
+    def test_mark_before(self):
+        self.mark_read({'before': timezone.now().isoformat()}, [0, 1])
+
+    def test_mark_target(self):
+        self.mark_read({'target_type': 'posts.post', 'target_id': self.post.pk}, [0, 2])
+
+    def test_unknown_target_type(self):
+        response = self.client.post('/notifications/read/', {'target_type': 'posts.nothing', 'target_id': self.post.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('target_type', response.data)
+        self.assertFalse(Notification.objects.filter(is_read=True).exists())
+
+class NotificationListEtagTest(TestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', email='recipient@example.com', password='password')
+        self.actors = [User.objects.create_user(username=f'actor{number}', email=f'actor{number}@example.com', password='password') for number in range(3)]
+        self.post = Post.objects.create(author=self.recipient, title='Post', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(self.recipient)
+
+    def test_removing_a_grouped_actor_changes_the_etag(self):
+        first, second, third = self.actors
+        for actor in (first, second, third):
+            Notification.objects.notify(recipient=self.recipient, actor=actor, verb='liked your post', target=self.post)
+        # The latest actor acted earlier in another group, so the inbox's latest timestamp is not theirs
+        Notification.objects.notify(recipient=self.recipient, actor=second, verb='commented on your post', target=self.post)
+
+        response = self.client.get('/notifications/list/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/notifications/list/', headers={'If-None-Match': etag}).status_code, 304)
+
+        third.delete()
+        response = self.client.get('/notifications/list/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        liked = next(notification for notification in response.data['results'] if notification['verb'] == 'liked your post')
+        self.assertEqual(liked['actor_count'], 2)
+
+class ThreadDispatcherTest(TransactionTestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', email='recipient@example.com', password='password')
+        self.actors = [User.objects.create_user(username=f'actor{number}', email=f'actor{number}@example.com', password='password') for number in range(5)]
+        self.posts = [Post.objects.create(author=self.recipient, title=f'Post {number}', content='Content') for number in range(2)]
+
+    def likes(self, post):
+        content_type = ContentType.objects.get_for_model(Post).pk
+        return [NotificationEvent(self.recipient.pk, actor.pk, 'liked your post', content_type, post.pk) for actor in self.actors]
+
+    def test_each_batch_is_delivered_as_grouped_notifications(self):
+        dispatcher = ThreadDispatcher(batch_size=len(self.actors), flush_interval=5)
+        with mock.patch.object(dispatch, 'deliver', wraps=dispatch.deliver) as deliver:
+            for post in self.posts:
+                dispatcher.enqueue_many(self.likes(post))
+                dispatcher.flush()
+
+        self.assertEqual([len(call.args[0]) for call in deliver.call_args_list], [len(self.actors)] * len(self.posts))
+        notifications = Notification.objects.order_by('target_object_id')
+        self.assertEqual([notification.target_object_id for notification in notifications], [post.pk for post in self.posts])
+        self.assertEqual([notification.actor_count for notification in notifications], [len(self.actors)] * len(self.posts))
+
+@override_settings(NOTIFICATION_DISPATCHER='outbox')
+class OutboxDispatcherTest(TestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', email='recipient@example.com', password='password')
+        self.actors = [User.objects.create_user(username=f'actor{number}', email=f'actor{number}@example.com', password='password') for number in range(5)]
+        self.post = Post.objects.create(author=self.recipient, title='Post', content='Content')
+
+    def test_process_notifications_drains_the_outbox(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for actor in self.actors:
+                notify(recipient=self.recipient, actor=actor, verb='liked your post', target=self.post)
+        self.assertEqual(PendingNotification.objects.count(), len(self.actors))
+        self.assertFalse(Notification.objects.exists())
+
+        call_command('process_notifications', '--once', '--batch-size', '2', stdout=io.StringIO())
+        self.assertFalse(PendingNotification.objects.exists())
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, len(self.actors))
+        self.assertEqual(UnreadNotificationCounter.objects.get_count(self.recipient.id), 1)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import NotificationListView, MarkNotificationReadView
+from .views import NotificationListView, MarkNotificationReadView, UnreadCountView, BulkMarkNotificationsReadView
 
 urlpatterns = [
     path('list/', NotificationListView.as_view(), name='notification-list'),  # URL route for fetching the list of notifications
+    path('unread_count/', UnreadCountView.as_view(), name='notification-unread-count'),  # URL route for the unread badge count
+    path('read/', BulkMarkNotificationsReadView.as_view(), name='mark-notifications-read'),  # URL route for marking many notifications as read at once
     path('<int:pk>/read/', MarkNotificationReadView.as_view(), name='mark-notification-read'),   # The 'pk' (primary key) is used to identify the specific notification
     path('<int:pk>/unread/', MarkNotificationReadView.as_view(), name='mark-notification-unread'),  # The 'pk' (primary key) is used to identify the notification to mark as unread
 ]
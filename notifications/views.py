@@ -2,50 +2,68 @@ from django.shortcuts import render
 from rest_framework import views, generics, status, filters
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Notification
-from .serializers import NotificationSerializer
+from .models import Notification, UnreadNotificationCounter
+from .serializers import NotificationSerializer, BulkMarkReadSerializer
 from django_filters import rest_framework
-from rest_framework.pagination import PageNumberPagination
+from social_media_api.pagination import KeysetPagination
 from drf_yasg.utils import swagger_auto_schema
+from django.db.models import Count, Max, Q, Sum
+from social_media_api.conditional import build_etag, conditional
+
+# Pagination class for the notification inbox, using keyset cursors (pass ?page=N for page numbers)
+class NotificationPagination(KeysetPagination):
+    page_size = 20  # Number of notifications per page
+
+# ETag of the current user's notification inbox, from one aggregate over their notifications.
+# New or grouped notifications move the latest timestamp; reading, unreading and deleting change the counts and
+# the sum of unread ids; removing a grouped actor (a deleted account) changes the sums of actor counts and of
+# leading actor ids. There is no Last-Modified, since marking as read does not move any timestamp.
+def notification_list_etag(request, *args, **kwargs):
+    validators = Notification.objects.filter(recipient=request.user).aggregate(
+        count=Count('id'),
+        latest=Max('timestamp'),
+        unread=Count('id', filter=Q(is_read=False)),
+        unread_ids=Sum('id', filter=Q(is_read=False)),
+        actor_counts=Sum('actor_count'),
+        actor_ids=Sum('actor_id'),
+    )
+    return build_etag(request, 'notifications', *validators.values())
 
 # This view handles the listing of notifications for an authenticated user
 class NotificationListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = NotificationPagination
     filter_backends = [rest_framework.DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_read', 'timestamp']
     search_fields = ['is_read', 'timestamp']
     ordering_fields = ['is_read', 'timestamp']
-    #ordering = ['id']
+    ordering = ['is_read', '-timestamp']  # Unread notifications first, most recent at the top
 
-    def list(self, request, *args, **kwargs):
-        """
-        Overriding list to fetch and return unread notifications prominently at the top.
-        """
-        user = request.user
-        
-        # Fetch unread notifications first, then read notifications
-        unread_notifications = Notification.objects.filter(recipient=user, is_read=False).order_by('-timestamp')
-        read_notifications = Notification.objects.filter(recipient=user, is_read=True).order_by('-timestamp')
-
-        # Serialize unread and read notifications
-        unread_serializer = NotificationSerializer(unread_notifications, many=True)
-        read_serializer = NotificationSerializer(read_notifications, many=True)
-
-        # Return the response, showcasing unread notifications first
-        return Response({
-            'unread_notifications': unread_serializer.data,  # Unread first
-            'read_notifications': read_serializer.data,      # Read after
-        }, status=status.HTTP_200_OK)
+    def get_queryset(self):
+        # Only the notifications received by the current user
+        return Notification.objects.filter(recipient=self.request.user)
 
     # Apply swagger documentation
     @swagger_auto_schema(
         operation_summary="Retrieve a list of notifications",
-        operation_description="This endpoint returns a list of notifications for the authenticated user, with unread notifications listed first, followed by read notifications. Notifications are ordered by timestamp, with the most recent appearing at the top. You can filter the notifications by read/unread status."
+        operation_description="This endpoint returns a paginated list of notifications for the authenticated user, with unread notifications listed first, followed by read notifications. Notifications are ordered by timestamp, with the most recent appearing at the top. You can filter the notifications by read/unread status. Follow the `next` link to load more. Send the returned ETag in If-None-Match to get 304 Not Modified while the inbox is unchanged."
      )
+    @conditional(etag_func=notification_list_etag)
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
-        
+
+# View returning the number of unread notifications, for the badge polled by clients
+class UnreadCountView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Count unread notifications",
+        operation_description="Returns the number of unread notifications from a maintained counter, without querying the notifications."
+    )
+    def get(self, request):
+        return Response({"unread_count": UnreadNotificationCounter.objects.get_count(request.user.id)}, status=status.HTTP_200_OK)
 
 # View to mark a specific notification as read or unread
 class MarkNotificationReadView(views.APIView):
@@ -57,28 +75,50 @@ class MarkNotificationReadView(views.APIView):
         operation_description="This marks notifications as read"
     )
     def post(self, request, pk):
-        try:
-            # Attempt to get the notification for the user
-            notification = Notification.objects.get(id=pk, recipient=request.user)
-            notification.is_read = True  # Mark as read
-            notification.save()
-            return Response({"message": "Notification marked as read"}, status=status.HTTP_200_OK)
-        except Notification.DoesNotExist:
+        # Flip the notification only if it is still unread, so concurrent requests decrement the counter once
+        if Notification.objects.filter(id=pk, recipient=request.user, is_read=False).update(is_read=True):
+            UnreadNotificationCounter.objects.adjust(request.user.id, -1)
+        elif not Notification.objects.filter(id=pk, recipient=request.user).exists():
             # If notification is not found, return a 404 error
             return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
-            
+        return Response({"message": "Notification marked as read"}, status=status.HTTP_200_OK)
+
     # Apply swagger documentation
     @swagger_auto_schema(
         operation_summary="Mark notifications as unread",
         operation_description="This marks notifications as unread"
     )
     def delete(self, request, pk):
-        try:
-            # Attempt to get the notification for the user
-            notification = Notification.objects.get(id=pk, recipient=request.user)
-            notification.is_read = False  # Mark as unread
-            notification.save()
-            return Response({"message": "Notification marked as unread"}, status=status.HTTP_200_OK)
-        except Notification.DoesNotExist:
+        # Flip the notification only if it is still read, so concurrent requests increment the counter once
+        if Notification.objects.filter(id=pk, recipient=request.user, is_read=True).update(is_read=False):
+            UnreadNotificationCounter.objects.adjust(request.user.id, 1)
+        elif not Notification.objects.filter(id=pk, recipient=request.user).exists():
             # If notification is not found, return a 404 error
             return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Notification marked as unread"}, status=status.HTTP_200_OK)
+
+# View to mark many notifications as read with a single UPDATE
+class BulkMarkNotificationsReadView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Mark many notifications as read",
+        operation_description="Marks as read either a list of notification ids, every notification up to an id or a timestamp, or every notification about one target (e.g. target_type='posts.post'). Returns the new unread count.",
+        request_body=BulkMarkReadSerializer
+    )
+    def post(self, request):
+        serializer = BulkMarkReadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Flip every selected unread notification at once and keep the badge counter in step
+        marked = Notification.objects.filter(recipient=request.user, is_read=False, **serializer.get_filter()).update(is_read=True)
+        if marked:
+            UnreadNotificationCounter.objects.adjust(request.user.id, -marked)
+
+        return Response({
+            "message": f"{marked} notifications marked as read",
+            "marked": marked,
+            "unread_count": UnreadNotificationCounter.objects.get_count(request.user.id),
+        }, status=status.HTTP_200_OK)
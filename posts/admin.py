@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Post, Comment, Like
+from .models import Post, Comment, Like, TimelineEntry
 
 # Define the admin interface for the Post model
 class PostAdmin(admin.ModelAdmin):
@@ -28,7 +28,15 @@ class LikeAdmin(admin.ModelAdmin):
     # Enable search functionality for user and post fields
     search_fields = ('user', 'post')
 
+# Define the admin interface for the TimelineEntry model
+class TimelineEntryAdmin(admin.ModelAdmin):
+    # Specify the fields to display in the list view of timeline entries
+    list_display = ('owner', 'post', 'author', 'created_at')
+    # Avoid loading every user and post into the change form's select boxes
+    raw_id_fields = ('owner', 'post', 'author')
+
 # Register the models with their respective admin configurations
 admin.site.register(Post, PostAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Like, LikeAdmin)
+admin.site.register(TimelineEntry, TimelineEntryAdmin)
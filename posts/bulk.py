@@ -0,0 +1,49 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+def bulk_max_items():
+    return getattr(settings, 'BULK_CREATE_MAX_ITEMS', 1000)
+
+def bulk_batch_size():
+    return getattr(settings, 'BULK_CREATE_BATCH_SIZE', 500)
+
+# Read the list of items of a bulk request, rejecting anything but a list of up to BULK_CREATE_MAX_ITEMS objects
+def bulk_items(request):
+    items = request.data
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValidationError({"message": "Send a JSON list of objects."})
+    if not items:
+        raise ValidationError({"message": "The list is empty."})
+    if len(items) > bulk_max_items():
+        raise ValidationError({"message": f"At most {bulk_max_items()} items can be created per request."})
+    return items
+
+# Validate every item with a many=True serializer, returning the valid (index, validated data) pairs
+# and the errors of the invalid items, so one bad item does not reject the whole batch
+def bulk_validate(serializer_class, items, context):
+    serializer = serializer_class(data=items, many=True, context=context)
+    if serializer.is_valid():
+        return list(enumerate(serializer.validated_data)), {}
+
+    # The list serializer reports one error dict per item (empty for the valid ones): revalidate only those
+    valid_indexes = [index for index, item_errors in enumerate(serializer.errors) if not item_errors]
+    errors = {index: item_errors for index, item_errors in enumerate(serializer.errors) if item_errors}
+    revalidated = serializer_class(data=[items[index] for index in valid_indexes], many=True, context=context)
+    revalidated.is_valid(raise_exception=True)
+    return list(zip(valid_indexes, revalidated.validated_data)), errors
+
+# Build the per-item response: 201 when every item was created, 207 when only some were, 400 when none were
+def bulk_response(created, errors):
+    results = [{"index": index, "status": status.HTTP_201_CREATED, "id": instance.pk} for index, instance in created]
+    results += [{"index": index, "status": status.HTTP_400_BAD_REQUEST, "errors": item_errors} for index, item_errors in errors.items()]
+    results.sort(key=lambda result: result["index"])
+
+    if not errors:
+        response_status = status.HTTP_201_CREATED
+    elif created:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({"created": len(created), "failed": len(errors), "results": results}, status=response_status)
@@ -0,0 +1,62 @@
+import hashlib
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import caches
+
+# Rendered feed pages are cached under keys that embed "versions" of what the page was built from:
+# the reader's timeline and each followed celebrity (read-time merged) author. Changing a timeline or a
+# celebrity's posts just replaces the version, so every page cached under the old one is never read again
+# and expires on its own.
+
+def feed_cache():
+    return caches[getattr(settings, 'FEED_CACHE_ALIAS', 'default')]
+
+def _user_version_key(user_id):
+    return f'feed:version:user:{user_id}'
+
+def _author_version_key(author_id):
+    return f'feed:version:author:{author_id}'
+
+def _new_version():
+    return uuid4().hex[:12]
+
+# Invalidate the cached feed pages of these users (their timeline or their view of it changed)
+def invalidate_user_feeds(user_ids):
+    versions = {_user_version_key(user_id): _new_version() for user_id in user_ids}
+    if versions:
+        feed_cache().set_many(versions, timeout=None)
+
+# Invalidate the feeds merging this author's posts at read time
+def invalidate_author_feeds(author_id):
+    feed_cache().set(_author_version_key(author_id), _new_version(), timeout=None)
+
+# Build the cache key of a feed page: the reader, the full URL (cursor, page size, filters, search and
+# ordering, plus the host the pagination links are built with) and the current versions
+def feed_page_key(request, pull_author_ids):
+    cache = feed_cache()
+    version_keys = [_user_version_key(request.user.pk)] + [_author_version_key(author_id) for author_id in sorted(pull_author_ids)]
+    versions = cache.get_many(version_keys)
+
+    # Start versioning the keys seen for the first time (or evicted since)
+    for key in version_keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+
+    digest = hashlib.md5(repr((request.build_absolute_uri(), [versions[key] for key in version_keys])).encode('utf-8')).hexdigest()
+    return f'feed:page:{request.user.pk}:{digest}'
+
+# Count feed cache hits and misses, kept in the cache itself so every process sharing it reports the same totals
+def record_feed_cache(result):
+    cache = feed_cache()
+    key = f'feed:stats:{result}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First event of this kind (or the counter was evicted)
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+def feed_cache_stats():
+    stats = feed_cache().get_many(['feed:stats:hit', 'feed:stats:miss'])
+    return {'hits': stats.get('feed:stats:hit', 0), 'misses': stats.get('feed:stats:miss', 0)}
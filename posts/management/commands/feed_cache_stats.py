@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from posts.feed_cache import feed_cache_stats
+
+# Management command to report how often feed pages are served from the cache
+class Command(BaseCommand):
+    help = "Show the feed page cache hit and miss counts."
+
+    def handle(self, *args, **options):
+        stats = feed_cache_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit ratio: {ratio:.1%}")
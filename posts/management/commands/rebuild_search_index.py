@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+from posts.search import SEARCH_INDEXES, search_index_for
+
+# Management command to rebuild the FTS5 search index from the posts and comments tables
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of posts and comments."
+
+    def handle(self, *args, **options):
+        for model in SEARCH_INDEXES:
+            index = search_index_for(model)
+            if index is None:
+                raise CommandError(f"No search index for {model._meta.label}. It needs SQLite with FTS5; run migrate first.")
+
+            # 'rebuild' re-reads every row of the external content table
+            with connections[router.db_for_write(model)].cursor() as cursor:
+                cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+                cursor.execute(f"INSERT INTO {index}({index}) VALUES ('optimize')")
+            self.stdout.write(f"Rebuilt {index}.")
+
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
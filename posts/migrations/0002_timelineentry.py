@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 03:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Backfill timelines for follow relationships that existed before the timeline table
+def backfill_timelines(apps, schema_editor):
+    User = apps.get_model('users', 'CustomUser')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+
+    # Rows of the "followers" relation point from the followed user to the follower
+    for follow in User.followers.through.objects.iterator():
+        recent_posts = Post.objects.filter(author_id=follow.from_customuser_id).order_by('-created_at').values_list('id', 'created_at')[:limit]
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(owner_id=follow.to_customuser_id, post_id=post_id, author_id=follow.from_customuser_id, created_at=created_at)
+            for post_id, created_at in recent_posts
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-created_at'], name='timeline_owner_recent_idx'), models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx')],
+                'unique_together': {('owner', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# FTS5 tables indexing posts and comments. They use the source tables as external content,
+# so only the inverted index is stored, and triggers keep them in sync with every write.
+SEARCH_INDEXES = {
+    'posts_post': ('posts_post_fts', ['title', 'content']),
+    'posts_comment': ('posts_comment_fts', ['content']),
+}
+
+
+def create_search_index(apps, schema_editor):
+    # The index relies on SQLite's FTS5 extension; other databases keep using LIKE searches
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    for table, (index, columns) in SEARCH_INDEXES.items():
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {index} USING fts5({column_list}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {index}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {index}_update AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {index}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+        # Index the rows that already exist
+        schema_editor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    for index, _ in SEARCH_INDEXES.values():
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,9 +1,30 @@
 from django.db import models
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.contrib.auth import get_user_model
 
 # Create your models here.
 User = get_user_model()
 
+    # Custom queryset for posts
+class PostQuerySet(models.QuerySet):
+    # Annotate aggregate counts and prefetch the latest comments for the summary representation.
+    # Counts come from correlated subqueries, so a page of posts costs a fixed number of queries.
+    def with_summary(self, user, comment_limit=3):
+        comment_count = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('id')).values('total')
+        like_count = Like.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('id')).values('total')
+
+        # Rank each post's comments from newest to oldest and keep the first few
+        latest_comments = Comment.objects.annotate(
+            recent_rank=Window(RowNumber(), partition_by=F('post_id'), order_by=[F('created_at').desc(), F('id').desc()])
+        ).filter(recent_rank__lte=comment_limit).order_by('-created_at', '-id')
+
+        return self.annotate(
+            comment_count=Coalesce(Subquery(comment_count), 0),
+            like_count=Coalesce(Subquery(like_count), 0),
+            liked_by_me=Exists(Like.objects.filter(post=OuterRef('pk'), user=user)),
+        ).prefetch_related(Prefetch('comments', queryset=latest_comments, to_attr='latest_comments'))
+
     # Post model represents a post content
 class Post(models.Model):
     title = models.CharField(max_length=100, null=False, blank=False)
@@ -13,6 +34,14 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PostQuerySet.as_manager()  # Custom manager exposing the summary annotations
+
+    class Meta:
+        indexes = [
+            # An author's latest posts (timeline backfill, pulled authors merged into feeds)
+            models.Index(fields=['author', '-created_at'], name='post_author_recent_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -24,6 +53,12 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # The latest comments of each post embedded in post summaries, ranked without a sort
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_recent_idx'),
+        ]
+
     def __str__(self):
         return f'Comment on {self.post} by { self.author}'
         
@@ -38,4 +73,19 @@ class Like(models.Model):
     def __str__(self):
         return f'{self.user} likes {self.post.title}'
 
+    # TimelineEntry materializes a user's home feed: one row per post delivered to a follower
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline_entries")  # The user whose feed this row belongs to
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")  # Deleting a post prunes it from every feed
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")  # Copied from the post so unfollowing can prune without a join
+    created_at = models.DateTimeField()  # Copied from the post so a feed page is a single range scan on (owner, created_at, post)
 
+    class Meta:
+        unique_together = ['owner', 'post']
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_recent_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} in {self.owner}\'s timeline'
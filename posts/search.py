@@ -0,0 +1,108 @@
+import json
+import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from .models import Post, Comment
+
+# FTS5 index table of each searchable model (created by the 0003_search_index migration)
+SEARCH_INDEXES = {
+    Post: 'posts_post_fts',
+    Comment: 'posts_comment_fts',
+}
+
+# Fields matched with LIKE by ranked_search when a model's index is missing
+SEARCH_FIELDS = {
+    Post: ['title', 'content'],
+    Comment: ['content'],
+}
+
+# Tables found to exist, remembered per database alias
+_available_indexes = {}
+
+# Check whether the FTS5 index of a model exists in the database the model is read from
+def search_index_for(model):
+    index = SEARCH_INDEXES.get(model)
+    if index is None:
+        return None
+
+    alias = router.db_for_read(model)
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return None
+
+    key = (alias, index)
+    if key not in _available_indexes:
+        _available_indexes[key] = index in connection.introspection.table_names()
+    return index if _available_indexes[key] else None
+
+# Turn user input into an FTS5 query: every word must start a word of the text (so "hel" finds "hello", as
+# the LIKE search did), and quoting stops it being parsed as query syntax
+def build_match_query(search):
+    terms = re.findall(r'\w+', search)
+    return ' '.join('"%s"*' % term for term in terms)
+
+# Search filter that answers ?search= from the FTS5 index instead of LIKE '%term%' scans
+class SearchIndexFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        index = search_index_for(queryset.model)
+        search = request.query_params.get(self.search_param, '')
+        if index is None or not search.strip():
+            return super().filter_queryset(request, queryset, view)
+
+        match = build_match_query(search)
+        if not match:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {index} WHERE {index} MATCH %s", [match]))
+
+# Encode and decode the (score, id) position of the last search result
+def encode_search_cursor(score, row_id):
+    return urlsafe_b64encode(json.dumps([score, row_id]).encode('utf-8')).decode('ascii')
+
+def decode_search_cursor(encoded):
+    try:
+        score, row_id = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        return float(score), int(row_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise NotFound("Invalid cursor")
+
+# Run a relevance-ranked search, returning (id, score, snippet) rows after the given cursor position.
+# bm25() scores are negative, better matches being lower, so results are ordered by ascending score.
+def ranked_search(model, search, limit, after=None):
+    match = build_match_query(search)
+    if not match:
+        return []
+    index = search_index_for(model)
+    if index is None:
+        return like_search(model, search, limit, after)
+
+    sql = (
+        f"SELECT id, score, snippet FROM ("
+        f"SELECT rowid AS id, bm25({index}) AS score, snippet({index}, -1, '<b>', '</b>', '…', 12) AS snippet "
+        f"FROM {index} WHERE {index} MATCH %s)"
+    )
+    params = [match]
+    if after is not None:
+        sql += " WHERE score > %s OR (score = %s AND id > %s)"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY score, id LIMIT %s"
+    params.append(limit)
+
+    with connections[router.db_for_read(model)].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+# Search without the index (another database, or before the migration): every word must appear in one of the
+# fields, as with SearchFilter. There is no relevance, so rows come in id order with a score of 0 and no snippet.
+def like_search(model, search, limit, after=None):
+    queryset = model.objects.all()
+    for term in re.findall(r'\w+', search):
+        queryset = queryset.filter(reduce(or_, (Q(**{f'{field}__icontains': term}) for field in SEARCH_FIELDS[model])))
+    if after is not None:
+        queryset = queryset.filter(id__gt=after[1])
+    return [(row_id, 0.0, None) for row_id in queryset.order_by('id').values_list('id', flat=True)[:limit]]
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Post, Comment, Like
+from uploads.serializers import ChunkedUploadField, ChunkedUploadsMixin, ImageVariantsField
 
 User = get_user_model() # Using the custom User model
 
@@ -17,6 +18,21 @@ class CommentSerializer(serializers.ModelSerializer):
          model = Comment
          fields = "__all__"
 
+# Post reference resolved from the posts loaded up front into context['posts'], so validating a batch
+# of comments does not query the posts table once per item
+class PreloadedPostField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        try:
+            return self.context['posts'][int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+# Serializer for comments created in bulk
+class BulkCommentSerializer(CommentSerializer):
+    post = PreloadedPostField(queryset=Post.objects.all())
+
 # Serializer for Like model
 class LikeSerializer(serializers.ModelSerializer):
     post = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -27,10 +43,12 @@ class LikeSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 # Serializer for Post model
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(ChunkedUploadsMixin, serializers.ModelSerializer):
     # Serializing 'author' as the user's ID
     author = serializers.PrimaryKeyRelatedField(read_only=True)
     media = serializers.ImageField(required=False)
+    media_variants = ImageVariantsField(source='media')  # Resized WebP and JPEG copies of the media, as srcset values
+    media_upload = ChunkedUploadField(target='media')  # Completed chunked upload to use as the media
     
     # Serializing 'created_at' and 'updated_at' as ISO format date-time strings
     created_at = serializers.DateTimeField(format='%Y-%m-%dT%H:%M:%S', read_only=True)
@@ -40,9 +58,23 @@ class PostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'title', 'content', 'media', 'created_at', 'updated_at', "comments", 'likes']
+        fields = ['id', 'author', 'title', 'content', 'media', 'media_variants', 'media_upload', 'created_at', 'updated_at', "comments", 'likes']
 
     def validate_title(self, value):
         if len(value) < 3:
             raise serializers.ValidationError("Title must be at least 3 characters long.")
         return value
+
+# Compact representation of a post for lists and feeds: aggregate counts and the latest comments
+# instead of every nested comment and like. Expects a queryset built with Post.objects.with_summary().
+class PostSummarySerializer(PostSerializer):
+    comments = None  # Replaced by comment_count and latest_comments
+    likes = None  # Replaced by like_count and liked_by_me
+    comment_count = serializers.IntegerField(read_only=True)
+    like_count = serializers.IntegerField(read_only=True)
+    liked_by_me = serializers.BooleanField(read_only=True)
+    latest_comments = CommentSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Post
+        fields = ['id', 'author', 'title', 'content', 'media', 'media_variants', 'created_at', 'updated_at', 'comment_count', 'like_count', 'liked_by_me', 'latest_comments']
@@ -1,3 +1,353 @@
-from django.test import TestCase
+import io
+import tempfile
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from notifications.models import Notification
+from uploads.models import ChunkedUpload
+from users.counters import Follow
+from uploads.variants import generate_variants
+from .models import Comment, Like, Post, TimelineEntry
 
-# Create your tests here.
+User = get_user_model()  # Custom user model
+
+# A small PNG image as an uploaded file
+def png_file(name='photo.png', size=(320, 200)):
+    data = io.BytesIO()
+    Image.new('RGB', size, (200, 60, 30)).save(data, 'PNG')
+    return SimpleUploadedFile(name, data.getvalue(), content_type='image/png')
+
+# Test case storing uploaded files in a scratch media directory
+@override_settings(NOTIFICATION_DISPATCHER='sync', IMAGE_VARIANT_GENERATOR='sync', IMAGE_VARIANT_WIDTHS=[160])
+class MediaTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        media_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+class PostEtagTest(MediaTestCase):
+    def test_generated_variants_change_the_etag(self):
+        author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        post = Post.objects.create(author=author, title='Photo', content='A photo', media=png_file())
+        client = self.client_for(author)
+        url = f'/posts/posts_all/{post.pk}/'
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['media_variants'])
+        etag = response['ETag']
+        self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        generate_variants(post.media.name)
+        response = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('webp', response.data['media_variants'])
+
+@override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+class FeedTest(MediaTestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        self.fan = User.objects.create_user(username='fan', email='fan@example.com', password='password')
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        self.celebrity = User.objects.create_user(username='celebrity', email='celebrity@example.com', password='password')
+        for follower, followed in [(self.reader, self.author), (self.reader, self.celebrity), (self.fan, self.celebrity)]:
+            self.assertEqual(self.client_for(follower).post(f'/user/follow/{followed.pk}/').status_code, 200)
+
+        # Alternate the posts of a fanned-out author and of a celebrity (merged in at read time)
+        self.posts = []
+        self.author.refresh_from_db()
+        self.celebrity.refresh_from_db()
+        for number in range(7):
+            author = self.author if number % 2 else self.celebrity
+            response = self.client_for(author).post('/posts/posts_all/', {'title': f'Post {number}', 'content': 'Content'}, format='json')
+            self.posts.append(response.data['id'])
+        self.posts.reverse()  # Newest first
+
+    def feed_ids(self, user, page_size=2):
+        client = self.client_for(user)
+        ids, url = [], f'/posts/feed/?page_size={page_size}'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_merge_the_timeline_with_celebrity_posts(self):
+        self.assertFalse(TimelineEntry.objects.filter(author=self.celebrity).exists())
+        self.assertEqual(self.feed_ids(self.reader), self.posts)
+
+        # Walking back from the last page gives the same pages
+        client = self.client_for(self.reader)
+        response = client.get('/posts/feed/?page_size=3')
+        response = client.get(response.data['next'])
+        previous = client.get(response.data['previous'])
+        self.assertEqual([post['id'] for post in previous.data['results']], self.posts[:3])
+
+    def test_authors_crossing_the_threshold_keep_their_posts_in_feeds(self):
+        # The celebrity falls below the threshold: their posts are copied into their followers' timelines
+        self.assertEqual(self.client_for(self.fan).post(f'/user/unfollow/{self.celebrity.pk}/').status_code, 200)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, author=self.celebrity).exists())
+        self.assertEqual(self.feed_ids(self.reader), self.posts)
+
+        # And reaches it again: their posts leave the timelines and are merged in at read time
+        self.assertEqual(self.client_for(self.fan).post(f'/user/follow/{self.celebrity.pk}/').status_code, 200)
+        self.assertFalse(TimelineEntry.objects.filter(author=self.celebrity).exists())
+        self.assertEqual(self.feed_ids(self.reader), self.posts)
+        self.assertEqual(self.feed_ids(self.fan), [post_id for post_id in self.posts if Post.objects.get(pk=post_id).author_id == self.celebrity.pk])
+
+    def test_recounts_moving_authors_across_the_threshold_keep_their_posts_in_feeds(self):
+        # The fan's follow row went missing: the recount drops the celebrity below the threshold
+        Follow.objects.filter(from_customuser=self.celebrity, to_customuser=self.fan).delete()
+        call_command('recount_user_counters', stdout=io.StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, author=self.celebrity).exists())
+        self.assertEqual(self.feed_ids(self.reader), self.posts)
+
+        # The row is back: the recount makes them a celebrity again
+        Follow.objects.create(from_customuser=self.celebrity, to_customuser=self.fan)
+        call_command('recount_user_counters', stdout=io.StringIO())
+        self.assertFalse(TimelineEntry.objects.filter(author=self.celebrity).exists())
+        self.assertEqual(self.feed_ids(self.reader), self.posts)
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        self.posts = [Post.objects.create(author=self.author, title=f'Title {number % 3}', content='Content') for number in range(7)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_stay_stable_while_posts_are_added(self):
+        response = self.client.get('/posts/posts_all/?page_size=3&ordering=-created_at')
+        first_page = [post['id'] for post in response.data['results']]
+        Post.objects.create(author=self.author, title='Newer', content='Added after the first page')
+
+        rest = self.walk(response.data['next'])
+        self.assertEqual(first_page + rest, [post.pk for post in reversed(self.posts)])
+
+    def test_equal_values_are_ordered_by_id(self):
+        ids = self.walk('/posts/posts_all/?page_size=2&ordering=title')
+        self.assertEqual(ids, [post.pk for post in sorted(self.posts, key=lambda post: (post.title, post.pk))])
+
+    def test_page_numbers_and_bad_cursors(self):
+        response = self.client.get('/posts/posts_all/?page=2&page_size=3')
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual([post['id'] for post in response.data['results']], [post.pk for post in self.posts[3:6]])
+
+        self.assertEqual(self.client.get('/posts/posts_all/?cursor=not-a-cursor').status_code, 404)
+        self.assertEqual(self.client.get('/posts/posts_all/?cursor=eyJwIjpbXX0=').status_code, 404)  # {"p":[]}
+
+@override_settings(POST_SUMMARY_COMMENT_LIMIT=2)
+class SummaryTest(TestCase):
+    def test_lists_show_counts_and_the_latest_comments(self):
+        author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        reader = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        post = Post.objects.create(author=author, title='Post', content='Content')
+        quiet = Post.objects.create(author=author, title='Quiet', content='No reactions')
+        comments = [Comment.objects.create(post=post, author=reader, content=f'Comment {number}') for number in range(3)]
+        Like.objects.create(post=post, user=reader)
+        Like.objects.create(post=post, user=author)
+
+        client = APIClient()
+        client.force_authenticate(reader)
+        response = client.get('/posts/posts_all/')
+        self.assertEqual(response.status_code, 200)
+        summaries = {summary['id']: summary for summary in response.data['results']}
+        self.assertEqual(
+            (summaries[post.pk]['comment_count'], summaries[post.pk]['like_count'], summaries[post.pk]['liked_by_me']),
+            (3, 2, True),
+        )
+        self.assertEqual([comment['id'] for comment in summaries[post.pk]['latest_comments']], [comments[2].pk, comments[1].pk])
+        self.assertEqual((summaries[quiet.pk]['comment_count'], summaries[quiet.pk]['like_count'], summaries[quiet.pk]['liked_by_me']), (0, 0, False))
+        self.assertNotIn('likes', summaries[post.pk])
+
+@override_settings(TIMELINE_FANOUT_THRESHOLD=2, NOTIFICATION_DISPATCHER='sync')
+class FeedCacheTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.reader, self.fan, self.author, self.celebrity, self.newcomer = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='password')
+            for name in ('reader', 'fan', 'author', 'celebrity', 'newcomer')
+        ]
+        for follower, followed in [(self.reader, self.author), (self.reader, self.celebrity), (self.fan, self.celebrity)]:
+            self.client_for(follower).post(f'/user/follow/{followed.pk}/')
+        self.reader_client = self.client_for(self.reader)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))  # Fresh counters
+        return client
+
+    def post(self, author):
+        return self.client_for(author).post('/posts/posts_all/', {'title': 'Post', 'content': 'Content'}, format='json').data['id']
+
+    # Read the feed, returning whether it was served from the cache and the ids on its first page
+    def read_feed(self):
+        response = self.reader_client.get('/posts/feed/')
+        self.assertEqual(response.status_code, 200)
+        return response['X-Feed-Cache'], [post['id'] for post in response.data['results']]
+
+    def test_changes_invalidate_the_cached_pages(self):
+        first = self.post(self.author)
+        self.assertEqual(self.read_feed(), ('MISS', [first]))
+        self.assertEqual(self.read_feed(), ('HIT', [first]))
+
+        # A post fanned out to the reader's timeline, and one of a celebrity merged in at read time
+        fanned_out = self.post(self.author)
+        self.assertEqual(self.read_feed(), ('MISS', [fanned_out, first]))
+        merged = self.post(self.celebrity)
+        self.assertEqual(self.read_feed(), ('MISS', [merged, fanned_out, first]))
+        self.assertEqual(self.read_feed()[0], 'HIT')
+
+        # The reader's own like
+        self.assertEqual(self.reader_client.post(f'/posts/{first}/like/').status_code, 201)
+        response = self.reader_client.get('/posts/feed/')
+        self.assertEqual(response['X-Feed-Cache'], 'MISS')
+        self.assertTrue(next(post for post in response.data['results'] if post['id'] == first)['liked_by_me'])
+
+        # Following someone brings their posts in
+        newcomer_post = self.post(self.newcomer)
+        self.assertEqual(self.reader_client.post(f'/user/follow/{self.newcomer.pk}/').status_code, 200)
+        self.assertEqual(self.read_feed(), ('MISS', [newcomer_post, merged, fanned_out, first]))
+
+@override_settings(NOTIFICATION_DISPATCHER='sync', BULK_CREATE_MAX_ITEMS=3)
+class BulkCreateTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        self.commenter = User.objects.create_user(username='commenter', email='commenter@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_valid_items_are_created_and_invalid_ones_reported(self):
+        response = self.client.post('/posts/posts_all/bulk/', [
+            {'title': 'First', 'content': 'Imported'},
+            {'title': 'No content'},
+            {'title': 'Third', 'content': 'Imported'},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 201])
+        self.assertIn('content', results[1]['errors'])
+        self.assertEqual(list(Post.objects.filter(author=self.author).order_by('id').values_list('id', flat=True)), [results[0]['id'], results[2]['id']])
+        self.assertEqual(User.objects.get(pk=self.author.pk).post_count, 2)
+
+        self.assertEqual(self.client.post('/posts/posts_all/bulk/', [{'title': 'Only'}], format='json').status_code, 400)
+        self.assertEqual(self.client.post('/posts/posts_all/bulk/', {'title': 'Not a list'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/posts/posts_all/bulk/', [{'title': 'Post', 'content': 'Content'}] * 4, format='json').status_code, 400)
+
+    def test_comments_on_missing_posts_are_reported(self):
+        post = Post.objects.create(author=self.author, title='Post', content='Content')
+        client = APIClient()
+        client.force_authenticate(self.commenter)
+        with self.captureOnCommitCallbacks(execute=True):  # Notifications are queued once the comments are committed
+            response = client.post('/posts/comments_all/bulk/', [
+                {'post': post.pk, 'content': 'Nice'},
+                {'post': post.pk + 100, 'content': 'Lost'},
+            ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 400])
+        self.assertEqual(Comment.objects.get().pk, response.data['results'][0]['id'])
+        self.assertTrue(Notification.objects.filter(recipient=self.author, verb='commented on your post').exists())
+
+    def test_uploads_cannot_be_attached_in_bulk(self):
+        upload = ChunkedUpload.objects.create(user=self.author, filename='photo.png', size=10, offset=10, status='complete')
+        response = self.client.post('/posts/posts_all/bulk/', [
+            {'title': 'Text', 'content': 'Imported'},
+            {'title': 'Photo', 'content': 'Imported', 'media_upload': str(upload.pk)},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertIn('media_upload', response.data['results'][1]['errors'])
+        self.assertTrue(ChunkedUpload.objects.filter(pk=upload.pk).exists())  # Still available to attach
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        self.hello = Post.objects.create(author=self.author, title='Hello world', content='First post')
+        self.help = Post.objects.create(author=self.author, title='Need help', content='Anyone around?')
+        Post.objects.create(author=self.author, title='Goodbye', content='Last post')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def search(self, words):
+        response = self.client.get('/posts/posts_all/', {'search': words})
+        self.assertEqual(response.status_code, 200)
+        return {post['id'] for post in response.data['results']}
+
+    def test_partial_words_match(self):
+        self.assertEqual(self.search('hel'), {self.hello.pk, self.help.pk})
+        self.assertEqual(self.search('hel wor'), {self.hello.pk})
+        self.assertEqual(self.search('HELLO'), {self.hello.pk})
+        self.assertEqual(self.search('"wor*'), {self.hello.pk})  # Query syntax is ignored
+        self.assertEqual(self.search('elp'), set())  # Words are matched from their start
+
+    def test_like_search_without_the_index(self):
+        with mock.patch('posts.search.search_index_for', return_value=None):
+            self.assertEqual(self.search('hel'), {self.hello.pk, self.help.pk})
+            self.assertEqual(self.search('elp'), {self.help.pk})
+
+    def ranked(self, words, **params):
+        response = self.client.get('/posts/search/', {'q': words, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_results_are_ranked_by_relevance(self):
+        passing = Post.objects.create(author=self.author, title='Holiday', content='We went to the beach, swam, ate and read. Python came up once.')
+        focused = Post.objects.create(author=self.author, title='Python', content='Python tips for Python users')
+        results = self.ranked('python')['results']
+        self.assertEqual([post['id'] for post in results], [focused.pk, passing.pk])
+        self.assertLess(results[0]['rank'], results[1]['rank'])  # bm25 scores are lower for better matches
+
+    def test_snippets_highlight_prefix_matches(self):
+        results = self.ranked('wor')['results']
+        self.assertEqual([post['id'] for post in results], [self.hello.pk])
+        self.assertIn('<b>world</b>', results[0]['snippet'])
+        self.assertEqual(self.ranked('elp')['results'], [])  # Words are matched from their start
+
+    def test_cursor_pages_follow_the_ranking(self):
+        for number in range(4):
+            Post.objects.create(author=self.author, title=f'Post {number}', content='Same words')
+        expected = [post['id'] for post in self.ranked('same words')['results']]
+        self.assertEqual(len(expected), 4)
+
+        ids, data = [], self.ranked('same words', page_size=3)
+        while True:
+            ids += [post['id'] for post in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+            self.assertEqual(response.status_code, 200)
+            data = response.data
+        self.assertEqual(ids, expected)
+        self.assertEqual(ids, sorted(ids))  # Equal scores are ordered by id
+
+    def test_ranked_search_falls_back_to_like_without_the_index(self):
+        with mock.patch('posts.search.search_index_for', return_value=None):
+            data = self.ranked('elp', page_size=1)
+            self.assertEqual([(post['id'], post['snippet']) for post in data['results']], [(self.help.pk, None)])
+            self.assertIsNone(data['next'])
+            self.assertEqual([post['id'] for post in self.ranked('hel', page_size=1)['results']], [self.hello.pk])
+            response = self.client.get(self.ranked('hel', page_size=1)['next'])
+            self.assertEqual([post['id'] for post in response.data['results']], [self.help.pk])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/posts/search/', {'q': 'hello', 'cursor': 'not-a-cursor'}).status_code, 404)
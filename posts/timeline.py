@@ -0,0 +1,165 @@
+import heapq
+from itertools import islice
+from django.conf import settings
+from django.db.models import Q
+from django.contrib.auth import get_user_model
+from .models import Post, TimelineEntry
+from .feed_cache import invalidate_author_feeds, invalidate_user_feeds
+
+User = get_user_model()  # Custom user model
+
+# Authors with at least this many followers are not fanned out on write
+def fanout_threshold():
+    return getattr(settings, 'TIMELINE_FANOUT_THRESHOLD', 10000)
+
+# Get the ids of every "celebrity" author (or of those among users), whose posts are merged in at read time
+# instead of fanned out
+def pull_author_ids(users=None):
+    users = User.objects.all() if users is None else users
+    return set(users.filter(follower_count__gte=fanout_threshold()).values_list('id', flat=True))
+
+# Check whether an author's posts should be written into their followers' timelines. The decision follows the
+# author's current follower count; authors crossing the threshold are switched over by update_fanout_modes
+# (or switch_fanout_modes after a recount).
+def is_fanout_author(author):
+    return author.follower_count < fanout_threshold()
+
+# Insert timeline rows in batches, skipping rows that already exist
+def _bulk_insert(entries):
+    batch_size = getattr(settings, 'TIMELINE_BATCH_SIZE', 1000)
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+# Fan a newly created post out to the timelines of the author's followers
+def fan_out_post(post):
+    fan_out_posts([post])
+
+# Fan newly created posts out to their authors' followers, reading each author's followers once
+def fan_out_posts(posts):
+    posts_by_author = {}
+    for post in posts:
+        posts_by_author.setdefault(post.author_id, []).append(post)
+
+    for author_id, author_posts in posts_by_author.items():
+        if not is_fanout_author(author_posts[0].author):
+            invalidate_author_feeds(author_id)
+            continue  # Celebrity posts are merged in at read time
+
+        follower_ids = list(User.objects.filter(following=author_id).values_list('id', flat=True))
+        _bulk_insert(
+            TimelineEntry(owner_id=follower_id, post_id=post.id, author_id=author_id, created_at=post.created_at)
+            for post in author_posts
+            for follower_id in follower_ids
+        )
+        invalidate_user_feeds(follower_ids)
+
+# Invalidate the cached feed pages that may show a post, after it was edited or deleted
+def invalidate_post_feeds(post):
+    if not is_fanout_author(post.author):
+        invalidate_author_feeds(post.author_id)
+    else:
+        invalidate_user_feeds(User.objects.filter(following=post.author_id).values_list('id', flat=True))
+
+# Copy an author's recent posts into the timelines of these users (after they follow the author)
+def _backfill_timelines(owner_ids, author_id):
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+    recent_posts = list(Post.objects.filter(author_id=author_id).order_by('-created_at').values_list('id', 'created_at')[:limit])
+    _bulk_insert(
+        TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=created_at)
+        for owner_id in owner_ids
+        for post_id, created_at in recent_posts
+    )
+
+# Copy an author's recent posts into a user's timeline right after they follow the author
+def backfill_timeline(owner, author):
+    invalidate_user_feeds([owner.id])
+    if not is_fanout_author(author):
+        return  # Celebrity posts are merged in at read time
+    _backfill_timelines([owner.id], author.id)
+
+# Remove an author's posts from a user's timeline after they unfollow the author
+def prune_timeline(owner, author):
+    TimelineEntry.objects.filter(owner=owner, author=author).delete()
+    invalidate_user_feeds([owner.id])
+
+# Switch the authors whose follower count just changed by delta (1 for a follow, -1 for an unfollow) and so
+# reached TIMELINE_FANOUT_THRESHOLD, or fell below it, between fan-out on write and merge on read
+def update_fanout_modes(author_ids, delta):
+    threshold = fanout_threshold()
+    crossed = list(User.objects.filter(pk__in=author_ids, follower_count=threshold if delta > 0 else threshold - 1).values_list('id', flat=True))
+    if delta > 0:
+        switch_fanout_modes(pull_ids=crossed, fanout_ids=[])
+    else:
+        switch_fanout_modes(pull_ids=[], fanout_ids=crossed)
+
+# Rewrite the followers' timelines of authors who became celebrities (pull_ids) or stopped being ones
+# (fanout_ids), so the posts of neither mode go missing from feeds: an author becoming a celebrity leaves the
+# timelines (their posts are merged in at read time from now on), and one falling below the threshold has their
+# recent posts copied into their followers' timelines, as after a follow.
+def switch_fanout_modes(pull_ids, fanout_ids):
+    for author_id, to_pull in [*((author_id, True) for author_id in pull_ids), *((author_id, False) for author_id in fanout_ids)]:
+        follower_ids = list(User.objects.filter(following=author_id).values_list('id', flat=True))
+        if to_pull:
+            TimelineEntry.objects.filter(author_id=author_id).delete()
+        else:
+            _backfill_timelines(follower_ids, author_id)
+        invalidate_user_feeds(follower_ids)
+        invalidate_author_feeds(author_id)
+
+# Get the ids of the celebrity authors a user follows, whose posts are merged into their feed at read time
+def followed_pull_author_ids(user):
+    return list(user.following.filter(follower_count__gte=fanout_threshold()).values_list('id', flat=True))
+
+# Build the home feed: materialized timeline rows plus posts from followed celebrity authors
+def feed_queryset(user, followed_pull_ids=None):
+    feed_filter = Q(id__in=TimelineEntry.objects.filter(owner=user).values('post_id'))
+
+    if followed_pull_ids is None:
+        followed_pull_ids = followed_pull_author_ids(user)
+    if followed_pull_ids:
+        feed_filter |= Q(author_id__in=followed_pull_ids)
+
+    return Post.objects.filter(feed_filter)
+
+# Maximum number of followed celebrity authors whose posts are read in one query (one subquery each)
+PULL_AUTHORS_PER_QUERY = 100
+
+# Get the (created_at, post id) of the next `limit` posts of a home feed after position, a (created_at, post id)
+# pair or None for the first page, newest first (oldest first when walking backwards). The timeline rows are
+# read in the order of their (owner, created_at, post) index and each followed celebrity's posts in the order
+# of their (author, created_at) index, then merged here, so no query sorts rows.
+def feed_page_positions(user, followed_pull_ids, position, reverse, limit):
+    lookup = 'gt' if reverse else 'lt'
+    direction = '' if reverse else '-'
+
+    def after_position(created_at_field, id_field):
+        if position is None:
+            return Q()
+        created_at, post_id = position
+        return Q(**{f'{created_at_field}__{lookup}': created_at}) | Q(**{created_at_field: created_at, f'{id_field}__{lookup}': post_id})
+
+    timeline = TimelineEntry.objects.filter(after_position('created_at', 'post_id'), owner=user)
+    sources = [list(timeline.order_by(direction + 'created_at', direction + 'post_id').values_list('created_at', 'post_id')[:limit])]
+
+    # The first `limit` posts of each celebrity, fetched together and sorted here
+    followed_pull_ids = list(followed_pull_ids)
+    for start in range(0, len(followed_pull_ids), PULL_AUTHORS_PER_QUERY):
+        authors_posts = Q()
+        for author_id in followed_pull_ids[start:start + PULL_AUTHORS_PER_QUERY]:
+            author_posts = Post.objects.filter(after_position('created_at', 'id'), author_id=author_id).order_by(direction + 'created_at', direction + 'id')
+            authors_posts |= Q(id__in=author_posts.values('id')[:limit])
+        sources.append(sorted(Post.objects.filter(authors_posts).values_list('created_at', 'id'), reverse=not reverse))
+
+    # A post fanned out while its author was becoming a celebrity can come from both
+    positions, seen = [], set()
+    for created_at, post_id in heapq.merge(*sources, reverse=not reverse):
+        if post_id not in seen:
+            seen.add(post_id)
+            positions.append((created_at, post_id))
+            if len(positions) == limit:
+                break
+    return positions
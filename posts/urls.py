@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, PostFeed, CommentViewset, LikePostView, UnlikePostView
+from .views import PostViewSet, PostFeed, CommentViewset, LikePostView, UnlikePostView, SearchView
 
 # Initialize a DefaultRouter, which will automatically generate URL patterns for viewsets
 router = DefaultRouter()
@@ -13,6 +13,7 @@ router.register(r"comments_all", CommentViewset, basename="comment-viewset-list"
 
 urlpatterns = [
     path("", include(router.urls)), # Include the automatically generated URLs for the Post and Comment viewsets
+    path("search/", SearchView.as_view(), name="post_search"), # URL for relevance-ranked full-text search over posts or comments
     path("feed/", PostFeed.as_view(), name="post_feed"), # URL for the PostFeed view, which shows the current user's feed of posts from followed users
     path('<int:post_id>/like/', LikePostView.as_view(), name='like_post'), # URL for liking a post, using the LikePostView, where <int:post_id> is the ID of the post being liked
     path('<int:post_id>/unlike/', UnlikePostView.as_view(), name='unlike_post'), # URL for unliking a post, using the UnlikePostView, where <int:post_id> is the ID of the post being unliked
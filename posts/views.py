@@ -1,50 +1,122 @@
 from django.shortcuts import render, get_object_or_404
 from rest_framework import filters, views, viewsets, status, generics
+from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, NotFound
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
-from .serializers import PostSerializer, CommentSerializer
+from .serializers import PostSerializer, PostSummarySerializer, CommentSerializer, BulkCommentSerializer
+from .bulk import bulk_batch_size, bulk_items, bulk_response, bulk_validate
 from .models import Post, Comment, Like
+from .timeline import fan_out_post, fan_out_posts, feed_page_positions, feed_queryset, followed_pull_author_ids, invalidate_post_feeds
+from .feed_cache import feed_cache, feed_page_key, invalidate_user_feeds, record_feed_cache
+from .search import SearchIndexFilter, ranked_search, encode_search_cursor, decode_search_cursor
+from users.counters import adjust_post_count
+from uploads.variants import schedule_variants, variants_version_subqueries
 from django.contrib.auth import authenticate, get_user_model
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from social_media_api.pagination import KeysetPagination
+from social_media_api.conditional import build_etag, conditional
+from django.db.models import Count, Max, OuterRef, Subquery
 from django_filters import rest_framework
 from rest_framework.response import Response
-from notifications.models import Notification
+from rest_framework.utils.urls import replace_query_param
+from drf_yasg import openapi
+from notifications.dispatch import notify, notify_many
+from notifications.models import NotificationEvent
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from drf_yasg.utils import swagger_auto_schema
 
 User = get_user_model()  # Custom user model
 
-# Pagination class to handle post pagination
-class PostPagination(PageNumberPagination):
+# Pagination class to handle post pagination, using keyset cursors (pass ?page=N for page numbers)
+class PostPagination(KeysetPagination):
     page_size = 10  # Number of posts per page
 
+# Pagination of the home feed. Pages of the plain feed, newest first, are read from the reader's timeline and
+# their followed celebrities' posts in index order (see feed_page_positions) rather than sorting the posts
+# matching the feed; filtered, searched or reordered feeds are paged like other post lists.
+class FeedPagination(PostPagination):
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
+
+    def fetch_rows(self, queryset, reverse, limit):
+        if not (self.view.reads_timeline() and self.keys == [('created_at', True), ('id', True)]):
+            return super().fetch_rows(queryset, reverse, limit)
+
+        position = self.cursor['position'] if self.cursor else None
+        positions = feed_page_positions(self.request.user, self.view.followed_pull_ids, position, reverse, limit)
+        posts = self.view.summaries(Post.objects.filter(pk__in=[post_id for _, post_id in positions])).in_bulk()
+        return [posts[post_id] for _, post_id in positions if post_id in posts]
+
+# ETag of a post with its nested comments and likes, from a single query over the post row and
+# aggregates of its comments, likes and media variants (so an edited, added or removed comment or like, or
+# variants generated after the upload, change it)
+def post_etag(request, pk=None, *args, **kwargs):
+    def aggregate(model, expression):
+        rows = model.objects.filter(post=OuterRef('pk')).order_by().values('post')
+        return Subquery(rows.annotate(value=expression).values('value'))
+
+    validators = Post.objects.filter(pk=pk).values_list(
+        'updated_at',
+        aggregate(Comment, Count('id')),
+        aggregate(Comment, Max('updated_at')),
+        aggregate(Like, Count('id')),
+        aggregate(Like, Max('id')),
+        *variants_version_subqueries('media'),
+    ).first()
+    if validators is None:
+        return None  # Let the view answer 404
+    return build_etag(request, 'post', pk, *validators)
+
 # Viewset for managing posts
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = PostPagination
-    filter_backends = [rest_framework.DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [rest_framework.DjangoFilterBackend, SearchIndexFilter, filters.OrderingFilter]
     filterset_fields = ['title', 'created_at']
     search_fields = ['title', 'content']
     ordering_fields = ['id', 'title', 'created_at']
     ordering = ['id']
+
+    def get_queryset(self):
+        # Lists use the summary representation, annotated with counts instead of nested comments and likes
+        if self.action == 'list':
+            return Post.objects.with_summary(self.request.user, settings.POST_SUMMARY_COMMENT_LIMIT)
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return PostSummarySerializer
+        return super().get_serializer_class()
     
     def perform_create(self, serializer):
          # Automatically set the author of the post to the current logged-in user
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        adjust_post_count(post.author_id, 1)
+        schedule_variants(post.media)
+
+        # Write the new post into the timelines of the author's followers
+        fan_out_post(post)
 
     def perform_update(self, serializer):
         # Check if the user is the author before updating
         if self.get_object().author != self.request.user:
             raise PermissionDenied("You can only update your own posts!")
-        serializer.save()
+        post = serializer.save()
+        if 'media' in serializer.validated_data:
+            schedule_variants(post.media)
+        invalidate_post_feeds(post)
 
     def perform_destroy(self, instance):
         # Check if the user is the author before deleting
         if instance.author != self.request.user:
             raise PermissionDenied("You can only delete your own posts!")
         instance.delete()
+        adjust_post_count(instance.author_id, -1)
+        invalidate_post_feeds(instance)
 
     # Apply swagger documentation
     @swagger_auto_schema(
@@ -72,8 +144,9 @@ class PostViewSet(viewsets.ModelViewSet):
     # Apply swagger documentation
     @swagger_auto_schema(
         operation_summary="Retrieve a specific post by its ID",
-        operation_description="Get details of a single post by its ID."
+        operation_description="Get details of a single post by its ID. Send the returned ETag in If-None-Match to get 304 Not Modified while the post, its comments and likes are unchanged."
     )
+    @conditional(etag_func=post_etag)
     def retrieve(self, request, *args, **kwargs):
         """
         Get details of a single post by its ID.
@@ -100,7 +173,7 @@ class PostViewSet(viewsets.ModelViewSet):
         """
         Partially update an existing post. Only the post's author can update it.
         """
-        return super().partia_update(request, *args, **kwargs)
+        return super().partial_update(request, *args, **kwargs)
 
     # Apply swagger documentation
     @swagger_auto_schema(
@@ -113,24 +186,58 @@ class PostViewSet(viewsets.ModelViewSet):
         """
         return super().destroy(request, *args, **kwargs)
 
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Create many posts",
+        operation_description="Create up to BULK_CREATE_MAX_ITEMS posts (JSON only, without media) in one transaction. Returns the id or the validation errors of every item, by index: 201 when all were created, 207 when some were, 400 when none were.",
+        request_body=PostSerializer(many=True),
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        valid, errors = bulk_validate(PostSerializer, bulk_items(request), self.get_serializer_context())
+
+        created = []
+        if valid:
+            with transaction.atomic():
+                posts = Post.objects.bulk_create(
+                    [Post(author=request.user, **data) for _, data in valid], batch_size=bulk_batch_size()
+                )
+                adjust_post_count(request.user.id, len(posts))
+
+                # Write the new posts into the timelines of the author's followers
+                fan_out_posts(posts)
+            created = [(index, post) for (index, _), post in zip(valid, posts)]
+
+        return bulk_response(created, errors)
+
 # View for displaying a user's feed (posts from followed users)
 class PostFeed(generics.ListAPIView):
     #queryset = Post.objects.all()
-    serializer_class = PostSerializer
+    serializer_class = PostSummarySerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = PostPagination
-    filter_backends = [rest_framework.DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = FeedPagination
+    filter_backends = [rest_framework.DjangoFilterBackend, SearchIndexFilter, filters.OrderingFilter]
     filterset_fields = ['title', 'created_at']
     search_fields = ['title', 'content']
     ordering_fields = ['id', 'title', 'created_at']
     ordering = ["-created_at"]
+    followed_pull_ids = None  # Celebrity authors followed by the reader, looked up once per request
 
     def get_queryset(self):
-        # Get posts from users that the current user is following
-        following_users = self.request.user.following.all()
-        feed = Post.objects.filter(author__in=following_users).order_by('-created_at')
+        # Get posts from users that the current user is following, read from the materialized timeline
+        feed = self.summaries(feed_queryset(self.request.user, self.followed_pull_ids)).order_by('-created_at')
         return feed
 
+    # Annotate posts for the summary representation
+    def summaries(self, posts):
+        return posts.with_summary(self.request.user, settings.POST_SUMMARY_COMMENT_LIMIT)
+
+    # Whether the request reads the whole feed, without filters or a search, so its pages can be read from the timeline
+    def reads_timeline(self):
+        params = self.request.query_params
+        return not any(params.get(name) for name in [*self.filterset_fields, SearchIndexFilter.search_param])
+
      # Adding Swagger documentation
     @swagger_auto_schema(
         operation_summary="Retrieve posts from followed users",
@@ -142,6 +249,21 @@ class PostFeed(generics.ListAPIView):
         """
         return super().get(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        # Serve the rendered page from the feed cache while neither the timeline nor a followed celebrity changed
+        self.followed_pull_ids = followed_pull_author_ids(request.user)
+        key = feed_page_key(request, self.followed_pull_ids)
+        data = feed_cache().get(key)
+        if data is not None:
+            record_feed_cache('hit')
+            return Response(data, headers={'X-Feed-Cache': 'HIT'})
+
+        record_feed_cache('miss')
+        response = super().list(request, *args, **kwargs)
+        feed_cache().set(key, response.data, getattr(settings, 'FEED_CACHE_TIMEOUT', 60))
+        response['X-Feed-Cache'] = 'MISS'
+        return response
+
 # Viewset for managing comments on posts
 class CommentViewset(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
@@ -149,7 +271,7 @@ class CommentViewset(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     pagination_class = PostPagination
      # Enable Filtering, Searching, and Ordering
-    filter_backends = [rest_framework.DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [rest_framework.DjangoFilterBackend, SearchIndexFilter, filters.OrderingFilter]
     # Define the filter fields
     filterset_fields = ['content', 'created_at']
     search_fields = ['content']
@@ -159,19 +281,59 @@ class CommentViewset(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Save the comment with the logged-in user as the author
         comment = serializer.save(author=self.request.user)
+        invalidate_user_feeds([self.request.user.id])  # Show the new comment in the commenter's own feed right away
 
         # Create a notification for the post author (notify them about the new comment)
         post = comment.post  # comment is linked to a post
         if post.author != self.request.user:
-            # Notify the post author about the new comment
-            Notification.objects.create(
+            # Notify the post author about the new comment, grouped with other recent comments on the post
+            notify(
                 recipient=post.author,  # The user who owns the post
                 actor=self.request.user,  # The user who made the comment
                 verb='commented on your post',  # Action description
-                target_content_type=ContentType.objects.get_for_model(Post),  # Content type of the post
-                target_object_id=post.id  # The ID of the post
+                target=post,  # The post that was commented on
             )
 
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Create many comments",
+        operation_description="Create up to BULK_CREATE_MAX_ITEMS comments, on any posts, in one transaction. Post authors are notified in bulk. Returns the id or the validation errors of every item, by index: 201 when all were created, 207 when some were, 400 when none were.",
+        request_body=CommentSerializer(many=True),
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        items = bulk_items(request)
+
+        # Load every referenced post with one query instead of one per item
+        post_ids = set()
+        for item in items:
+            try:
+                post_ids.add(int(item.get('post')))
+            except (TypeError, ValueError):
+                pass  # Reported by the serializer
+        context = dict(self.get_serializer_context(), posts=Post.objects.in_bulk(post_ids))
+        valid, errors = bulk_validate(BulkCommentSerializer, items, context)
+
+        created = []
+        if valid:
+            with transaction.atomic():
+                comments = Comment.objects.bulk_create(
+                    [Comment(author=request.user, **data) for _, data in valid], batch_size=bulk_batch_size()
+                )
+
+                # Notify the post authors, grouped with other recent comments on their posts
+                post_type = ContentType.objects.get_for_model(Post)
+                notify_many(
+                    NotificationEvent(comment.post.author_id, request.user.id, 'commented on your post', post_type.pk, comment.post_id)
+                    for comment in comments
+                    if comment.post.author_id != request.user.id
+                )
+            invalidate_user_feeds([request.user.id])  # Show the new comments in the commenter's own feed right away
+            created = [(index, comment) for (index, _), comment in zip(valid, comments)]
+
+        return bulk_response(created, errors)
+
     def perform_update(self, serializer):
         # Check if the user is the author before updating
         if self.get_object().author != self.request.user:
@@ -238,7 +400,7 @@ class CommentViewset(viewsets.ModelViewSet):
         """
         Partially update an existing comment. Only the comment's author can update it.
         """
-        return super().partia_update(request, *args, **kwargs)
+        return super().partial_update(request, *args, **kwargs)
 
     # Apply swagger documentation
     @swagger_auto_schema(
@@ -251,6 +413,60 @@ class CommentViewset(viewsets.ModelViewSet):
         """
         return super().destroy(request, *args, **kwargs)
 
+# View for relevance-ranked full-text search over posts or comments
+class SearchView(views.APIView):
+    permission_classes = [IsAuthenticated]
+    pagination_class = PostPagination  # Only used for its page size settings
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Search posts or comments",
+        operation_description="Full-text search ranked by relevance, with highlighted snippets. Follow the `next` link for more results.",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Words to search for", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('type', openapi.IN_QUERY, description="What to search", type=openapi.TYPE_STRING, enum=['posts', 'comments'], default='posts'),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="The pagination cursor value", type=openapi.TYPE_STRING),
+        ]
+    )
+    def get(self, request):
+        search = request.query_params.get('q', '')
+        search_type = request.query_params.get('type', 'posts')
+        if search_type not in ('posts', 'comments'):
+            return Response({'detail': "type must be 'posts' or 'comments'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        page_size = self.pagination_class().get_page_size(request)
+        cursor = request.query_params.get('cursor')
+        after = decode_search_cursor(cursor) if cursor else None
+
+        # Rank the matches in the index, fetching one extra row to know whether there is a next page
+        model = Post if search_type == 'posts' else Comment
+        rows = ranked_search(model, search, page_size + 1, after)
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        # Load and serialize the matching rows in one query
+        ids = [row_id for row_id, _, _ in rows]
+        if model is Post:
+            objects = Post.objects.with_summary(request.user, settings.POST_SUMMARY_COMMENT_LIMIT).in_bulk(ids)
+            serializer_class = PostSummarySerializer
+        else:
+            objects = Comment.objects.in_bulk(ids)
+            serializer_class = CommentSerializer
+
+        results = []
+        for row_id, score, snippet in rows:
+            if row_id in objects:
+                item = serializer_class(objects[row_id], context={'request': request}).data
+                item.update({'rank': score, 'snippet': snippet})
+                results.append(item)
+
+        next_link = None
+        if has_next:
+            last_id, last_score, _ = rows[-1]
+            next_link = replace_query_param(request.build_absolute_uri(), 'cursor', encode_search_cursor(last_score, last_id))
+
+        return Response({'next': next_link, 'results': results}, status=status.HTTP_200_OK)
+
 # View for liking a post
 class LikePostView(views.APIView):
     # Apply swagger documentation
@@ -271,17 +487,15 @@ class LikePostView(views.APIView):
         
         if not created:
             return Response({'detail': 'You already liked this post.'}, status=status.HTTP_400_BAD_REQUEST)
+        invalidate_user_feeds([user.id])  # Show the like in the user's own feed right away
          
-         # Create a notification for the post's author when a post is liked
-        notification = Notification(
+         # Notify the post's author when a post is liked, grouped with other recent likes of the post
+        notify(
             recipient=post.author,  # The author of the post
             actor=user,             # The user who liked the post
             verb='liked your post', # Verb explaining the action
-            # ContentType to link the notification to the Post model
-            target_content_type=ContentType.objects.get_for_model(Post),  # The content type of the Post model
-            target_object_id=post.id,  # The specific post that was liked
+            target=post,            # The specific post that was liked
         )
-        notification.save()
         
         return Response({'detail': 'You liked this post.'}, status=status.HTTP_201_CREATED)
 
@@ -304,6 +518,7 @@ class UnlikePostView(views.APIView):
         try:
             like = Like.objects.get(user=user, post=post)  # This will raise Like.DoesNotExist if no like exists
             like.delete()  # If found, delete the like
+            invalidate_user_feeds([user.id])  # Show the unlike in the user's own feed right away
             return Response({'detail': 'You unliked this post.'}, status=status.HTTP_200_OK)
         except Like.DoesNotExist:
             return Response({'detail': 'You have not liked this post yet.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media_api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Serve the real-time event stream next to the Django application
+from social_media_api.realtime import RealtimeRouter  # noqa: E402 (needs the settings configured above)
+
+application = RealtimeRouter(django_application)
@@ -0,0 +1,10 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+# JWT authentication that takes the requests of a batch (see batch.py) as the user the batch was authenticated
+# as, so the token is checked and the user loaded once per batch rather than once per request
+class BatchJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        user = getattr(request, 'batch_user', None)
+        if user is not None:
+            return (user, getattr(request, 'batch_auth', None))
+        return super().authenticate(request)
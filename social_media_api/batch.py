@@ -0,0 +1,173 @@
+import contextvars
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import serializers, status, views
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+# Methods that only read, and so may run concurrently with each other
+SAFE_METHODS = ('GET', 'HEAD')
+
+def batch_max_requests():
+    return getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.RegexField(r'^/', help_text="Path of the API endpoint, with its query string (e.g. /posts/feed/?page_size=5)")
+    body = serializers.JSONField(required=False, help_text="JSON body of the request")
+    headers = serializers.DictField(child=serializers.CharField(), required=False, help_text="Extra headers (e.g. If-None-Match)")
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True)
+    parallel = serializers.BooleanField(default=False, help_text="Run consecutive GET requests concurrently")
+
+    def validate_requests(self, value):
+        if not value:
+            raise serializers.ValidationError("Send at least one request.")
+        if len(value) > batch_max_requests():
+            raise serializers.ValidationError(f"At most {batch_max_requests()} requests can be batched.")
+        return value
+
+# An internal request carrying the scheme of the batch request it came from
+class SubRequest(HttpRequest):
+    def __init__(self, scheme):
+        super().__init__()
+        self.batch_scheme = scheme
+
+    def _get_scheme(self):
+        return self.batch_scheme
+
+# Build the internal request of one batched sub-request. It shares the batch request's host, credentials and
+# cookies, but none of its conditional headers or body. It runs as the user the batch was authenticated as
+# (see BatchJWTAuthentication), without checking the token again.
+def build_subrequest(request, method, path, body=None, headers=None):
+    path, _, query_string = path.partition('?')
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+
+    subrequest = SubRequest(request.scheme)
+    subrequest.method = method
+    subrequest.path = subrequest.path_info = path
+    subrequest.META = {
+        key: value for key, value in request.META.items()
+        if not key.startswith('HTTP_IF_') and key not in ('CONTENT_TYPE', 'CONTENT_LENGTH', 'wsgi.input')
+    }
+    subrequest.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+    })
+    for name, value in (headers or {}).items():
+        subrequest.META['HTTP_' + name.upper().replace('-', '_')] = value
+    subrequest.GET = QueryDict(query_string)
+    subrequest.COOKIES = request.COOKIES
+    subrequest._stream = io.BytesIO(data)
+    subrequest._read_started = False
+
+    subrequest.batch_user = request.user
+    subrequest.batch_auth = request.auth
+    return subrequest
+
+_handler = None
+_handler_lock = threading.Lock()
+
+# Handler running sub-requests through the project's middleware (metrics, replica routing, security, ...) and
+# URL resolver, as the WSGI and ASGI handlers run requests. Loading the middleware instantiates every class of
+# the chain, so the handler is built once per process (and again if MIDDLEWARE changes) and shared by all
+# batches, as the WSGI handler is shared by all requests.
+def subrequest_handler():
+    global _handler
+    middleware = tuple(settings.MIDDLEWARE)
+    with _handler_lock:
+        if _handler is None or _handler[0] != middleware:
+            handler = BaseHandler()
+            handler.load_middleware()
+            _handler = (middleware, handler)
+        return _handler[1]
+
+# Run one sub-request, returning its status, headers and body
+def dispatch_subrequest(handler, request, item):
+    path = item['path'].partition('?')[0]
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {'status': status.HTTP_404_NOT_FOUND, 'headers': {}, 'body': {'detail': 'Not found.'}}
+    if match.url_name == 'batch':
+        return {'status': status.HTTP_400_BAD_REQUEST, 'headers': {}, 'body': {'detail': 'Batch requests cannot be nested.'}}
+
+    # Errors are logged and turned into 500 responses by the handler
+    response = handler.get_response(build_subrequest(request, item['method'], item['path'], item.get('body'), item.get('headers')))
+    if response.streaming:
+        return {'status': status.HTTP_400_BAD_REQUEST, 'headers': {}, 'body': {'detail': 'Streaming responses cannot be batched.'}}
+
+    headers = dict(response.items())
+    if response.status_code >= 500 and 'json' not in headers.get('Content-Type', ''):
+        return {'status': response.status_code, 'headers': {}, 'body': {'detail': 'Server error.'}}
+    body = response.content.decode(response.charset or 'utf-8')
+    if body and 'json' in headers.get('Content-Type', ''):
+        body = json.loads(body)
+    return {'status': response.status_code, 'headers': headers, 'body': body or None}
+
+# Run a sub-request on a worker thread, in a copy of the batch request's context, closing the thread's database
+# connections afterwards
+def dispatch_in_thread(context, handler, request, item):
+    try:
+        return context.run(dispatch_subrequest, handler, request, item)
+    finally:
+        connections.close_all()
+
+# Reply with every response, in order: 200 when all of them succeeded, 207 when some failed
+def batch_response(responses):
+    failed = any(response['status'] >= 400 for response in responses)
+    return Response({"responses": responses}, status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK)
+
+# View running several API requests in one round trip (e.g. everything a mobile app needs at start-up)
+class BatchView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Send several requests at once",
+        operation_description="Runs up to BATCH_MAX_REQUESTS API requests, in order, with a single authentication, and returns every response (status, headers and body) in one reply: 200 when all of them succeeded, 207 when some failed. Each request runs through the middleware, as a request of its own. With `parallel`, consecutive GET requests run concurrently; other requests always run alone, in order.",
+        request_body=BatchSerializer,
+        responses={200: openapi.Response("The responses, in the order of the requests"), 207: openapi.Response("The responses, some of them errors")},
+    )
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+        handler = subrequest_handler()
+
+        if not serializer.validated_data['parallel']:
+            return batch_response([dispatch_subrequest(handler, request, item) for item in items])
+
+        # Split the requests into runs of consecutive reads, which run concurrently, and single writes
+        responses = []
+        with ThreadPoolExecutor(max_workers=getattr(settings, 'BATCH_MAX_WORKERS', 4)) as executor:
+            index = 0
+            while index < len(items):
+                if items[index]['method'] not in SAFE_METHODS:
+                    responses.append(dispatch_subrequest(handler, request, items[index]))
+                    index += 1
+                    continue
+                end = index
+                while end < len(items) and items[end]['method'] in SAFE_METHODS:
+                    end += 1
+                # A context can only run in one thread at a time, so each request gets its own copy
+                responses += executor.map(
+                    lambda item, context: dispatch_in_thread(context, handler, request, item),
+                    items[index:end], [contextvars.copy_context() for _ in range(index, end)],
+                )
+                index = end
+
+        return batch_response(responses)
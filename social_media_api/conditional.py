@@ -0,0 +1,17 @@
+import hashlib
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+# Build an ETag from the values a response is rendered from. The user, the query string and the renderer format
+# are part of it, since they change the body returned from the same data.
+def build_etag(request, *values):
+    renderer = getattr(request, 'accepted_renderer', None)
+    key = repr((request.user.pk, request.get_full_path(), renderer.format if renderer else None) + values)
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+# Decorate an API view method with conditional GET support: the validators are computed from cheap queries
+# before the method runs, and a request whose If-None-Match / If-Modified-Since still matches gets a
+# 304 Not Modified without the payload being loaded or serialized.
+# Both functions receive (request, *args, **kwargs) like the view method, and may return None when unknown.
+def conditional(etag_func=None, last_modified_func=None):
+    return method_decorator(condition(etag_func=etag_func, last_modified_func=last_modified_func))
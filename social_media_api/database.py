@@ -0,0 +1,38 @@
+from django.core.exceptions import ImproperlyConfigured
+
+# PRAGMAs run on every new connection of the 'production' profile
+PRODUCTION_PRAGMAS = [
+    'journal_mode = WAL',  # Readers no longer block the writer and the writer no longer blocks readers
+    'synchronous = NORMAL',  # In WAL mode, fsync at checkpoints only: a power loss may lose the last commits, never corrupt the file
+    'mmap_size = 268435456',  # Read the first 256 MB of the file through a memory map instead of read() calls
+    'cache_size = -65536',  # 64 MB page cache per connection (negative values are KiB)
+    'busy_timeout = 5000',  # Wait up to 5 s for a lock instead of failing with "database is locked"
+    'temp_store = MEMORY',  # Temporary tables and sort indexes in memory
+]
+
+# SQLite connection profiles, as the settings added to a DATABASES entry
+SQLITE_PROFILES = {
+    # Django's defaults: rollback journal, a new connection per request
+    'default': {},
+    # Tuned for several request workers sharing one database file
+    'production': {
+        'CONN_MAX_AGE': 600,  # Keep connections open across requests for up to 10 minutes
+        'CONN_HEALTH_CHECKS': True,  # Check a kept connection still works before the request that reuses it
+        'OPTIONS': {
+            'init_command': '; '.join(f'PRAGMA {pragma}' for pragma in PRODUCTION_PRAGMAS),
+            # Take the write lock when a transaction starts, so a transaction that reads then writes waits for
+            # busy_timeout instead of failing when another one wrote in between
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+}
+
+# A DATABASES entry for the SQLite file at `name`, with the settings of the named profile
+def sqlite_database(name, profile='default'):
+    if profile not in SQLITE_PROFILES:
+        raise ImproperlyConfigured(f"Unknown SQLite profile {profile!r}, use one of: {', '.join(SQLITE_PROFILES)}")
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        **SQLITE_PROFILES[profile],
+    }
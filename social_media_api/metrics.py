@@ -0,0 +1,237 @@
+import atexit
+import contextvars
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Default upper bounds (in seconds) of the request latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Help text and type of every exported metric
+METRICS = {
+    'http_requests_total': ('counter', "Requests handled, by view, method and status code."),
+    'http_request_duration_seconds': ('histogram', "Time spent producing a response, by view and method."),
+    'http_request_db_queries_total': ('counter', "SQL queries run while handling requests, by view."),
+    'http_request_db_seconds_total': ('counter', "Time spent in SQL queries while handling requests, by view."),
+}
+
+def latency_buckets():
+    return tuple(getattr(settings, 'METRICS_LATENCY_BUCKETS', DEFAULT_LATENCY_BUCKETS))
+
+# Metrics of the current process. Counters are keyed by (name, labels) and histograms keep per-bucket counts,
+# their sum and count, so the files written by several worker processes can simply be added up.
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = latency_buckets()
+        with self.lock:
+            histogram = self.histograms.setdefault(key, {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), dict(histogram, buckets=list(histogram['buckets']))] for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def merge(self, data):
+        with self.lock:
+            for name, labels, value in data.get('counters', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, histogram in data.get('histograms', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = self.histograms.setdefault(key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0.0, 'count': 0})
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+                merged['sum'] += histogram['sum']
+                merged['count'] += histogram['count']
+
+    # Write this process' metrics to its own file in METRICS_DIR (atomically, so readers never see half a file)
+    def flush(self):
+        directory = metrics_dir()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.to_dict(), file)
+        os.replace(temporary, path)
+        self.last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            self.flush()
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+# Whether the worker process that wrote a metrics file is still running. Processes can only be checked on POSIX
+# systems; elsewhere every file is kept.
+def _process_alive(pid):
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Running as another user
+    return True
+
+_registry = None
+_registry_lock = threading.Lock()
+
+# Get the registry of the current process. A file left with the same PID belongs to a process that has exited,
+# and is overwritten by the first flush.
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            registry = MetricsRegistry()
+            if metrics_dir():
+                atexit.register(registry.flush)
+            _registry = registry
+    return _registry
+
+# Aggregate the metrics of the running worker processes (the files in METRICS_DIR), or of this process alone
+# without it. The files of exited processes are deleted, so restarted workers are not counted forever.
+def collect():
+    registry = get_registry()
+    directory = metrics_dir()
+    if not directory:
+        return registry
+
+    registry.flush()  # Include this process' latest requests
+    total = MetricsRegistry()
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        pid = os.path.basename(path).removeprefix('metrics-').removesuffix('.json')
+        if not pid.isdigit():
+            continue  # Not ours
+        if not _process_alive(int(pid)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Already removed by another worker
+            continue
+        try:
+            with open(path) as file:
+                total.merge(json.load(file))
+        except (OSError, ValueError):
+            continue  # Being replaced right now
+    return total
+
+def _format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+# Render the metrics in the Prometheus text exposition format
+def render(registry):
+    lines = []
+    buckets = latency_buckets()
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(registry.counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        else:
+            for (metric, labels), histogram in sorted(registry.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+# Timer of the innermost request being measured. A batched sub-request runs inside the batch request, on the
+# same connections, and its queries are counted for the sub-request only.
+_current_timer = contextvars.ContextVar('metrics_query_timer', default=None)
+
+# Counts and times the SQL queries run on a connection
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if _current_timer.get() is not self:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+# Middleware recording, for every request, its resolved URL name, method, status code, latency and SQL work.
+# It should come first in MIDDLEWARE so the latency covers the other middleware too.
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        token = _current_timer.set(timer)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        duration = time.perf_counter() - start
+
+        # Label by URL name rather than path, so ids in URLs don't create a series per object
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        registry = get_registry()
+        registry.inc('http_requests_total', {'view': view, 'method': request.method, 'status': response.status_code})
+        registry.observe('http_request_duration_seconds', {'view': view, 'method': request.method}, duration)
+        registry.inc('http_request_db_queries_total', {'view': view}, timer.count)
+        registry.inc('http_request_db_seconds_total', {'view': view}, timer.seconds)
+        registry.maybe_flush()
+        return response
+
+# Endpoint serving the metrics to Prometheus. It needs "Authorization: Bearer <METRICS_TOKEN>" when a token
+# is configured, or else a staff user logged in to the admin.
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(authorization, f'Bearer {token}'):
+        pass
+    elif not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden("Metrics require the metrics token or a staff account.")
+
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
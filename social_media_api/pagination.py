@@ -0,0 +1,134 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Keyset (seek) pagination: each page continues from the ordering values of the previous page's last row,
+# so deep pages cost the same as the first one and rows inserted meanwhile never shift the pages.
+class KeysetPagination(CursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'  # Allow clients to pick a page size...
+    max_page_size = 100  # ...up to this many rows
+    ordering = ('-created_at', '-id')  # Used when neither the view nor the client orders the queryset
+    page_query_param = 'page'  # Passing ?page=N opts into page-number pagination (with a total count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Page-number mode stays available for clients that need a total count
+        self.page_paginator = None
+        if self.page_query_param in request.query_params:
+            self.page_paginator = PageNumberPagination()
+            self.page_paginator.page_size = self.get_page_size(request)
+            return self.page_paginator.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.keys = self.get_keys(queryset)
+        self.cursor = self.decode_cursor(request)
+
+        # Fetch one extra row to find out whether there is another page in this direction
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        rows = self.fetch_rows(queryset, reverse, self.page_size + 1)
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if (self.has_next or self.has_previous) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    # Fetch the first `limit` rows past the cursor row, in the order of the keys (reversed when walking backwards)
+    def fetch_rows(self, queryset, reverse, limit):
+        queryset = queryset.order_by(*[
+            ('-' if descending != reverse else '') + name for name, descending in self.keys
+        ])
+        if self.cursor:
+            queryset = queryset.filter(self.seek_filter(self.cursor['position'], reverse))
+        return list(queryset[:limit])
+
+    def get_keys(self, queryset):
+        # Read the ordering applied by the view or the OrderingFilter, falling back to the default
+        ordering = queryset.query.order_by or self.ordering
+        keys = []
+        for item in ordering:
+            if not isinstance(item, str):
+                raise ImproperlyConfigured("KeysetPagination only supports ordering by field names.")
+            name = item.lstrip('-')
+            name = 'id' if name == 'pk' else name
+            self.get_field(name)  # Only concrete fields of the model can be used as keys
+            keys.append((name, item.startswith('-')))
+
+        # Break ties on the primary key so every row has a unique position
+        if 'id' not in [name for name, _ in keys]:
+            keys.append(('id', keys[-1][1] if keys else True))
+        return keys
+
+    def seek_filter(self, position, reverse):
+        # (a, b) after (x, y) becomes: a > x OR (a = x AND b > y), with < for descending keys
+        seek = Q()
+        for index, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != reverse else 'gt'
+            clause = Q(**{f'{name}__{lookup}': position[index]})
+            for previous_index, (previous_name, _) in enumerate(self.keys[:index]):
+                clause &= Q(**{previous_name: position[previous_index]})
+            seek |= clause
+        return seek
+
+    def get_field(self, name):
+        try:
+            return self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(f"KeysetPagination cannot order by '{name}'.")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = cursor['p']
+            if not isinstance(position, list) or len(position) != len(self.keys):
+                raise ValueError
+            position = [self.get_field(name).to_python(value) for (name, _), value in zip(self.keys, position)]
+            return {'position': position, 'reverse': bool(cursor.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        # Store each key of the boundary row as the string form the model field understands
+        position = [self.get_field(name).value_to_string(instance) for name, _ in self.keys]
+        cursor = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.page_paginator is not None:
+            return self.page_paginator.get_next_link()
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Walked backwards past the first row: start again from the first page
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if self.page_paginator is not None:
+            return self.page_paginator.get_previous_link()
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.page_paginator is not None:
+            return self.page_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
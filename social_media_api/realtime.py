@@ -0,0 +1,192 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+# Channel carrying the events of one user
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+# Per-connection mailbox. Events can be delivered from any thread; they are handed over to the
+# connection's event loop and buffered in a bounded queue. When a slow client lets the queue fill up,
+# the oldest event is dropped and the client is told to resync instead of the server growing memory.
+# Closing is signalled apart from the queue, so no burst of events can push it out.
+class Subscriber:
+    def __init__(self, loop, max_queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.overflowed = False
+        self.closed = asyncio.Event()
+
+    def close(self):
+        self.closed.set()
+
+    # Wait up to timeout seconds for the next event, returning None once the subscriber is closed
+    async def next_event(self, timeout):
+        if self.closed.is_set():
+            return None
+        get = asyncio.ensure_future(self.queue.get())
+        closed = asyncio.ensure_future(self.closed.wait())
+        try:
+            done, _ = await asyncio.wait({get, closed}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            get.cancel()
+            closed.cancel()
+        if closed in done:
+            return None
+        if get in done:
+            return get.result()
+        raise asyncio.TimeoutError
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.overflowed = True
+        self.queue.put_nowait(event)
+
+# Pub/sub backend keeping the subscribers in process memory: events only reach connections held by the
+# process that publishes them. Other backends (e.g. Redis) implement the same four methods.
+class InMemoryPubSub:
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel, subscriber):
+        with self.lock:
+            self.subscribers[channel].add(subscriber)
+
+    def unsubscribe(self, channel, subscriber):
+        with self.lock:
+            self.subscribers[channel].discard(subscriber)
+            if not self.subscribers[channel]:
+                del self.subscribers[channel]
+
+    def has_subscribers(self, channel):
+        return channel in self.subscribers
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.deliver(event)
+
+_pubsub = None
+_pubsub_lock = threading.Lock()
+
+# Get the backend selected by the REALTIME_PUBSUB_BACKEND setting
+def get_pubsub():
+    global _pubsub
+    with _pubsub_lock:
+        if _pubsub is None:
+            _pubsub = import_string(getattr(settings, 'REALTIME_PUBSUB_BACKEND', 'social_media_api.realtime.InMemoryPubSub'))()
+    return _pubsub
+
+# Check whether anyone is listening to a user's events, so callers can skip building unused payloads
+def is_listening(user_id):
+    return get_pubsub().has_subscribers(user_channel(user_id))
+
+# Push an event of the given type (e.g. "notification" or "message") to a user's open streams
+def publish_to_user(user_id, event_type, data):
+    get_pubsub().publish(user_channel(user_id), {'type': event_type, 'data': data})
+
+# ASGI application streaming a user's events as Server-Sent Events.
+# Clients authenticate with their JWT access token, in the Authorization header or a ?token= parameter
+# (browsers' EventSource cannot set headers).
+class EventStreamApp:
+    event_ids = itertools.count(1)
+
+    async def __call__(self, scope, receive, send):
+        user = await self.authenticate(scope)
+        if user is None:
+            await send({'type': 'http.response.start', 'status': 401, 'headers': [(b'content-type', b'application/json')]})
+            await send({'type': 'http.response.body', 'body': b'{"detail": "Authentication credentials were not provided or are invalid."}'})
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),  # Stop proxies from buffering the stream
+            ],
+        })
+
+        pubsub = get_pubsub()
+        channel = user_channel(user.pk)
+        subscriber = Subscriber(asyncio.get_running_loop(), getattr(settings, 'REALTIME_QUEUE_SIZE', 100))
+        watcher = asyncio.create_task(self.watch_disconnect(receive, subscriber))
+        pubsub.subscribe(channel, subscriber)
+        try:
+            # Tell the client how long to wait before reconnecting
+            retry = getattr(settings, 'REALTIME_RETRY_MS', 3000)
+            await send({'type': 'http.response.body', 'body': f'retry: {retry}\n\n'.encode(), 'more_body': True})
+            heartbeat = getattr(settings, 'REALTIME_HEARTBEAT_INTERVAL', 15)
+            while True:
+                try:
+                    event = await subscriber.next_event(heartbeat)
+                except asyncio.TimeoutError:
+                    # Heartbeat comment keeping idle connections (and the proxies in between) open
+                    await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+                    continue
+                if event is None:
+                    break  # The client went away
+
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    await send({'type': 'http.response.body', 'body': self.format_event({'type': 'resync', 'data': {}}), 'more_body': True})
+                await send({'type': 'http.response.body', 'body': self.format_event(event), 'more_body': True})
+        finally:
+            pubsub.unsubscribe(channel, subscriber)
+            watcher.cancel()
+
+    async def authenticate(self, scope):
+        headers = dict(scope.get('headers', []))
+        raw_token = None
+        authorization = headers.get(b'authorization', b'').split()
+        if len(authorization) == 2 and authorization[0] == b'Bearer':
+            raw_token = authorization[1]
+        else:
+            raw_token = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token', [None])[0]
+        if not raw_token:
+            return None
+
+        authentication = JWTAuthentication()
+        try:
+            validated_token = authentication.get_validated_token(raw_token)
+            return await sync_to_async(authentication.get_user)(validated_token)
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+
+    async def watch_disconnect(self, receive, subscriber):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                subscriber.close()  # Wake up the stream loop so it stops
+                return
+
+    def format_event(self, event):
+        data = json.dumps(event['data'], cls=DjangoJSONEncoder)
+        return f"id: {next(self.event_ids)}\nevent: {event['type']}\ndata: {data}\n\n".encode()
+
+# Route the event stream path to EventStreamApp and everything else to Django
+class RealtimeRouter:
+    def __init__(self, django_application):
+        self.django_application = django_application
+        self.event_stream = EventStreamApp()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == getattr(settings, 'REALTIME_STREAM_PATH', '/events/stream/'):
+            return await self.event_stream(scope, receive, send)
+        return await self.django_application(scope, receive, send)
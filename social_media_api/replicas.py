@@ -0,0 +1,151 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Reads go to a read replica only where it is known to be safe: in read-only (GET, HEAD, OPTIONS) requests of
+# users who have not written in the last REPLICA_PIN_SECONDS, and in blocks wrapped in read_from_replicas().
+# Everything else (writes, reads in other requests, transactions, background workers, management commands)
+# uses the primary database.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+def database_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+def replica_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+# Pins must be visible to every worker process, so use a shared cache (e.g. Redis or Memcached) in production
+def replica_cache():
+    return caches[getattr(settings, 'REPLICA_CACHE_ALIAS', 'default')]
+
+# System check (registered by the users app): with replicas configured, pins kept in a per-process cache are
+# only seen by the worker that handled the write, so a user's next read in another worker may miss it
+def check_replica_cache(app_configs, **kwargs):
+    if not database_replicas() or not isinstance(replica_cache(), (LocMemCache, DummyCache)):
+        return []
+    return [checks.Warning(
+        f"REPLICA_CACHE_ALIAS '{getattr(settings, 'REPLICA_CACHE_ALIAS', 'default')}' is not shared between worker processes, so users may not read their own writes.",
+        hint="Point REPLICA_CACHE_ALIAS at a shared cache (e.g. Redis, Memcached or the database cache).",
+        id='replicas.W001',
+    )]
+
+def _pin_key(user_id):
+    return f'replica:pin:user:{user_id}'
+
+# Routing of the current request or block: the replica its reads use (None for the primary), and whether it wrote
+class RoutingState:
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+_state = ContextVar('replica_routing', default=None)
+
+# Keep this user's reads on the primary for REPLICA_PIN_SECONDS, until the replicas have caught up with their writes
+def pin_to_primary(user_id):
+    seconds = replica_pin_seconds()
+    replica_cache().set(_pin_key(user_id), time.time() + seconds, timeout=seconds)
+
+def is_pinned(user_id):
+    return replica_cache().get(_pin_key(user_id), 0) > time.time()
+
+# Pick the replica for a request or block, so all its reads see the same snapshot
+def choose_replica():
+    replicas = database_replicas()
+    return random.choice(replicas) if replicas else None
+
+# Read from a replica within this block (e.g. a report that tolerates slightly stale data)
+@contextmanager
+def read_from_replicas():
+    token = _state.set(RoutingState(choose_replica()))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+# Read from the primary within this block, even in a read-only request
+@contextmanager
+def use_primary():
+    token = _state.set(RoutingState())
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+# Id of the user making a request, known before the view authenticates it: the user id claim of a JWT access
+# token (checked without a query), or the user logged in to the session (admin, browsable API)
+def request_user_id(request):
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is not None:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        try:
+            user_id = authentication.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+        except (InvalidToken, TokenError):
+            return None
+        return str(user_id) if user_id is not None else None
+    session = getattr(request, 'session', None)
+    return session.get(SESSION_KEY) if session is not None else None
+
+# Middleware sending the reads of read-only requests to a replica, and pinning users to the primary after a write
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not database_replicas():
+            return self.get_response(request)
+
+        user_id = request_user_id(request)
+        replica = None
+        if request.method in SAFE_METHODS and not (user_id and is_pinned(user_id)):
+            replica = choose_replica()
+
+        state = RoutingState(replica)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote and user_id:
+            pin_to_primary(user_id)
+        return response
+
+# Database router for the primary ('default') and its replicas (DATABASE_REPLICAS)
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        # A transaction may read what it just wrote, which the replicas don't have yet
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        # Once a request writes, its remaining reads use the primary
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *database_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
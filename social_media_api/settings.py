@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os  # This imports the os module
+from social_media_api.database import sqlite_database
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'notifications.apps.NotificationsConfig',
     'messaging.apps.MessagingConfig',
+    'uploads.apps.UploadsConfig',
     'django_filters',
     'rest_framework_simplejwt',
     'drf_yasg',
@@ -51,12 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social_media_api.metrics.MetricsMiddleware',  # First, so request latency covers every other middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'social_media_api.replicas.ReplicaRoutingMiddleware',  # After the session, to know who is reading
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -85,13 +89,26 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite connection profile: 'default' (Django's defaults) or 'production' (WAL journal, memory-mapped reads,
+# busy timeout and persistent connections, see social_media_api/database.py)
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3', SQLITE_PROFILE),
 }
 
+# Read replicas: SQLITE_REPLICAS lists SQLite files kept in sync with the database (e.g. by Litestream or LiteFS),
+# separated by commas. They become the aliases replica1, replica2, ... (see social_media_api/replicas.py)
+for index, replica_path in enumerate(filter(None, os.environ.get('SQLITE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = sqlite_database(replica_path.strip(), SQLITE_PROFILE)
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['social_media_api.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5  # Seconds a user's reads stay on the primary after they write, covering the replication lag
+REPLICA_CACHE_ALIAS = 'default'  # Cache alias holding those pins; must be shared by all workers in production
+
+# Test runner adding replica test databases when SQLITE_REPLICAS is not set, so the router is always tested
+TEST_RUNNER = 'social_media_api.test_runner.ReplicaTestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +154,14 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded files are stored once per distinct content, under names derived from their SHA-256
+STORAGES = {
+    'default': {'BACKEND': 'uploads.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+CONTENT_STORAGE_DIR = 'blobs'  # Directory of MEDIA_ROOT holding the content-addressed files
+MEDIA_BLOB_GC_GRACE = 60 * 60  # Seconds an unreferenced blob is kept, so files saved by running requests are not collected
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -146,7 +171,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'social_media_api.authentication.BatchJWTAuthentication',  # JWTAuthentication, once per batch of requests
     )
 }
 
@@ -166,4 +191,81 @@ SWAGGER_SETTINGS = {
 }
 
 # Allow requests from any origin 
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Home timeline (feed) settings
+TIMELINE_FANOUT_THRESHOLD = 10000  # Authors with this many followers are merged into feeds at read time instead of fanned out
+TIMELINE_BACKFILL_LIMIT = 200  # Number of recent posts copied into a timeline when following someone
+TIMELINE_BATCH_SIZE = 1000  # Number of timeline rows inserted per query
+
+# Cache used for rendered feed pages and the feed versions (a shared backend such as the file-based cache
+# or Redis lets every process reuse the pages)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'social-media-api',
+    }
+}
+FEED_CACHE_ALIAS = 'default'  # Cache alias holding feed pages
+FEED_CACHE_TIMEOUT = 60  # Seconds a feed page is kept; bounds how stale other users' like and comment counts can get
+
+# Bulk creation of posts and comments (POST /posts/posts_all/bulk/ and /posts/comments_all/bulk/)
+BULK_CREATE_MAX_ITEMS = 1000  # Maximum number of items per request
+BULK_CREATE_BATCH_SIZE = 500  # Rows inserted per query
+
+# Batch requests (POST /batch/)
+BATCH_MAX_REQUESTS = 20  # Maximum number of requests per batch
+BATCH_MAX_WORKERS = 4  # Threads running GET requests concurrently when a batch asks for "parallel"
+
+# Resized, metadata-free WebP and JPEG variants of uploaded images
+IMAGE_VARIANT_WIDTHS = [160, 480, 1080]  # Pixels; images are never enlarged
+IMAGE_VARIANT_FORMATS = ['webp', 'jpeg']
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_GENERATOR = 'process'  # 'process' (worker process pool) or 'sync' (in the request that uploaded the image)
+IMAGE_VARIANT_WORKERS = 2  # Processes in the pool
+
+# Resumable chunked uploads (POST /uploads/)
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'chunked_uploads'  # Where received bytes are kept until the upload is attached (not served)
+CHUNKED_UPLOAD_MAX_SIZE = 50 * 1024 * 1024  # Bytes per file
+CHUNKED_UPLOAD_MAX_CHUNK = 8 * 1024 * 1024  # Bytes per chunk
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60  # Seconds of inactivity before purge_chunked_uploads deletes an upload
+CHUNKED_UPLOAD_CLAIM_TIMEOUT = 10 * 60  # Seconds after which a chunk still being received is presumed abandoned and may be sent again
+UPLOAD_MAX_IMAGE_PIXELS = 40_000_000  # Larger images are rejected before being decoded
+
+# Number of rows read from the database per query when streaming a user's data export
+EXPORT_CHUNK_SIZE = 2000
+
+# Number of latest comments embedded in each post of a list or feed page
+POST_SUMMARY_COMMENT_LIMIT = 3
+
+# Notification grouping settings
+NOTIFICATION_COALESCE_WINDOW = 6 * 60 * 60  # Seconds during which repeated actions on a target update one unread notification
+NOTIFICATION_RECENT_ACTORS = 5  # Number of recent actors kept on a grouped notification
+
+# Notification dispatch settings
+NOTIFICATION_DISPATCHER = 'thread'  # 'thread' (in-process background worker), 'outbox' (process_notifications command) or 'sync'
+NOTIFICATION_BATCH_SIZE = 500  # Maximum number of notifications written per batch by the thread worker
+NOTIFICATION_FLUSH_INTERVAL = 0.5  # Seconds the thread worker waits to fill a batch
+
+# Metrics settings (Prometheus text format served at /metrics/)
+METRICS_DIR = os.environ.get('METRICS_DIR') or None  # Local directory each worker process writes its metrics to, to be aggregated; unset for this process' metrics only
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token the scraper sends; without it only staff users can read the metrics
+METRICS_FLUSH_INTERVAL = 5  # Seconds between writes of a process' metrics file
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Request latency histogram buckets, in seconds
+
+# Real-time event stream settings (served by the ASGI application)
+REALTIME_STREAM_PATH = '/events/stream/'  # Path of the Server-Sent Events stream
+REALTIME_PUBSUB_BACKEND = 'social_media_api.realtime.InMemoryPubSub'  # Pub/sub backend fanning events out to connections
+REALTIME_QUEUE_SIZE = 100  # Events buffered per connection before the oldest are dropped and the client is told to resync
+REALTIME_HEARTBEAT_INTERVAL = 15  # Seconds between keep-alive comments on idle streams
+REALTIME_RETRY_MS = 3000  # Milliseconds clients wait before reconnecting
+
+# Related rows loaded along with each notification target type, so serializing a page of notifications
+# takes one query per target type
+NOTIFICATION_TARGET_SELECT_RELATED = {
+    'posts.Post': [],
+    'posts.Comment': ['post', 'author'],
+    'posts.Like': ['user', 'post'],
+    'messaging.Message': ['sender', 'receiver'],
+    'users.CustomUser': [],
+}
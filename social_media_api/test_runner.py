@@ -0,0 +1,17 @@
+import copy
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+
+# Replica aliases given to the tests when SQLITE_REPLICAS configures none
+TEST_REPLICAS = ['replica1', 'replica2']
+
+# Test runner adding the TEST_REPLICAS aliases, so the read replica router is tested on every run. Each alias is
+# a copy of the primary with its own test database, and DATABASE_REPLICAS is left as it is: reads only go to them
+# in the tests that override DATABASE_REPLICAS (see social_media_api/tests.py).
+class ReplicaTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        primary = connections.settings[DEFAULT_DB_ALIAS]
+        for alias in TEST_REPLICAS:
+            if alias not in connections.settings:
+                connections.settings[alias] = {**copy.deepcopy(primary), 'TEST': {**primary['TEST'], 'NAME': None, 'MIRROR': None}}
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from posts.models import Post
+from .batch import subrequest_handler
+from .metrics import collect, get_registry
+from .realtime import EventStreamApp, publish_to_user
+from .replicas import check_replica_cache, read_from_replicas, use_primary
+from .test_runner import TEST_REPLICAS
+
+User = get_user_model()  # Custom user model
+
+# The replicas configured with SQLITE_REPLICAS, or those the test runner adds
+REPLICAS = settings.DATABASE_REPLICAS or TEST_REPLICAS
+
+# Read replica routing. Each replica gets its own test database and nothing replicates, so a row written to the
+# primary only is found by requests reading the primary: that tells which database served a request.
+@skipUnless(all(alias in connections.settings for alias in REPLICAS), "Run with the project's test runner to test the read replica router")
+@override_settings(NOTIFICATION_DISPATCHER='sync', IMAGE_VARIANT_GENERATOR='sync', DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterTest(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        caches[settings.REPLICA_CACHE_ALIAS].clear()
+        # Users are "replicated": they exist in every database
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        for alias in settings.DATABASE_REPLICAS:
+            for user in (self.author, self.reader):
+                User.objects.using(alias).create(pk=user.pk, username=user.username, email=user.email, password=user.password)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    # A post written to the primary only, as if the replicas had not caught up yet
+    def unreplicated_post(self):
+        return Post.objects.create(author=self.author, title='Not replicated', content='Only on the primary')
+
+    def test_read_only_requests_read_a_replica(self):
+        post = self.unreplicated_post()
+        response = self.client_for(self.reader).get(f'/posts/posts_all/{post.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_writing_requests_read_the_primary(self):
+        post = self.unreplicated_post()
+        response = self.client_for(self.reader).post(f'/posts/{post.pk}/like/')
+        self.assertEqual(response.status_code, 201)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        client = self.client_for(self.author)
+        response = client.post('/posts/posts_all/', {'title': 'Fresh post', 'content': 'Just written'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        url = f"/posts/posts_all/{response.data['id']}/"
+
+        # The writer reads their own write, others read a replica
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(self.client_for(self.reader).get(url).status_code, 404)
+
+        # Once the window has passed, the writer reads a replica again
+        later = time.time() + settings.REPLICA_PIN_SECONDS + 1
+        with mock.patch('social_media_api.replicas.time.time', return_value=later):
+            self.assertEqual(client.get(url).status_code, 404)
+
+    def test_batched_requests_are_routed_like_requests(self):
+        post = self.unreplicated_post()
+        response = self.client_for(self.reader).post('/batch/', {'requests': [
+            {'path': f'/posts/posts_all/{post.pk}/'},
+            {'method': 'POST', 'path': f'/posts/{post.pk}/like/'},
+            {'path': f'/posts/posts_all/{post.pk}/'},  # Reads its write
+        ]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['responses']], [404, 201, 200])
+
+    def test_queries_outside_requests_use_the_primary_unless_asked(self):
+        post = self.unreplicated_post()
+        self.assertTrue(Post.objects.filter(pk=post.pk).exists())
+        with read_from_replicas():
+            self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+            with use_primary():
+                self.assertTrue(Post.objects.filter(pk=post.pk).exists())
+
+    def test_reads_are_spread_over_the_replicas(self):
+        served = set()
+        for _ in range(50):
+            with read_from_replicas():
+                served.add(Post.objects.all().db)
+        self.assertEqual(served, set(settings.DATABASE_REPLICAS))
+
+class ReplicaCacheCheckTest(SimpleTestCase):
+    @override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_CACHE_ALIAS='default')
+    def test_pins_in_a_per_process_cache_are_reported(self):
+        self.assertEqual([warning.id for warning in check_replica_cache(None)], ['replicas.W001'])
+
+    @override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_CACHE_ALIAS='shared', CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.gettempdir()},
+    })
+    def test_shared_caches_and_no_replicas_pass(self):
+        self.assertEqual(check_replica_cache(None), [])
+        with override_settings(DATABASE_REPLICAS=[], REPLICA_CACHE_ALIAS='default'):
+            self.assertEqual(check_replica_cache(None), [])
+
+class MetricsFilesTest(SimpleTestCase):
+    def write_metrics(self, directory, pid, value):
+        with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as file:
+            json.dump({'counters': [['test_events_total', [], value]]}, file)
+
+    def test_files_of_exited_workers_are_deleted(self):
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.write_metrics(directory, os.getppid(), 3)  # A running worker
+            self.write_metrics(directory, exited.pid, 5)
+
+            total = collect()
+            self.assertEqual(total.counters[('test_events_total', ())], 3)
+            self.assertFalse(os.path.exists(os.path.join(directory, f'metrics-{exited.pid}.json')))
+            self.assertTrue(os.path.exists(os.path.join(directory, f'metrics-{os.getpid()}.json')))
+
+class BatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def batch(self, requests, **options):
+        return self.client.post('/batch/', {'requests': requests, **options}, format='json')
+
+    def test_requests_run_in_order(self):
+        response = self.batch([
+            {'method': 'POST', 'path': '/posts/posts_all/', 'body': {'title': 'First', 'content': 'Written first'}},
+            {'path': '/posts/posts_all/?search=First'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        created, listed = response.data['responses']
+        self.assertEqual(created['status'], 201)
+        self.assertEqual(listed['status'], 200)
+        self.assertEqual([post['id'] for post in listed['body']['results']], [created['body']['id']])
+
+    def test_failed_requests_make_a_partial_response(self):
+        response = self.batch([
+            {'path': '/notifications/unread_count/'},
+            {'path': '/posts/posts_all/999999/'},
+            {'method': 'POST', 'path': '/batch/', 'body': {'requests': [{'path': '/user/profile/'}]}},
+            {'method': 'POST', 'path': '/posts/posts_all/', 'body': {}},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([item['status'] for item in response.data['responses']], [200, 404, 400, 400])
+        self.assertEqual(response.data['responses'][2]['body'], {'detail': 'Batch requests cannot be nested.'})
+
+    def test_requests_run_through_the_middleware(self):
+        view = resolve('/notifications/unread_count/').view_name
+        key = ('http_requests_total', (('method', 'GET'), ('status', 200), ('view', view)))
+        before = get_registry().counters.get(key, 0)
+
+        response = self.batch([{'path': '/notifications/unread_count/'}])
+        self.assertEqual(response.data['responses'][0]['headers']['X-Frame-Options'], 'DENY')
+        self.assertEqual(get_registry().counters.get(key, 0), before + 1)
+
+    def test_queries_are_counted_once(self):
+        def counted_queries():
+            return sum(value for (metric, _), value in get_registry().counters.items() if metric == 'http_request_db_queries_total')
+
+        before = counted_queries()
+        with CaptureQueriesContext(connection) as queries:
+            self.batch([{'path': '/notifications/unread_count/'}, {'path': '/user/profile/'}])
+        self.assertEqual(counted_queries() - before, len(queries))
+
+    def test_the_handler_is_built_once(self):
+        handler = subrequest_handler()
+        self.assertIs(subrequest_handler(), handler)
+        with override_settings(MIDDLEWARE=settings.MIDDLEWARE[1:]):
+            self.assertIsNot(subrequest_handler(), handler)
+
+class ParallelBatchTest(TransactionTestCase):
+    def test_reads_run_concurrently_and_keep_their_order(self):
+        user = User.objects.create_user(username='user', email='user@example.com', password='password')
+        posts = [Post.objects.create(author=user, title=f'Post {number}', content='Content') for number in range(6)]
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        response = client.post('/batch/', {'parallel': True, 'requests': [
+            *({'path': f'/posts/posts_all/{post.pk}/'} for post in posts[:3]),
+            {'method': 'DELETE', 'path': f'/posts/posts_all/{posts[3].pk}/'},
+            *({'path': f'/posts/posts_all/{post.pk}/'} for post in posts[3:]),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 207)
+        responses = response.data['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 200, 200, 204, 404, 200, 200])
+        self.assertEqual([item['body']['id'] for item in responses[:3]], [post.pk for post in posts[:3]])
+        self.assertEqual([item['body']['id'] for item in responses[5:]], [post.pk for post in posts[4:]])
+
+# A connection to the event stream, driven from the test: the client's disconnect is sent through receive, and
+# the bodies the app sends are collected
+class StreamConnection:
+    def __init__(self, user_id):
+        self.user = mock.Mock(pk=user_id)
+        self.bodies = []
+        self.messages = asyncio.Queue()
+        self.subscribed = asyncio.Event()
+
+    async def receive(self):
+        return await self.messages.get()
+
+    async def send(self, message):
+        if message['type'] == 'http.response.body':
+            self.bodies.append(message['body'])
+            self.subscribed.set()  # The retry line is sent once subscribed
+
+    async def open(self):
+        app = EventStreamApp()
+        app.authenticate = mock.AsyncMock(return_value=self.user)
+        self.task = asyncio.create_task(app({'type': 'http', 'headers': []}, self.receive, self.send))
+        await self.subscribed.wait()
+
+    async def close(self):
+        await self.messages.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, timeout=1)
+
+    def events(self):
+        return [line.split(': ', 1)[1] for body in self.bodies for line in body.decode().splitlines() if line.startswith(('event: ', 'data: '))]
+
+class EventStreamTest(SimpleTestCase):
+    @override_settings(REALTIME_QUEUE_SIZE=2, REALTIME_HEARTBEAT_INTERVAL=60)
+    async def test_slow_clients_are_told_to_resync(self):
+        connection = StreamConnection(user_id=-1)
+        await connection.open()
+        for number in range(4):
+            publish_to_user(-1, 'message', {'number': number})  # Delivered before the stream reads any
+        await asyncio.sleep(0.05)
+        await connection.close()
+        self.assertEqual(connection.events(), ['resync', '{}', 'message', '{"number": 2}', 'message', '{"number": 3}'])
+
+    @override_settings(REALTIME_HEARTBEAT_INTERVAL=0.01)
+    async def test_idle_streams_get_heartbeats(self):
+        connection = StreamConnection(user_id=-2)
+        await connection.open()
+        await asyncio.sleep(0.05)
+        await connection.close()
+        self.assertIn(b': ping\n\n', connection.bodies)
+
+    @override_settings(REALTIME_QUEUE_SIZE=2, REALTIME_HEARTBEAT_INTERVAL=60)
+    async def test_streams_stop_when_the_client_disconnects_during_a_burst(self):
+        connection = StreamConnection(user_id=-3)
+        await connection.open()
+        await connection.messages.put({'type': 'http.disconnect'})
+        for number in range(10):
+            publish_to_user(-3, 'message', {'number': number})
+        await asyncio.wait_for(connection.task, timeout=1)  # Well before the next heartbeat
@@ -22,6 +22,9 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.conf import settings
 from django.conf.urls.static import static
+from social_media_api.metrics import metrics_view
+from social_media_api.batch import BatchView
+from uploads.views import serve_media
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -40,6 +43,9 @@ urlpatterns = [
     path('posts/', include("posts.urls")),
     path('notifications/', include("notifications.urls")),
     path('messaging/', include('messaging.urls')),
+    path('uploads/', include('uploads.urls')),
+    path('batch/', BatchView.as_view(), name='batch'),  # Several API requests in one round trip
+    path('metrics/', metrics_view, name='metrics'),  # Prometheus metrics (needs METRICS_TOKEN or a staff user)
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -47,4 +53,4 @@ urlpatterns = [
 
 # Adding media file serving in development mode
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,24 @@
+from django.contrib import admin
+from .models import ImageVariant, ChunkedUpload
+
+# Define the admin interface for the ImageVariant model
+class ImageVariantAdmin(admin.ModelAdmin):
+    # Specify the fields to display in the list view of image variants
+    list_display = ('source', 'format', 'width', 'height', 'size', 'created_at')
+    # Add a filter on the image format
+    list_filter = ('format',)
+    # Enable search by original image name
+    search_fields = ('source',)
+
+admin.site.register(ImageVariant, ImageVariantAdmin)
+
+# Define the admin interface for the ChunkedUpload model
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    # Specify the fields to display in the list view of chunked uploads
+    list_display = ('filename', 'user', 'offset', 'size', 'status', 'updated_at')
+    # Add a filter on the upload status
+    list_filter = ('status',)
+    # Avoid loading every user into the change form's select box
+    raw_id_fields = ('user',)
+
+admin.site.register(ChunkedUpload, ChunkedUploadAdmin)
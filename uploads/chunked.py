@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+import warnings
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+from .models import ChunkedUpload
+
+# Bytes read from the request and written to disk at a time, so memory use does not grow with the chunk size
+BLOCK_SIZE = 64 * 1024
+
+# Image formats accepted for uploads (as reported by Pillow)
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+def chunked_upload_dir():
+    return getattr(settings, 'CHUNKED_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'chunked_uploads'))
+
+def chunked_upload_max_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+
+def chunked_upload_max_chunk():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK', 8 * 1024 * 1024)
+
+def chunked_upload_expiry():
+    return timedelta(seconds=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 60 * 60))
+
+def chunked_upload_claim_timeout():
+    return timedelta(seconds=getattr(settings, 'CHUNKED_UPLOAD_CLAIM_TIMEOUT', 10 * 60))
+
+def upload_max_image_pixels():
+    return getattr(settings, 'UPLOAD_MAX_IMAGE_PIXELS', 40_000_000)
+
+# Path of the part file holding the bytes received for an upload
+def part_path(upload):
+    return os.path.join(chunked_upload_dir(), f'{upload.pk}.part')
+
+# Start an upload with an empty part file
+def start_upload(user, filename, size, sha256=''):
+    upload = ChunkedUpload.objects.create(user=user, filename=os.path.basename(filename), size=size, sha256=sha256.lower())
+    os.makedirs(chunked_upload_dir(), exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+# Parse a "Content-Range: bytes <first>-<last>/<total>" header into (first, last) byte positions
+def parse_content_range(header, upload):
+    match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', (header or '').strip())
+    if not match:
+        raise ValidationError({"message": "Send the chunk's position in a 'Content-Range: bytes <first>-<last>/<total>' header."})
+    first, last = int(match[1]), int(match[2])
+    if last < first or last >= upload.size or match[3] not in ('*', str(upload.size)):
+        raise ValidationError({"message": f"The range does not fit in the upload's {upload.size} bytes."})
+    if last - first + 1 > chunked_upload_max_chunk():
+        raise ValidationError({"message": f"Chunks are limited to {chunked_upload_max_chunk()} bytes."})
+    return first, last
+
+# Claim an upload to receive the chunk starting at first, in a single conditional update: only one chunk is
+# received at a time, and only from the upload's offset. A claim left by a request that died is taken over once
+# older than CHUNKED_UPLOAD_CLAIM_TIMEOUT. Returns the claimed rows, or None when the upload is elsewhere or busy.
+def claim_upload(upload, first):
+    claimed_at = timezone.now()
+    free = Q(status='uploading') | Q(status='receiving', updated_at__lt=claimed_at - chunked_upload_claim_timeout())
+    if not ChunkedUpload.objects.filter(free, pk=upload.pk, offset=first).update(status='receiving', updated_at=claimed_at):
+        return None
+    return ChunkedUpload.objects.filter(pk=upload.pk, status='receiving', updated_at=claimed_at)
+
+# Stream a chunk from the request straight into the part file at its position, block by block, while holding the
+# upload's claim. The chunk only counts once its length and optional SHA-256 (hex) match; otherwise the part file
+# is cut back to where the chunk started and the claim released. Returns False when the upload could not be claimed.
+def write_chunk(upload, stream, first, last, sha256=None):
+    claim = claim_upload(upload, first)
+    if claim is None:
+        return False
+
+    length = last - first + 1
+    digest = hashlib.sha256()
+    received = 0
+    try:
+        with open(part_path(upload), 'r+b') as part:
+            try:
+                part.seek(first)
+                while received < length:
+                    block = stream.read(min(BLOCK_SIZE, length - received))
+                    if not block:
+                        break
+                    digest.update(block)
+                    part.write(block)
+                    received += len(block)
+                if received != length:
+                    raise ValidationError({"message": f"Expected {length} bytes, received {received}."})
+                if sha256 and digest.hexdigest() != sha256.lower():
+                    raise ValidationError({"message": "The chunk's SHA-256 does not match; send it again."})
+            except BaseException:
+                part.truncate(first)
+                raise
+    except BaseException:
+        claim.update(status='uploading')
+        raise
+
+    # Move the offset past the chunk and release the claim, unless it was taken over in the meantime
+    return claim.update(status='uploading', offset=last + 1, updated_at=timezone.now()) == 1
+
+# Check that a file is an image Pillow can read, of an allowed format and not too big to decode. The image
+# header is enough for the size: pixels are never decoded, so decompression bombs are rejected before they expand.
+def inspect_image(path):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            with Image.open(path) as image:
+                if image.format not in ALLOWED_FORMATS:
+                    raise ValidationError({"message": f"Unsupported image format {image.format}."})
+                width, height = image.size
+                if width * height > upload_max_image_pixels():
+                    raise ValidationError({"message": f"Images are limited to {upload_max_image_pixels()} pixels."})
+                image.verify()
+        except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+            raise ValidationError({"message": "The image is too large to process."})
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            raise ValidationError({"message": "The file is not a valid image."})
+    return width, height
+
+# Check the fully received upload (checksum and image) and mark it complete, ready to be attached
+def complete_upload(upload):
+    if upload.status == 'complete':
+        return upload
+    if upload.offset != upload.size:
+        raise ValidationError({"message": f"The upload is incomplete: {upload.offset} of {upload.size} bytes received."})
+
+    if upload.sha256:
+        digest = hashlib.sha256()
+        with open(part_path(upload), 'rb') as part:
+            for block in iter(lambda: part.read(BLOCK_SIZE), b''):
+                digest.update(block)
+        if digest.hexdigest() != upload.sha256:
+            raise ValidationError({"message": "The file's SHA-256 does not match the one given when the upload started."})
+
+    upload.width, upload.height = inspect_image(part_path(upload))
+    upload.status = 'complete'
+    upload.save(update_fields=['width', 'height', 'status', 'updated_at'])
+    return upload
+
+# The completed upload as a file to assign to an image field; the field copies it into the media storage on save
+def upload_file(upload):
+    return File(open(part_path(upload), 'rb'), name=upload.filename)
+
+# Delete an upload and its part file (once attached, cancelled or expired)
+def discard_upload(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+# Delete the uploads not attached within CHUNKED_UPLOAD_EXPIRY of their last activity, returning how many
+def purge_expired_uploads():
+    expired = ChunkedUpload.objects.filter(updated_at__lt=timezone.now() - chunked_upload_expiry())
+    count = 0
+    for upload in expired.iterator():
+        discard_upload(upload)
+        count += 1
+    return count
@@ -0,0 +1,80 @@
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# Image processing only: this module runs in the variant worker processes, so it must not import Django.
+
+# Pillow format name and encoder options of each variant format
+ENCODERS = {
+    'webp': ('WEBP', {'method': 4}),
+    'jpeg': ('JPEG', {'optimize': True, 'progressive': True}),
+}
+
+# Prepare an image for an encoder: JPEG has no alpha channel, so transparent images are flattened on white
+def _for_format(image, fmt):
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    if fmt == 'jpeg':
+        if not has_alpha:
+            return image.convert('RGB') if image.mode != 'RGB' else image
+        rgba = image.convert('RGBA')
+        flattened = Image.new('RGB', rgba.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.getchannel('A'))
+        return flattened
+    if has_alpha:
+        return image.convert('RGBA') if image.mode != 'RGBA' else image
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+# Render the variants of an image, given as a file path or an open file: one per width and format, never wider
+# than the original. Returns (width, height, format, bytes) tuples. The camera orientation is applied to the
+# pixels, and no metadata (EXIF, GPS position, camera details, comments) is written to the variants.
+def render_variants(file, widths, formats, quality=80):
+    with Image.open(file) as source:
+        source.seek(0)  # First frame of animated images
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    variants = []
+    for width in sorted({min(width, image.width) for width in widths}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            name, options = ENCODERS[fmt]
+            buffer = BytesIO()
+            _for_format(resized, fmt).save(buffer, name, quality=quality, **options)
+            variants.append((width, height, fmt, buffer.getvalue()))
+    return variants
+
+# Image information keys holding metadata that may identify a person or place: EXIF (GPS position, camera serial
+# number, time taken), XMP, IPTC and comments. The ICC color profile is kept, as it changes how colors render.
+PRIVATE_INFO_KEYS = {'exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop', 'iptc'}
+
+# Formats whose metadata is stripped from stored originals (GIF carries no EXIF)
+STRIPPED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+# EXIF tag of the camera orientation
+ORIENTATION = 0x0112
+
+# Re-encode an image without its metadata, given as a file path or an open file. Returns the new bytes, or None
+# when the image has no such metadata (or is animated) and can be stored as it is. The camera orientation is
+# applied to the pixels, since the EXIF tag carrying it is removed. JPEG images that need no rotation keep their
+# quantization tables, so re-encoding them loses next to nothing.
+def strip_metadata(file):
+    with Image.open(file) as image:
+        if image.format not in STRIPPED_FORMATS or getattr(image, 'n_frames', 1) > 1:
+            return None
+        exif = image.getexif()
+        text = getattr(image, 'text', None) if image.format == 'PNG' else None
+        if not exif and not text and not PRIVATE_INFO_KEYS & image.info.keys():
+            return None
+
+        options = {key: image.info[key] for key in ('icc_profile', 'dpi', 'transparency') if key in image.info}
+        buffer = BytesIO()
+        if image.format == 'JPEG':
+            if exif.get(ORIENTATION, 1) == 1:
+                image.save(buffer, 'JPEG', quality='keep', comment=b'', **options)
+            else:
+                ImageOps.exif_transpose(image).save(buffer, 'JPEG', quality=95, comment=b'', **options)
+        elif image.format == 'WEBP':
+            ImageOps.exif_transpose(image).save(buffer, 'WEBP', quality=90, **options)
+        else:
+            ImageOps.exif_transpose(image).save(buffer, 'PNG', **options)
+        return buffer.getvalue()
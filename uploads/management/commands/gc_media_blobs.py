@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from uploads.storage import collect_blobs
+
+# Management command to recount the references to content-addressed media files and delete unreferenced ones
+class Command(BaseCommand):
+    help = "Recount media blob references and delete the blobs no longer referenced by any file field."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted without deleting anything")
+
+    def handle(self, *args, **options):
+        recounted, deleted, freed = collect_blobs(dry_run=options['dry_run'])
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"Recounted {recounted} blobs. {verb} {deleted} unreferenced blobs ({freed} bytes)."))
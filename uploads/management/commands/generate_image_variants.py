@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from uploads.models import ImageVariant
+from uploads.variants import generate_variants, referenced_images
+
+# Management command to generate the variants of images uploaded before the pipeline existed (or whose
+# generation failed), and to delete the variants of images that are no longer used
+class Command(BaseCommand):
+    help = "Generate missing image variants and delete the variants of images no longer referenced."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-only', action='store_true', help="Only delete unreferenced variants")
+
+    def handle(self, *args, **options):
+        referenced = referenced_images()
+        existing = set(ImageVariant.objects.values_list('source', flat=True).distinct())
+
+        generated = 0
+        if not options['prune_only']:
+            for source in sorted(referenced - existing):
+                generated += bool(generate_variants(source))
+
+        pruned = 0
+        for variant in ImageVariant.objects.filter(source__in=existing - referenced).iterator():
+            variant.file.delete(save=False)
+            variant.delete()
+            pruned += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Generated variants of {generated} images, deleted {pruned} unused variants."))
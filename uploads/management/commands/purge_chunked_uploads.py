@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from uploads.chunked import purge_expired_uploads
+
+# Management command to delete chunked uploads that were abandoned or never attached
+class Command(BaseCommand):
+    help = "Delete chunked uploads inactive for longer than CHUNKED_UPLOAD_EXPIRY, with their received bytes."
+
+    def handle(self, *args, **options):
+        purged = purge_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {purged} expired uploads."))
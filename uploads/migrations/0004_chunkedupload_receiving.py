@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0003_storedblob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chunkedupload',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('receiving', 'Receiving a chunk'), ('complete', 'Complete')], default='uploading', max_length=9),
+        ),
+    ]
@@ -0,0 +1,60 @@
+import uuid
+from django.db import models
+from django.contrib.auth import get_user_model
+
+# Create your models here.
+User = get_user_model()
+
+    # ImageVariant is a resized, metadata-free copy of an uploaded image (post media, profile picture, cover photo
+    # or message image), generated in the background after the upload
+class ImageVariant(models.Model):
+    FORMAT_CHOICES = [('webp', 'WebP'), ('jpeg', 'JPEG')]
+
+    source = models.CharField(max_length=255, db_index=True)  # Storage name of the original image
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(upload_to="image_variants/", max_length=255)
+    size = models.PositiveIntegerField()  # Bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['source', 'format', 'width']
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'format', 'width'], name='unique_image_variant'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.format}, {self.width}w)'
+
+    # ChunkedUpload tracks an image sent in byte ranges, so an interrupted upload resumes where it stopped.
+    # The bytes received so far are kept in a part file outside the media storage until the upload is attached.
+class ChunkedUpload(models.Model):
+    STATUS_CHOICES = [('uploading', 'Uploading'), ('receiving', 'Receiving a chunk'), ('complete', 'Complete')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # Unguessable, as it appears in URLs
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chunked_uploads")
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()  # Total bytes announced when the upload started
+    sha256 = models.CharField(max_length=64, blank=True)  # Optional checksum of the whole file, checked on completion
+    offset = models.PositiveBigIntegerField(default=0)  # Bytes received so far
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='uploading')
+    width = models.PositiveIntegerField(null=True, blank=True)  # Set once the completed image is verified
+    height = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size} bytes) by {self.user}'
+
+    # StoredBlob tracks a file of the content-addressed media storage: one row per distinct content, with the
+    # number of file fields referencing it. Blobs no longer referenced are deleted by the gc_media_blobs command.
+class StoredBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)  # Storage name, derived from the content's SHA-256
+    size = models.PositiveBigIntegerField()  # Bytes
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Last time the blob was saved or released
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount} references)'
@@ -0,0 +1,112 @@
+import os
+from django.db.models import Manager
+from rest_framework import serializers
+from .chunked import chunked_upload_max_size, discard_upload, part_path, upload_file
+from .models import ChunkedUpload
+from .variants import build_srcset, variants_by_source
+
+# Read-only field listing the generated variants of an image field as srcset values, one per format:
+#     {"webp": "https://host/media/image_variants/a_160w.webp 160w, ...", "jpeg": "..."}
+# None until the variants have been generated. In a list, the variants of every item are loaded in one query.
+class ImageVariantsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        loaded = self.context.setdefault('image_variants', {})
+        if value.name not in loaded:
+            loaded.update(variants_by_source(self.list_sources() | {value.name}))
+
+        request = self.context.get('request')
+        return {fmt: build_srcset(variants, request) for fmt, variants in loaded[value.name].items()} or None
+
+    # Images of the same field in every item of the list being serialized, if this field's serializer is the list's
+    # child or nested in it (e.g. the last message of each conversation in an inbox page)
+    def list_sources(self):
+        root = self.root
+        if not isinstance(root, serializers.ListSerializer) or root.instance is None or isinstance(root.instance, Manager):
+            return set()
+
+        # Attributes leading from a list item to the object this field belongs to
+        path, serializer = [], self.parent
+        while serializer is not root.child:
+            if serializer is None or isinstance(serializer, serializers.ListSerializer):
+                return set()
+            path = serializer.source_attrs + path
+            serializer = serializer.parent
+
+        files = []
+        for instance in root.instance:
+            for attr in path:
+                instance = getattr(instance, attr, None)
+            if instance is not None:
+                files.append(self.get_attribute(instance))
+        return {file.name for file in files if file}
+
+# Serializer for starting a chunked upload and reporting its progress
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True, help_text="SHA-256 of the whole file (hex), checked on completion")
+
+    class Meta:
+        model = ChunkedUpload
+        fields = ['id', 'filename', 'size', 'sha256', 'offset', 'status', 'width', 'height', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'offset', 'status', 'width', 'height', 'created_at', 'updated_at']
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("The file is empty.")
+        if value > chunked_upload_max_size():
+            raise serializers.ValidationError(f"Files are limited to {chunked_upload_max_size()} bytes.")
+        return value
+
+# Write-only field taking the id of one of the user's completed chunked uploads, to attach to the image field `target`
+class ChunkedUploadField(serializers.PrimaryKeyRelatedField):
+    def __init__(self, target, **kwargs):
+        self.target = target
+        kwargs.setdefault('write_only', True)
+        kwargs.setdefault('required', False)
+        kwargs.setdefault('help_text', f"Id of a completed chunked upload to use as the {target}")
+        super().__init__(**kwargs)
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return ChunkedUpload.objects.none()
+        return ChunkedUpload.objects.filter(user=request.user, status='complete')
+
+# Serializer mixin attaching the chunked uploads given in ChunkedUploadFields to their image fields: the upload's
+# file replaces the field's value, is copied into the media storage when the instance is saved, and is then discarded.
+# The file is only opened in save(), so a serializer validated but never saved holds no open file.
+class ChunkedUploadsMixin:
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        for name, field in self.fields.items():
+            if not isinstance(field, ChunkedUploadField) or name not in attrs:
+                continue
+            upload = attrs.pop(name)
+            if isinstance(self.parent, serializers.ListSerializer):
+                raise serializers.ValidationError({name: "Uploads cannot be attached in bulk requests."})
+            if attrs.get(field.target):
+                raise serializers.ValidationError({name: f"Send either the {field.target} or an upload id, not both."})
+            if not os.path.exists(part_path(upload)):
+                raise serializers.ValidationError({name: "The upload's file is missing; start the upload again."})
+            self.attached_uploads = getattr(self, 'attached_uploads', []) + [(upload, field.target)]
+        return attrs
+
+    def save(self, **kwargs):
+        attached = getattr(self, 'attached_uploads', [])
+        files = [upload_file(upload) for upload, _ in attached]
+        try:
+            # Set in validated_data, where views look for a new image once saved
+            self.validated_data.update({target: file for (_, target), file in zip(attached, files)})
+            instance = super().save(**kwargs)
+        finally:
+            for file in files:
+                file.close()
+        for upload, _ in attached:
+            discard_upload(upload)
+        self.attached_uploads = []
+        return instance
@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db.models.signals import pre_save
+from PIL import UnidentifiedImageError
+from .imaging import strip_metadata
+from .variants import IMAGE_FIELDS
+
+# Strip the metadata (GPS position, camera details, comments) of images uploaded to an image field before the
+# file is stored, so the original served from the media storage does not leak it either. Runs before the
+# field writes the file, whether it came from a multipart upload or a chunked upload.
+def strip_uploaded_metadata(sender, instance, **kwargs):
+    for model_name, field_name in IMAGE_FIELDS:
+        if sender is not apps.get_model(model_name):
+            continue
+        field_file = getattr(instance, field_name)
+        if not field_file or field_file._committed:
+            continue  # No new file: nothing is about to be stored
+        content = field_file.file
+        content.seek(0)
+        try:
+            stripped = strip_metadata(content)
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            stripped = None  # Not an image Pillow can rewrite; the field's validation already ran
+        content.seek(0)
+        if stripped is not None:
+            field_file.file = ContentFile(stripped, name=field_file.name)
+
+def connect_signals():
+    for model_name in {model_name for model_name, _ in IMAGE_FIELDS}:
+        pre_save.connect(strip_uploaded_metadata, sender=model_name, dispatch_uid=f'strip_uploaded_metadata:{model_name}')
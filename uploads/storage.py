@@ -0,0 +1,150 @@
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Directory of the content storage holding files being written
+TEMP_DIR = 'tmp'
+
+def content_storage_dir():
+    return getattr(settings, 'CONTENT_STORAGE_DIR', 'blobs')
+
+def blob_gc_grace():
+    return timedelta(seconds=getattr(settings, 'MEDIA_BLOB_GC_GRACE', 60 * 60))
+
+# File system storage naming files by the SHA-256 of their content, so identical uploads (a reshared meme, the
+# same avatar, a forwarded image) are stored once whatever field or upload_to directory they were saved for:
+#     blobs/3f/3f8a...c2.jpg
+# A file's name never changes meaning, so its URL can be cached forever. Saving a file that is already stored
+# only counts one more reference to it; deleting one releases a reference but leaves the file for the
+# gc_media_blobs command, which recounts references from the database and deletes unreferenced blobs.
+# Files stored before this backend keep their names and are served as before.
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        # Write the content to a temporary file while hashing it, then rename it to its content's name: a
+        # failed or interrupted write never leaves a truncated file under a name later uploads trust
+        temp_dir = self.path(os.path.join(content_storage_dir(), TEMP_DIR))
+        os.makedirs(temp_dir, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(descriptor, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+                temp.flush()
+                os.fsync(temp.fileno())
+            digest = digest.hexdigest()
+
+            blob_name = f'{content_storage_dir()}/{digest[:2]}/{digest}{os.path.splitext(name)[1].lower()}'
+            blob_path = self.path(blob_name)
+
+            # Count the reference before trusting an existing file: bumping the blob's row makes a concurrent
+            # garbage collection skip it, and a row created anew means the file may have just been purged
+            created = self.retain(blob_name, size)
+            if not created and os.path.exists(blob_path):
+                os.remove(temp_path)  # Already stored
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+                os.replace(temp_path, blob_path)  # Atomic; a concurrent save of the same content writes the same bytes
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return blob_name
+
+    def delete(self, name):
+        if is_blob(name):
+            self.release(name)
+        else:
+            super().delete(name)
+
+    # Count one more reference to a blob; returns whether its row had to be created
+    def retain(self, name, size):
+        from .models import StoredBlob
+
+        if StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, updated_at=timezone.now()):
+            return False
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(name=name, size=size, refcount=1)
+        except IntegrityError:
+            StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, updated_at=timezone.now())
+            return False
+        return True
+
+    # Count one less reference to a blob; the file itself is deleted by the garbage collection
+    def release(self, name):
+        from .models import StoredBlob
+
+        StoredBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1, updated_at=timezone.now())
+
+    # Delete a blob's file for good (garbage collection only)
+    def purge(self, name):
+        super().delete(name)
+
+# Whether a storage name is a content-addressed blob (rather than a file stored before the backend existed)
+def is_blob(name):
+    return bool(name) and name.startswith(content_storage_dir() + '/')
+
+# Count the references to every blob from the file fields of all models
+def count_blob_references():
+    references = Counter()
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                names = model._default_manager.filter(**{f'{field.name}__startswith': content_storage_dir() + '/'})
+                references.update(names.values_list(field.name, flat=True).iterator())
+    return references
+
+# Delete the temporary files left by writes interrupted longer than MEDIA_BLOB_GC_GRACE ago (e.g. by a crash)
+def purge_temp_files(cutoff, dry_run=False):
+    temp_dir = default_storage.path(os.path.join(content_storage_dir(), TEMP_DIR))
+    if not os.path.isdir(temp_dir):
+        return
+    for entry in os.scandir(temp_dir):
+        if entry.is_file() and entry.stat().st_mtime < cutoff.timestamp() and not dry_run:
+            os.remove(entry.path)
+
+# Recount the references of every blob from the database (rows deleted or files replaced never release theirs),
+# then delete the blobs left unreferenced for longer than MEDIA_BLOB_GC_GRACE.
+# Returns (blobs recounted, blobs deleted, bytes freed).
+def collect_blobs(dry_run=False):
+    from .models import StoredBlob
+
+    references = count_blob_references()
+    cutoff = timezone.now() - blob_gc_grace()
+    purge_temp_files(cutoff, dry_run)
+    recounted = deleted = freed = 0
+    for blob in StoredBlob.objects.iterator():
+        refcount = references.get(blob.name, 0)
+        if refcount == 0 and blob.updated_at < cutoff:
+            # Skip the blob if it was saved again since it was read
+            if dry_run or StoredBlob.objects.filter(pk=blob.pk, updated_at=blob.updated_at).delete()[0]:
+                # Leave the file to a save that recreated the row meanwhile
+                if not dry_run and not StoredBlob.objects.filter(name=blob.name).exists():
+                    default_storage.purge(blob.name)
+                deleted += 1
+                freed += blob.size
+        elif refcount != blob.refcount:
+            if not dry_run:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=refcount)
+            recounted += 1
+    return recounted, deleted, freed
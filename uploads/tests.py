@@ -0,0 +1,226 @@
+import hashlib
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+from posts.models import Post
+from posts.serializers import PostSerializer
+from posts.tests import MediaTestCase, png_file
+from .chunked import claim_upload, part_path, upload_file
+from .imaging import ORIENTATION, strip_metadata
+from .models import ChunkedUpload, StoredBlob
+from .storage import TEMP_DIR, ContentAddressedStorage, collect_blobs, content_storage_dir
+
+User = get_user_model()  # Custom user model
+
+# A JPEG photo carrying a GPS position, a camera model and a comment, taken with the camera turned sideways
+def gps_jpeg(size=(64, 32)):
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6  # Rotate 90° clockwise to display
+    exif[0x0110] = 'Camera model'
+    exif.get_ifd(0x8825)[2] = (51.0, 30.0, 0.0)  # GPS latitude
+    data = io.BytesIO()
+    Image.new('RGB', size, (10, 120, 60)).save(data, 'JPEG', exif=exif, comment=b'At home')
+    return data.getvalue()
+
+class MetadataTest(MediaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='password')
+
+    def test_uploaded_originals_are_stored_without_metadata(self):
+        response = self.client_for(self.user).post(
+            '/posts/posts_all/',
+            {'title': 'Photo', 'content': 'Where I live', 'media': SimpleUploadedFile('photo.jpg', gps_jpeg(), content_type='image/jpeg')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 201)
+
+        post = Post.objects.get(pk=response.data['id'])
+        with post.media.open('rb') as file, Image.open(file) as stored:
+            self.assertEqual(dict(stored.getexif()), {})
+            self.assertNotIn('comment', stored.info)
+            self.assertEqual(stored.size, (32, 64))  # The orientation was applied to the pixels
+
+    def test_images_without_metadata_are_stored_unchanged(self):
+        upload = png_file()
+        original = upload.read()
+        upload.seek(0)
+        post = Post.objects.create(author=self.user, title='Plain', content='No metadata', media=upload)
+        with post.media.open('rb') as file:
+            self.assertEqual(file.read(), original)
+
+    def test_strip_metadata(self):
+        self.assertIsNone(strip_metadata(png_file()))
+        stripped = strip_metadata(io.BytesIO(gps_jpeg()))
+        self.assertNotIn(b'At home', stripped)
+        self.assertNotIn(b'Camera model', stripped)
+
+# Content that fails to be read halfway through, like an upload whose connection drops
+class BrokenContent(ContentFile):
+    def chunks(self, chunk_size=None):
+        yield b'first half'
+        raise OSError("Connection reset")
+
+class ContentAddressedStorageTest(MediaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='password')
+
+    def blob(self, name):
+        return StoredBlob.objects.get(name=name)
+
+    def test_identical_content_is_stored_once(self):
+        first = default_storage.save('posts_media/a.png', ContentFile(b'same bytes'))
+        second = default_storage.save('profile_pics/b.PNG', ContentFile(b'same bytes'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(content_storage_dir() + '/'))
+        self.assertTrue(first.endswith('.png'))
+        self.assertEqual(self.blob(first).refcount, 2)
+        with default_storage.open(first) as file:
+            self.assertEqual(file.read(), b'same bytes')
+
+        other = default_storage.save('posts_media/a.png', ContentFile(b'other bytes'))
+        self.assertNotEqual(other, first)
+        self.assertEqual(self.blob(other).refcount, 1)
+
+    def test_deleting_releases_a_reference(self):
+        name = default_storage.save('a.txt', ContentFile(b'shared'))
+        default_storage.save('b.txt', ContentFile(b'shared'))
+
+        default_storage.delete(name)
+        self.assertEqual(self.blob(name).refcount, 1)
+        default_storage.delete(name)
+        self.assertEqual(self.blob(name).refcount, 0)
+        self.assertTrue(default_storage.exists(name))  # Left for the garbage collection
+        default_storage.delete(name)
+        self.assertEqual(self.blob(name).refcount, 0)
+
+    def test_failed_writes_leave_no_blob(self):
+        with self.assertRaises(OSError):
+            default_storage.save('a.txt', BrokenContent(b''))
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(os.listdir(default_storage.path(os.path.join(content_storage_dir(), TEMP_DIR))), [])
+
+        # The same content saved in full afterwards is stored whole
+        name = default_storage.save('a.txt', ContentFile(b'first half and the rest'))
+        with default_storage.open(name) as file:
+            self.assertEqual(file.read(), b'first half and the rest')
+
+    def test_collect_recounts_and_deletes_unreferenced_blobs(self):
+        post = Post.objects.create(author=self.user, title='Photo', content='A photo', media=png_file())
+        unreferenced = default_storage.save('c.txt', ContentFile(b'no longer used'))
+        StoredBlob.objects.filter(name=post.media.name).update(refcount=5)  # Drifted
+        StoredBlob.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+        recounted, deleted, freed = collect_blobs()
+        self.assertEqual((recounted, deleted, freed), (1, 1, len(b'no longer used')))
+        self.assertEqual(self.blob(post.media.name).refcount, 1)
+        self.assertFalse(default_storage.exists(unreferenced))
+        self.assertTrue(default_storage.exists(post.media.name))
+
+    def test_saving_while_the_blob_is_collected_keeps_the_file(self):
+        name = default_storage.save('a.txt', ContentFile(b'collected'))
+        StoredBlob.objects.update(refcount=0, updated_at=timezone.now() - timedelta(days=1))
+
+        # The garbage collection deletes the unreferenced blob while the same content is being saved again
+        retain = ContentAddressedStorage.retain
+        def collect_then_retain(storage, name, size):
+            collect_blobs()
+            return retain(storage, name, size)
+        with mock.patch.object(ContentAddressedStorage, 'retain', collect_then_retain):
+            self.assertEqual(default_storage.save('b.txt', ContentFile(b'collected')), name)
+
+        self.assertEqual(self.blob(name).refcount, 1)
+        with default_storage.open(name) as file:
+            self.assertEqual(file.read(), b'collected')
+
+class ChunkedUploadTest(MediaTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client = self.client_for(self.user)
+        self.enterContext(override_settings(CHUNKED_UPLOAD_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        self.data = png_file().read()
+        response = self.client.post('/uploads/', {'filename': 'photo.png', 'size': len(self.data)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.upload = ChunkedUpload.objects.get(pk=response.data['id'])
+        self.url = f'/uploads/{self.upload.pk}/'
+
+    def send(self, first, last, sha256=None):
+        headers = {'Content-Range': f'bytes {first}-{last}/{len(self.data)}'}
+        if sha256:
+            headers['X-Chunk-SHA256'] = sha256
+        return self.client.put(self.url, self.data[first:last + 1], content_type='application/octet-stream', headers=headers)
+
+    def received(self):
+        with open(part_path(self.upload), 'rb') as part:
+            return part.read()
+
+    def test_interrupted_uploads_resume_from_the_offset(self):
+        self.assertEqual(self.send(0, 99).data['offset'], 100)
+        self.assertEqual(self.send(0, 99).status_code, 200)  # Sent again after a lost response: acknowledged
+        response = self.send(50, 149)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 100)
+
+        offset = self.client.get(self.url).data['offset']
+        self.assertEqual(self.send(offset, len(self.data) - 1).status_code, 200)
+        self.assertEqual(self.received(), self.data)
+        response = self.client.post(f'/uploads/{self.upload.pk}/complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'complete')
+
+    def test_a_chunk_being_received_blocks_the_same_range(self):
+        claim = claim_upload(self.upload, 0)  # Another request is writing the first chunk
+        response = self.send(0, 99)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 0)
+        self.assertEqual(self.received(), b'')
+
+        claim.update(status='uploading')
+        self.assertEqual(self.send(0, 99).status_code, 200)
+
+    def test_abandoned_claims_are_taken_over(self):
+        claim_upload(self.upload, 0)
+        ChunkedUpload.objects.filter(pk=self.upload.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.send(0, 99).data['offset'], 100)
+
+    def test_a_corrupted_chunk_is_rolled_back(self):
+        self.send(0, 99)
+        response = self.send(100, 199, sha256=hashlib.sha256(b'other bytes').hexdigest())
+        self.assertEqual(response.status_code, 400)
+
+        self.upload.refresh_from_db()
+        self.assertEqual((self.upload.offset, self.upload.status), (100, 'uploading'))
+        self.assertEqual(self.received(), self.data[:100])
+        self.assertEqual(self.send(100, 199, sha256=hashlib.sha256(self.data[100:200]).hexdigest()).status_code, 200)
+
+    def complete(self):
+        self.assertEqual(self.send(0, len(self.data) - 1).status_code, 200)
+        self.assertEqual(self.client.post(f'/uploads/{self.upload.pk}/complete/').status_code, 200)
+        self.upload.refresh_from_db()
+
+    def test_uploads_are_opened_only_when_saved(self):
+        self.complete()
+        serializer = PostSerializer(data={'title': 'Photo', 'content': 'A photo', 'media_upload': self.upload.pk}, context={'request': mock.Mock(user=self.user)})
+        files = []
+        def open_upload(upload):
+            files.append(upload_file(upload))
+            return files[-1]
+        with mock.patch('uploads.serializers.upload_file', side_effect=open_upload):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            self.assertEqual(files, [])  # Validating alone opens no file
+            post = serializer.save(author=self.user)
+
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].closed)
+        self.assertTrue(post.media.name.startswith(content_storage_dir() + '/'))
+        self.assertIn('media', serializer.validated_data)
+        self.assertFalse(ChunkedUpload.objects.filter(pk=self.upload.pk).exists())
+        self.assertFalse(os.path.exists(part_path(self.upload)))
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import StartChunkedUploadView, ChunkedUploadView, CompleteChunkedUploadView
+
+urlpatterns = [
+    path('', StartChunkedUploadView.as_view(), name='chunked-upload-start'),  # URL route for starting a chunked upload
+    path('<uuid:pk>/', ChunkedUploadView.as_view(), name='chunked-upload'),  # URL route for an upload's progress, chunks and cancellation
+    path('<uuid:pk>/complete/', CompleteChunkedUploadView.as_view(), name='chunked-upload-complete'),  # URL route for completing an upload
+]
@@ -0,0 +1,164 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from .imaging import render_variants
+from .models import ImageVariant
+
+logger = logging.getLogger(__name__)
+
+# Image fields whose uploads get variants: (model, field name)
+IMAGE_FIELDS = [
+    ('posts.Post', 'media'),
+    ('users.CustomUser', 'profile_picture'),
+    ('users.CustomUserProfile', 'cover_photo'),
+    ('messaging.Message', 'image'),
+]
+
+def variant_options():
+    return {
+        'widths': getattr(settings, 'IMAGE_VARIANT_WIDTHS', [160, 480, 1080]),
+        'formats': getattr(settings, 'IMAGE_VARIANT_FORMATS', ['webp', 'jpeg']),
+        'quality': getattr(settings, 'IMAGE_VARIANT_QUALITY', 80),
+    }
+
+def image_storage():
+    return ImageVariant._meta.get_field('file').storage
+
+# Store rendered variants of an original image. Variants already stored (e.g. by a concurrent run) are kept.
+def save_variants(source, rendered):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    created = []
+    for width, height, fmt, data in rendered:
+        variant = ImageVariant(source=source, format=fmt, width=width, height=height, size=len(data))
+        variant.file.save(f'{stem}_{width}w.{"jpg" if fmt == "jpeg" else fmt}', ContentFile(data), save=False)
+        try:
+            with transaction.atomic():
+                variant.save()
+        except IntegrityError:
+            variant.file.delete(save=False)
+            continue
+        created.append(variant)
+    return created
+
+# Generate and store the variants of an original image right away, in this process
+def generate_variants(source):
+    if ImageVariant.objects.filter(source=source).exists():
+        return []
+    try:
+        with image_storage().open(source, 'rb') as file:
+            rendered = render_variants(file, **variant_options())
+    except FileNotFoundError:
+        logger.warning("Image %s is missing from storage, no variants generated", source)
+        return []
+    return save_variants(source, rendered)
+
+# Generates variants in the process that uploaded the image (tests, management commands)
+class SyncGenerator:
+    def submit(self, source):
+        try:
+            generate_variants(source)
+        except Exception:
+            logger.exception("Failed to generate variants of %s", source)
+
+# Renders variants in a pool of worker processes, so reading, resizing and encoding never hold up a request
+# worker. The workers only receive the image's file path and return the encoded variants; storing them happens
+# back in this process, on the pool's result thread.
+class ProcessGenerator:
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def get_pool(self):
+        # Start the pool on first use. Workers are spawned rather than forked, so they don't inherit the
+        # request worker's threads and open database connections.
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.pool
+
+    def submit(self, source):
+        if ImageVariant.objects.filter(source=source).exists():
+            return
+        future = self.get_pool().submit(render_variants, image_storage().path(source), **variant_options())
+        future.add_done_callback(lambda future: self.store(source, future))
+
+    def store(self, source, future):
+        try:
+            save_variants(source, future.result())
+        except FileNotFoundError:
+            logger.warning("Image %s is missing from storage, no variants generated", source)
+        except Exception:
+            logger.exception("Failed to generate variants of %s", source)
+        finally:
+            close_old_connections()
+
+GENERATORS = {
+    'sync': SyncGenerator,
+    'process': ProcessGenerator,
+}
+
+_generator = None
+
+# Get the generator selected by the IMAGE_VARIANT_GENERATOR setting
+def get_generator():
+    global _generator
+    name = getattr(settings, 'IMAGE_VARIANT_GENERATOR', 'process')
+    if not isinstance(_generator, GENERATORS[name]):
+        if name == 'process':
+            _generator = ProcessGenerator(workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2))
+        else:
+            _generator = GENERATORS[name]()
+    return _generator
+
+# Queue variant generation for the images just saved in these image fields, once the current transaction commits
+def schedule_variants(*field_files):
+    sources = [field_file.name for field_file in field_files if field_file]
+    for source in sources:
+        transaction.on_commit(lambda source=source: get_generator().submit(source))
+
+# Storage names of every image referenced by an image field
+def referenced_images():
+    names = set()
+    for model_name, field_name in IMAGE_FIELDS:
+        model = apps.get_model(model_name)
+        names.update(model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True}).values_list(field_name, flat=True))
+    return names
+
+# Variants of the given original images, grouped as {source: {format: [variants from narrowest to widest]}}
+def variants_by_source(sources):
+    grouped = {source: {} for source in sources}
+    for variant in ImageVariant.objects.filter(source__in=sources).order_by('source', 'format', 'width'):
+        grouped[variant.source].setdefault(variant.format, []).append(variant)
+    return grouped
+
+# Validators of the variants generated for these images, (count, last id): they change once the variants of an
+# image are generated or pruned, so ETags built from them change too
+def variants_version(*sources):
+    sources = [source for source in sources if source]
+    if not sources:
+        return (0, None)
+    validators = ImageVariant.objects.filter(source__in=sources).aggregate(count=Count('id'), last_id=Max('id'))
+    return (validators['count'], validators['last_id'])
+
+# The same validators as subqueries, for the image in the `field` of the outer query's rows
+def variants_version_subqueries(field):
+    rows = ImageVariant.objects.filter(source=OuterRef(field)).order_by().values('source')
+    return (
+        Subquery(rows.annotate(value=Count('id')).values('value')),
+        Subquery(rows.annotate(value=Max('id')).values('value')),
+    )
+
+# srcset value of a format's variants, e.g. "https://host/media/image_variants/a_160w.webp 160w, ..."
+def build_srcset(variants, request=None):
+    urls = (variant.file.url for variant in variants)
+    if request is not None:
+        urls = (request.build_absolute_uri(url) for url in urls)
+    return ', '.join(f'{url} {variant.width}w' for url, variant in zip(urls, variants))
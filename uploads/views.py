@@ -0,0 +1,105 @@
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import generics, status, views
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .chunked import complete_upload, discard_upload, parse_content_range, start_upload, write_chunk
+from .models import ChunkedUpload
+from .serializers import ChunkedUploadSerializer
+from .storage import is_blob
+
+# View starting a resumable upload of an image, which is then sent in chunks
+class StartChunkedUploadView(generics.CreateAPIView):
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Start a chunked upload",
+        operation_description="Announces an image of `size` bytes (optionally with its SHA-256). Send its bytes in chunks with PUT /uploads/{id}/, complete it with POST /uploads/{id}/complete/, then attach it to a post, message or profile by its id.",
+    )
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = start_upload(self.request.user, data['filename'], data['size'], data.get('sha256', ''))
+
+# View reporting, receiving and cancelling the chunks of an upload
+class ChunkedUploadView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_upload(self, request, pk):
+        return get_object_or_404(ChunkedUpload, pk=pk, user=request.user)
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Get an upload's progress",
+        operation_description="Returns the upload, whose `offset` is the number of bytes received: resume an interrupted upload from there.",
+        responses={200: ChunkedUploadSerializer},
+    )
+    def get(self, request, pk):
+        return Response(ChunkedUploadSerializer(self.get_upload(request, pk)).data, status=status.HTTP_200_OK)
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Send a chunk of an upload",
+        operation_description="The request body is the chunk's raw bytes, starting at the upload's current `offset`. Chunks are received one at a time: a chunk already received is acknowledged without being written again, while another position, or a chunk sent while another is being received, gets a 409 with the offset to continue from.",
+        manual_parameters=[
+            openapi.Parameter('Content-Range', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=True, description="bytes <first>-<last>/<total>"),
+            openapi.Parameter('X-Chunk-SHA256', openapi.IN_HEADER, type=openapi.TYPE_STRING, description="SHA-256 of the chunk (hex)"),
+        ],
+        request_body=openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_BINARY),
+        responses={200: ChunkedUploadSerializer, 409: "The chunk does not start at the upload's offset, or another chunk is being received"},
+    )
+    def put(self, request, pk):
+        upload = self.get_upload(request, pk)
+        if upload.status == 'complete':
+            return Response({"message": "The upload is already complete."}, status=status.HTTP_409_CONFLICT)
+
+        first, last = parse_content_range(request.headers.get('Content-Range'), upload)
+        if last < upload.offset:
+            # Already received (e.g. the response to a previous attempt was lost)
+            return Response(ChunkedUploadSerializer(upload).data, status=status.HTTP_200_OK)
+        if first != upload.offset or not write_chunk(upload, request.stream, first, last, request.headers.get('X-Chunk-SHA256')):
+            upload.refresh_from_db()
+            if upload.status == 'receiving' and upload.offset == first:
+                return Response({"message": "Another chunk of this upload is being received; send this one again once it is done.", "offset": upload.offset}, status=status.HTTP_409_CONFLICT)
+            return Response({"message": f"Send the bytes starting at {upload.offset}.", "offset": upload.offset}, status=status.HTTP_409_CONFLICT)
+
+        upload.refresh_from_db()
+        return Response(ChunkedUploadSerializer(upload).data, status=status.HTTP_200_OK)
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Cancel an upload",
+        operation_description="Deletes the upload and the bytes received.",
+    )
+    def delete(self, request, pk):
+        discard_upload(self.get_upload(request, pk))
+        return Response({"message": "Upload cancelled"}, status=status.HTTP_204_NO_CONTENT)
+
+# View completing an upload once all its bytes were received
+class CompleteChunkedUploadView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Complete an upload",
+        operation_description="Checks the file's SHA-256 (if one was given) and that it is a valid image within the size limits. The completed upload can then be attached, once, with the `media_upload`, `image_upload`, `profile_picture_upload` or `cover_photo_upload` field.",
+        responses={200: ChunkedUploadSerializer},
+    )
+    def post(self, request, pk):
+        upload = get_object_or_404(ChunkedUpload, pk=pk, user=request.user)
+        return Response(ChunkedUploadSerializer(complete_upload(upload)).data, status=status.HTTP_200_OK)
+
+# Serve an uploaded file in development, like django.views.static.serve. Content-addressed files never change,
+# so browsers and proxies may cache them for good.
+def serve_media(request, path, document_root=None, show_indexes=False):
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if response.status_code == 200 and is_blob(path):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
@@ -12,7 +12,7 @@ class CustomUserAdmin(UserAdmin):
     # List display in the admin panel
     list_display = (
         'username', 'email', 'first_name', 'last_name', 
-        'is_staff', 'is_active', 'bio'
+        'is_staff', 'is_active', 'bio', 'follower_count', 'following_count', 'post_count'
     )
     
     # Fields to filter by in the admin panel
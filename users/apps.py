@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.core import checks
+        from social_media_api.replicas import check_replica_cache
+        checks.register(check_replica_cache, checks.Tags.caches)  # Checks the project's replica settings
@@ -0,0 +1,61 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+
+User = get_user_model()  # Custom user model
+
+# Rows of the "followers" relation point from the followed user to the follower
+Follow = User.followers.through
+
+# Atomically add delta to a counter column, never going below zero
+def _adjust(queryset, field, delta):
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+# Update the counters of both users after a follow (delta=1) or an unfollow (delta=-1)
+def adjust_follow_counts(follower, followed, delta):
+    _adjust(User.objects.filter(pk=followed.pk), 'follower_count', delta)
+    _adjust(User.objects.filter(pk=follower.pk), 'following_count', delta)
+
+# Make follower follow followed and count it, returning False if they already did. The relation row is inserted
+# against its unique constraint, so of two concurrent follows only the one that created the row moves the counters.
+def add_follow(follower, followed):
+    try:
+        with transaction.atomic():
+            Follow.objects.create(from_customuser_id=followed.pk, to_customuser_id=follower.pk)
+            adjust_follow_counts(follower, followed, 1)
+    except IntegrityError:
+        return False
+    return True
+
+# Make follower stop following followed and count it, returning False if they did not follow them. Only the
+# request whose delete removed the relation row moves the counters.
+def remove_follow(follower, followed):
+    with transaction.atomic():
+        removed, _ = Follow.objects.filter(from_customuser_id=followed.pk, to_customuser_id=follower.pk).delete()
+        if removed:
+            adjust_follow_counts(follower, followed, -1)
+    return bool(removed)
+
+# Update an author's post counter after a post is created (delta=1) or deleted (delta=-1)
+def adjust_post_count(author_id, delta):
+    _adjust(User.objects.filter(pk=author_id), 'post_count', delta)
+
+# Release the follow counters held by a user before their account is deleted
+def release_follow_counts(user):
+    _adjust(User.objects.filter(followers=user), 'follower_count', -1)  # Users they followed lose a follower
+    _adjust(User.objects.filter(following=user), 'following_count', -1)  # Their followers follow one user less
+
+# Recompute the counters of the given users from the source tables, repairing any drift
+def recount_counters(queryset):
+    from posts.models import Post  # Imported here because the posts app depends on this app
+
+    followers = Follow.objects.filter(from_customuser=OuterRef('pk')).order_by().values('from_customuser').annotate(total=Count('id')).values('total')
+    following = Follow.objects.filter(to_customuser=OuterRef('pk')).order_by().values('to_customuser').annotate(total=Count('id')).values('total')
+    posts = Post.objects.filter(author=OuterRef('pk')).order_by().values('author').annotate(total=Count('id')).values('total')
+
+    return queryset.update(
+        follower_count=Coalesce(Subquery(followers), 0),
+        following_count=Coalesce(Subquery(following), 0),
+        post_count=Coalesce(Subquery(posts), 0),
+    )
@@ -0,0 +1,81 @@
+import json
+import zlib
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from posts.models import Post, Comment, Like
+from messaging.models import Message
+from notifications.models import Notification
+
+# Sections of a user's data export, in the order they are written: (name, rows of the user, exported columns).
+# Rows are read as plain values in primary key order, so an export is resumable from any (section, id) position.
+EXPORT_SECTIONS = [
+    ('posts', lambda user: Post.objects.filter(author=user),
+     ['id', 'title', 'content', 'media', 'created_at', 'updated_at']),
+    ('comments', lambda user: Comment.objects.filter(author=user),
+     ['id', 'post_id', 'content', 'created_at', 'updated_at']),
+    ('likes', lambda user: Like.objects.filter(user=user),
+     ['id', 'post_id']),
+    ('messages', lambda user: Message.objects.filter(Q(sender=user) | Q(receiver=user)),
+     ['id', 'sender_id', 'receiver_id', 'conversation_id', 'content', 'image', 'is_read', 'created_at', 'updated_at']),
+    ('notifications', lambda user: Notification.objects.filter(recipient=user),
+     ['id', 'actor_id', 'actor_count', 'recent_actors', 'verb', 'target_content_type__app_label',
+      'target_content_type__model', 'target_object_id', 'is_read', 'timestamp']),
+]
+SECTION_NAMES = [name for name, _, _ in EXPORT_SECTIONS]
+
+def export_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+# Parse a resume cursor ("<section>:<id>", as written on every exported line) into (section index, last id)
+def parse_export_cursor(cursor):
+    try:
+        section, last_id = cursor.split(':')
+        return SECTION_NAMES.index(section), int(last_id)
+    except ValueError:
+        raise ValueError(f"Invalid export cursor '{cursor}'. Use the cursor of the last line received, like 'posts:42'.")
+
+# Yield a user's data as NDJSON lines, one row per line:
+#     {"type": "posts", "cursor": "posts:42", "data": {...}}
+# Rows are streamed from the database in chunks, so memory use stays flat however much data the user has.
+# Passing the cursor of the last line received resumes the export right after it.
+def export_lines(user, cursor=None, sections=None):
+    start_section, last_id = parse_export_cursor(cursor) if cursor else (0, 0)
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+    for index, (name, rows, fields) in enumerate(EXPORT_SECTIONS):
+        if index < start_section or (sections and name not in sections):
+            continue
+        queryset = rows(user).order_by('id')
+        if index == start_section and last_id:
+            queryset = queryset.filter(id__gt=last_id)
+
+        for row in queryset.values(*fields).iterator(chunk_size=export_chunk_size()):
+            yield encoder.encode({'type': name, 'cursor': f"{name}:{row['id']}", 'data': row}) + '\n'
+
+# Group lines into chunks of about chunk_bytes, so the response is not written one tiny line at a time
+def buffer_lines(lines, chunk_bytes=64 * 1024):
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+# Compress a stream of chunks into a single gzip stream, chunk by chunk
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+# Full export stream of a user, as bytes chunks (gzip-compressed if asked)
+def export_stream(user, cursor=None, sections=None, compress=False):
+    chunks = buffer_lines(export_lines(user, cursor, sections))
+    return gzip_chunks(chunks) if compress else chunks
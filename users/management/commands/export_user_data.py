@@ -0,0 +1,44 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from users.export import SECTION_NAMES, export_stream, parse_export_cursor
+
+User = get_user_model()  # Custom user model
+
+# Management command to export a user's data as NDJSON, for data-portability requests and warehouse loads
+class Command(BaseCommand):
+    help = "Stream a user's posts, comments, likes, messages and notifications as newline-delimited JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="Username of the user to export.")
+        parser.add_argument('--output', help="File to write (standard output by default).")
+        parser.add_argument('--gzip', action='store_true', help="Gzip-compress the output.")
+        parser.add_argument('--cursor', help="Resume after this cursor (the 'cursor' of the last line written).")
+        parser.add_argument('--sections', help=f"Comma-separated sections to export: {', '.join(SECTION_NAMES)}.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        sections = [name for name in (options['sections'] or '').split(',') if name]
+        unknown = [name for name in sections if name not in SECTION_NAMES]
+        if unknown:
+            raise CommandError(f"Unknown sections: {', '.join(unknown)}")
+        if options['cursor']:
+            try:
+                parse_export_cursor(options['cursor'])
+            except ValueError as error:
+                raise CommandError(str(error))
+
+        # Append when resuming, so the rows already written are kept
+        output = open(options['output'], 'ab' if options['cursor'] else 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in export_stream(user, options['cursor'], sections, options['gzip']):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from posts.timeline import pull_author_ids, switch_fanout_modes
+from users.counters import recount_counters
+
+User = get_user_model()  # Custom user model
+
+# Management command to repair drift in the follower, following and post counters
+class Command(BaseCommand):
+    help = "Recompute the follower, following and post counters of every user in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of users updated per query.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+
+        # Walk the users table by primary key so each batch is a short range update
+        while True:
+            ids = list(User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            batch = User.objects.filter(id__gte=ids[0], id__lte=ids[-1])
+            pull_before = pull_author_ids(batch)
+            updated += recount_counters(batch)
+
+            # A recount can move an author across the fan-out threshold by any amount: rewrite their followers' timelines
+            pull_after = pull_author_ids(batch)
+            switch_fanout_modes(pull_ids=pull_after - pull_before, fanout_ids=pull_before - pull_after)
+            last_id = ids[-1]
+            self.stdout.write(f"Recounted {updated} users...")
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted the counters of {updated} users."))
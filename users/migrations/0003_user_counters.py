@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 03:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Fill the new counters from the existing follow relationships and posts
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'CustomUser')
+    Post = apps.get_model('posts', 'Post')
+    Follow = User.followers.through
+
+    # Rows of the "followers" relation point from the followed user to the follower
+    followers = Follow.objects.filter(from_customuser=OuterRef('pk')).order_by().values('from_customuser').annotate(total=Count('id')).values('total')
+    following = Follow.objects.filter(to_customuser=OuterRef('pk')).order_by().values('to_customuser').annotate(total=Count('id')).values('total')
+    posts = Post.objects.filter(author=OuterRef('pk')).order_by().values('author').annotate(total=Count('id')).values('total')
+
+    User.objects.update(
+        follower_count=Coalesce(Subquery(followers), 0),
+        following_count=Coalesce(Subquery(following), 0),
+        post_count=Coalesce(Subquery(posts), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuserprofile'),
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='follower_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -29,6 +29,9 @@ class CustomUser(AbstractUser):
     bio = models.CharField(max_length=250, blank=True, null=True)  # Optional Bio field
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True) # Optional Profile Picture field
     followers = models.ManyToManyField('self', symmetrical=False, related_name='following', blank=True)  # Many-to-many field for users to follow each other
+    follower_count = models.PositiveIntegerField(default=0, db_index=True)  # Denormalized number of followers
+    following_count = models.PositiveIntegerField(default=0)  # Denormalized number of followed users
+    post_count = models.PositiveIntegerField(default=0)  # Denormalized number of posts
    
     REQUIRED_FIELDS = ['email']  # Specify the fields that are required when creating a user (excluding the username)
    
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import CustomUserProfile
+from uploads.serializers import ChunkedUploadField, ChunkedUploadsMixin, ImageVariantsField
 
 User = get_user_model() # Custom user
 
@@ -26,9 +27,11 @@ class LoginSerializer(serializers.Serializer):
     
 
 # Serializer for viewing the user's customized profile with location, website, & cover photo
-class CustomUserProfileSerializer(serializers.ModelSerializer):
+class CustomUserProfileSerializer(ChunkedUploadsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
     cover_photo = serializers.ImageField(required=False, allow_null=True)
+    cover_photo_variants = ImageVariantsField(source='cover_photo')  # Resized WebP and JPEG copies, as srcset values
+    cover_photo_upload = ChunkedUploadField(target='cover_photo')  # Completed chunked upload to use as the cover photo
     created_at = serializers.DateTimeField(format='%Y-%m-%dT%H:%M:%S', read_only=True)
     updated_at = serializers.DateTimeField(format='%Y-%m-%dT%H:%M:%S', read_only=True)
 
@@ -39,24 +42,27 @@ class CustomUserProfileSerializer(serializers.ModelSerializer):
     # Serializer for viewing the user's profile
 class UserProfileSerializer(serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
+    profile_picture_variants = ImageVariantsField(source='profile_picture')  # Resized WebP and JPEG copies, as srcset values
     customized_profile = CustomUserProfileSerializer(read_only=True)
 
     class Meta:
         model = User
-        fields = ["id", "username", "email", "bio", "profile_picture", "customized_profile" ]
+        fields = ["id", "username", "email", "bio", "profile_picture", "profile_picture_variants", "customized_profile", "follower_count", "following_count", "post_count"]
+        read_only_fields = ["follower_count", "following_count", "post_count"]
 
     def get_profile_picture(self, obj):
         # Return URL or None if no profile picture exists
         return obj.profile_picture.url if obj.profile_picture else None
 
     # Serializer for updating a user's profile
-class UserProfileUpdateSerializer(serializers.ModelSerializer):
+class UserProfileUpdateSerializer(ChunkedUploadsMixin, serializers.ModelSerializer):
     profile_picture = serializers.ImageField(required=False, allow_null=True)
+    profile_picture_upload = ChunkedUploadField(target='profile_picture')  # Completed chunked upload to use as the profile picture
     password = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
     class Meta:
         model = User
-        fields = ["id", "username", "email", "password", "bio", "profile_picture"]
+        fields = ["id", "username", "email", "password", "bio", "profile_picture", "profile_picture_upload"]
 
     def update(self, instance, validated_data):
         # Handle profile_picture
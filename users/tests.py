@@ -1,3 +1,131 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
 from django.test import TestCase
+from rest_framework.test import APIClient
+from posts.models import Comment, Like, Post
+from posts.tests import MediaTestCase, png_file
+from uploads.variants import generate_variants
+from .counters import Follow, add_follow, remove_follow
+from .models import CustomUserProfile
 
-# Create your tests here.
+User = get_user_model()  # Custom user model
+
+class ProfileEtagTest(MediaTestCase):
+    def test_generated_variants_change_the_etag(self):
+        user = User.objects.create_user(username='user', email='user@example.com', password='password', profile_picture=png_file())
+        profile = CustomUserProfile.objects.create(user=user, cover_photo=png_file('cover.png', (400, 100)))
+        client = self.client_for(user)
+
+        etag = client.get('/user/profile/')['ETag']
+        self.assertEqual(client.get('/user/profile/', headers={'If-None-Match': etag}).status_code, 304)
+
+        generate_variants(user.profile_picture.name)
+        response = client.get('/user/profile/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('webp', response.data['profile_picture_variants'])
+
+        # The cover photo's variants are part of the profile too
+        etag = response['ETag']
+        generate_variants(profile.cover_photo.name)
+        self.assertEqual(client.get('/user/profile/', headers={'If-None-Match': etag}).status_code, 200)
+
+class FollowCountersTest(TestCase):
+    def setUp(self):
+        self.follower, self.followed, self.fan = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='password') for name in ('follower', 'followed', 'fan')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.follower)
+
+    def counts(self):
+        return (
+            User.objects.get(pk=self.follower.pk).following_count,
+            User.objects.get(pk=self.followed.pk).follower_count,
+        )
+
+    def test_following_twice_counts_once(self):
+        self.assertEqual(self.client.post(f'/user/follow/{self.followed.pk}/').status_code, 200)
+        self.assertEqual(self.client.post(f'/user/follow/{self.followed.pk}/').status_code, 400)
+        self.assertEqual(self.counts(), (1, 1))
+
+        self.assertEqual(self.client.post(f'/user/unfollow/{self.followed.pk}/').status_code, 200)
+        self.assertEqual(self.client.post(f'/user/unfollow/{self.followed.pk}/').status_code, 400)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_only_the_request_changing_the_relation_counts(self):
+        # Another request inserted the relation row first: it counts the follow, not this one
+        Follow.objects.create(from_customuser=self.followed, to_customuser=self.follower)
+        self.assertFalse(add_follow(self.follower, self.followed))
+        self.assertEqual(self.counts(), (0, 0))
+
+        Follow.objects.all().delete()
+        self.assertFalse(remove_follow(self.follower, self.followed))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_deleting_an_account_releases_its_follows(self):
+        add_follow(self.follower, self.followed)
+        add_follow(self.fan, self.follower)
+        add_follow(self.fan, self.followed)
+
+        self.assertEqual(self.client.delete('/user/profile/delete/').status_code, 204)
+        self.assertEqual(User.objects.get(pk=self.followed.pk).follower_count, 1)
+        self.assertEqual(User.objects.get(pk=self.fan.pk).following_count, 1)
+
+    def test_a_failed_account_delete_keeps_the_counters(self):
+        add_follow(self.follower, self.followed)
+        add_follow(self.fan, self.follower)
+
+        with mock.patch.object(User, 'delete', side_effect=DatabaseError("disk I/O error")):
+            with self.assertRaises(DatabaseError):
+                self.client.delete('/user/profile/delete/')
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertEqual(User.objects.get(pk=self.fan.pk).following_count, 1)
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='user@example.com', password='password')
+        posts = [Post.objects.create(author=self.user, title=f'Post {number}', content='Content') for number in range(3)]
+        for post in posts:
+            Comment.objects.create(post=post, author=self.user, content=f'Comment on {post.title}')
+        Like.objects.create(post=posts[0], user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_exports_resume_after_the_cursor(self):
+        lines = self.export('/user/export/')
+        self.assertEqual([line['type'] for line in lines], ['posts'] * 3 + ['comments'] * 3 + ['likes'])
+
+        # Resume after the second comment: the rest of the comments, then the later sections
+        resumed = self.export(f"/user/export/?cursor={lines[4]['cursor']}")
+        self.assertEqual(resumed, lines[5:])
+        self.assertEqual(self.export(f"/user/export/?cursor={lines[4]['cursor']}&sections=likes"), lines[6:])
+
+        self.assertEqual(self.client.get('/user/export/?cursor=posts').status_code, 400)
+        self.assertEqual(self.client.get('/user/export/?cursor=drafts:1').status_code, 400)
+        self.assertEqual(self.client.get('/user/export/?sections=drafts').status_code, 400)
+
+    def test_resumed_gzip_exports_append_to_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.ndjson.gz')
+            # Interrupted after the posts...
+            call_command('export_user_data', 'user', output=path, gzip=True, sections='posts', stdout=io.StringIO())
+            with gzip.open(path, 'rt') as file:
+                cursor = json.loads(file.read().splitlines()[-1])['cursor']
+
+            # ...and resumed: the new gzip member is appended, and the file reads as one export
+            call_command('export_user_data', 'user', output=path, gzip=True, cursor=cursor, stdout=io.StringIO())
+            with gzip.open(path, 'rt') as file:
+                lines = [json.loads(line) for line in file.read().splitlines()]
+        self.assertEqual(lines, self.export('/user/export/'))
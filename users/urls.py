@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import RegisterView, LoginView, UserProfileView, UpdateProfileAPIView, UserProfileDelete, FollowUser, UnfollowUser, CustomUserProfileView
+from .views import RegisterView, LoginView, UserProfileView, UpdateProfileAPIView, UserProfileDelete, FollowUser, UnfollowUser, CustomUserProfileView, ExportUserDataView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -22,6 +22,7 @@ urlpatterns = [
     path('profile/delete/', UserProfileDelete.as_view(), name='profile_delete'),  # DELETE profile
     path('follow/<int:user_id>/', FollowUser.as_view(), name='follow_user'),
     path('unfollow/<int:user_id>/', UnfollowUser.as_view(), name='unfollow_user'),
+    path('export/', ExportUserDataView.as_view(), name='export_user_data'),  # GET streaming NDJSON export of the user's data
 ]
 
 urlpatterns += router.urls
\ No newline at end of file
@@ -8,9 +8,18 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import CustomUser, CustomUserProfile
-from notifications.models import Notification
-from django.contrib.contenttypes.models import ContentType
+from notifications.dispatch import notify
+from posts.timeline import backfill_timeline, prune_timeline, update_fanout_modes
+from .counters import add_follow, release_follow_counts, remove_follow
 from drf_yasg.utils import swagger_auto_schema
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from drf_yasg import openapi
+from social_media_api.conditional import build_etag, conditional
+from .export import SECTION_NAMES, export_stream, parse_export_cursor
+from uploads.variants import schedule_variants, variants_version
+from social_media_api.replicas import pin_to_primary
 
 User = get_user_model()  # Custom user model
 
@@ -28,7 +37,11 @@ class RegisterView(views.APIView):
         # Check if the data is valid according to the serializer's validation logic
         if serializer.is_valid():
             # Save the new user to the database if the data is valid
-            serializer.save()
+            user = serializer.save()
+            schedule_variants(user.profile_picture)
+
+            # The replicas may not have the new account yet when the user logs in and starts reading
+            pin_to_primary(user.pk)
             
             # Return a success message with HTTP status 201 (Created)
             return Response({"message": "User registered successfully"}, status=status.HTTP_201_CREATED)
@@ -71,6 +84,31 @@ class LoginView(views.APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ETag of the current user's profile: the user row is already loaded by authentication, so only the
+# customized profile's version and the variants of the profile picture and cover photo are queried
+def user_profile_etag(request, *args, **kwargs):
+    user = request.user
+    customized_profile = CustomUserProfile.objects.filter(user=user).values_list('id', 'updated_at', 'cover_photo').first()
+    cover_photo = customized_profile[2] if customized_profile else None
+    return build_etag(
+        request, 'profile', user.username, user.email, user.bio, user.profile_picture.name,
+        user.follower_count, user.following_count, user.post_count, customized_profile,
+        variants_version(user.profile_picture.name, cover_photo),
+    )
+
+# ETag of the current user's custom profiles (a list that may also become empty)
+def custom_profile_list_etag(request, *args, **kwargs):
+    validators = CustomUserProfile.objects.filter(user=request.user).aggregate(count=Count('id'), last_id=Max('id'), last_update=Max('updated_at'))
+    return build_etag(request, 'custom_profiles', *validators.values())
+
+# Last modification of one of the current user's custom profiles (None when it does not exist, so the view answers 404)
+def custom_profile_last_modified(request, pk=None, *args, **kwargs):
+    return CustomUserProfile.objects.filter(user=request.user, pk=pk).values_list('updated_at', flat=True).first()
+
+def custom_profile_etag(request, pk=None, *args, **kwargs):
+    updated_at = custom_profile_last_modified(request, pk)
+    return build_etag(request, 'custom_profile', pk, updated_at) if updated_at else None
+
 class UserProfileView(views.APIView):
     # Restrict access to authenticated users only
     permission_classes = [IsAuthenticated]
@@ -78,8 +116,9 @@ class UserProfileView(views.APIView):
     # Apply swagger documentation
     @swagger_auto_schema(
         operation_summary="User profile",
-        operation_description="Get the currently authenticated user's profile"
+        operation_description="Get the currently authenticated user's profile. Send the returned ETag in If-None-Match to get 304 Not Modified while it is unchanged."
     )
+    @conditional(etag_func=user_profile_etag)
     def get(self, request):
         # Get the currently authenticated user from the request object
         user = request.user
@@ -111,12 +150,14 @@ class UpdateProfileAPIView(views.APIView):
 
         # Initialize the serializer with the current user instance, the new data from the request, and 'partial=True' 
         # to allow partial updates (i.e., not all fields are required to be updated)
-        serializer = UserProfileUpdateSerializer(instance, data=request.data, partial=True)
+        serializer = UserProfileUpdateSerializer(instance, data=request.data, partial=True, context={'request': request})
 
         # Check if the serializer is valid after receiving the data
         if serializer.is_valid():
             # Save the updated user profile instance to the database
-            serializer.save()
+            user = serializer.save()
+            if 'profile_picture' in serializer.validated_data:
+                schedule_variants(user.profile_picture)
 
             # Return the updated user data with HTTP status 200 (OK)
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -138,8 +179,12 @@ class UserProfileDelete(views.APIView):
         # Get the current authenticated user instance (the one making the request)
         instance = request.user
         
-        # Delete the user account from the database
-        instance.delete()
+        # Release the follow counters held by the account, then delete it from the database (all or nothing, so a
+        # failed delete leaves the other users' counters alone)
+        with transaction.atomic():
+            release_follow_counts(instance)
+            update_fanout_modes(User.objects.filter(followers=instance), -1)
+            instance.delete()
 
         # Return a success message indicating the account was deleted, with HTTP status 204 (No Content)
         return Response({"Message": "Account was deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
@@ -160,23 +205,22 @@ class FollowUser(views.APIView):
         if request.user == user_to_follow:
             return Response({"message": "sorry, you cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check if the user is already following the user
-        if user_to_follow in request.user.following.all():
+        # Add the user to the following list, unless the user is already following them
+        if not add_follow(request.user, user_to_follow):
             return Response({"message": "sorry, you've already followed this user."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Copy the followed user's recent posts into the follower's timeline, and stop fanning out their posts if
+        # they just became a celebrity
+        backfill_timeline(request.user, user_to_follow)
+        update_fanout_modes([user_to_follow.pk], 1)
         
-        # Add the user to the following list
-        request.user.following.add(user_to_follow)
-        
-         # Create a notification for the user being followed
-        notification = Notification(
+         # Notify the user being followed, grouped with their other recent followers
+        notify(
             recipient=user_to_follow,  # The user being followed
             actor=request.user,        # The user who is following
             verb='followed you',       # Verb explaining the action
-            # Use ContentType to link the notification to the User model
-            target_content_type=ContentType.objects.get_for_model(User),  # The content type for User model
-            target_object_id=user_to_follow.id,  # The specific user being followed
+            target=user_to_follow,     # The specific user being followed
         )
-        notification.save()
 
         return Response({"message": "user followed successfully."}, status=status.HTTP_200_OK)
 
@@ -196,15 +240,54 @@ class UnfollowUser(views.APIView):
         if request.user == user_to_unfollow:
             return Response({"message": "sorry, you cannot unfollow yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if the user is in the following list
-        if user_to_unfollow not in request.user.following.all():
+        # Remove the user from the following list, unless they are not in it
+        if not remove_follow(request.user, user_to_unfollow):
             return Response({"message": "sorry, this user is not in your following list."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Remove the user from the following list
-        request.user.following.remove(user_to_unfollow)
+        # Drop the unfollowed user's posts from the timeline, and fan their posts out again if they are no longer
+        # a celebrity
+        prune_timeline(request.user, user_to_unfollow)
+        update_fanout_modes([user_to_unfollow.pk], -1)
 
         return Response({"message": "user unfollowed successfully."}, status=status.HTTP_200_OK)
 
+# View streaming all of the current user's data as NDJSON (data portability requests, warehouse loads)
+class ExportUserDataView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    # Apply swagger documentation
+    @swagger_auto_schema(
+        operation_summary="Export your data",
+        operation_description="Streams the authenticated user's posts, comments, likes, messages and notifications as newline-delimited JSON, one row per line. Every line carries a `cursor`; pass the cursor of the last line received to resume an interrupted export.",
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Resume after this cursor (e.g. `comments:42`)"),
+            openapi.Parameter('sections', openapi.IN_QUERY, type=openapi.TYPE_STRING, description=f"Comma-separated sections to export: {', '.join(SECTION_NAMES)} (all by default)"),
+            openapi.Parameter('compress', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['gzip'], description="Set to `gzip` for a gzip-compressed file"),
+        ],
+    )
+    def get(self, request):
+        cursor = request.query_params.get('cursor')
+        sections = [name for name in request.query_params.get('sections', '').split(',') if name]
+        compress = request.query_params.get('compress') == 'gzip'
+
+        # Validate the parameters before streaming starts, while an error status can still be sent
+        unknown = [name for name in sections if name not in SECTION_NAMES]
+        if unknown:
+            return Response({"message": f"Unknown sections: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if cursor:
+            try:
+                parse_export_cursor(cursor)
+            except ValueError as error:
+                return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        filename = f"export-{request.user.username}.ndjson" + ('.gz' if compress else '')
+        response = StreamingHttpResponse(
+            export_stream(request.user, cursor, sections, compress),
+            content_type='application/gzip' if compress else 'application/x-ndjson',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
 class CustomUserProfileView(viewsets.ModelViewSet):
     queryset = CustomUserProfile.objects.all()
     serializer_class =  CustomUserProfileSerializer
@@ -220,13 +303,16 @@ class CustomUserProfileView(viewsets.ModelViewSet):
             raise PermissionDenied("You already have a profile. You cannot create multiple profiles.")
 
         # Set the current user as the custom profile owner
-        serializer.save(user=self.request.user)
+        profile = serializer.save(user=self.request.user)
+        schedule_variants(profile.cover_photo)
 
     def perform_update(self, serializer):
         # Checking if the user is the owner of the custom profile before updating
         if self.get_object().user != self.request.user:
             raise PermissionDenied("You can only update your profile cover")
-        serializer.save()
+        profile = serializer.save()
+        if 'cover_photo' in serializer.validated_data:
+            schedule_variants(profile.cover_photo)
 
     def perform_destroy(self, instance):
         # Checking if the user is the owner of the custom profile before deleting
@@ -237,8 +323,9 @@ class CustomUserProfileView(viewsets.ModelViewSet):
     # Apply swagger documentation
     @swagger_auto_schema(
         operation_summary="Retrieve a list of custom user profiles",
-        operation_description="Get a list of custom profiles for the currently authenticated user."
+        operation_description="Get a list of custom profiles for the currently authenticated user. Supports If-None-Match."
     )
+    @conditional(etag_func=custom_profile_list_etag)
     def list(self, request, *args, **kwargs):
         """
         Retrieve a list of custom user profiles for the authenticated user.
@@ -260,8 +347,9 @@ class CustomUserProfileView(viewsets.ModelViewSet):
     # Apply swagger documentation
     @swagger_auto_schema(
         operation_summary="Retrieve a specific custom user profile",
-        operation_description="Get details of a specific custom user profile."
+        operation_description="Get details of a specific custom user profile. Supports If-None-Match and If-Modified-Since."
     )
+    @conditional(etag_func=custom_profile_etag, last_modified_func=custom_profile_last_modified)
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieve the details of a specific custom user profile.
@@ -288,7 +376,7 @@ class CustomUserProfileView(viewsets.ModelViewSet):
         """
         Partially update the custom user profile. Only the profile owner can update it.
         """
-        return super().partia_update(request, *args, **kwargs)
+        return super().partial_update(request, *args, **kwargs)
 
     # Apply swagger documentation
     @swagger_auto_schema(